@@ -0,0 +1,117 @@
+"""
+ByWater Slack Bot, asyncio edition
+
+An opt-in entry point that runs the same handlers on slack_bolt's AsyncApp and
+the async Socket Mode adapter ( which need aiohttp ). Routing is identical to
+bywaterbot.py; the difference is how listeners wait. The Bugzilla, branches,
+Zoho Desk and GitHub data lookups are awaited on one event loop over pooled
+aiohttp connections, so a burst of slow lookups costs tasks rather than
+threads. Everything still synchronous ( Twilio, Google Calendar, most Slack
+Web API calls ) runs on a thread ( see async_message_router ).
+
+    python async_bywaterbot.py
+"""
+
+import asyncio
+import logging
+import os
+
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_sdk.web.async_client import AsyncWebClient
+
+import async_http_client
+from async_message_router import AsyncMessageRouter
+from bot_logging import configure_logging
+from bywaterbot import register_handlers
+from calendar_functions import (
+    ROSTER_REFRESH_MINUTES,
+    get_google_creds,
+    refresh_duty_roster,
+)
+from config import load_config, refresh_data_async
+from metrics import (
+    METRICS_PORT,
+    start_metrics_server,
+    track_dependency,
+    watch_worker_pool,
+)
+from sms_outbox import get_sms_outbox
+from version import __version__
+
+logger = logging.getLogger(__name__)
+
+DATA_REFRESH_SECONDS = 60 * 60
+
+
+class MeteredAsyncWebClient(AsyncWebClient):
+    """MeteredWebClient's asyncio twin ( see metered_clients )."""
+
+    async def api_call(self, api_method, **kwargs):
+        with track_dependency("slack", api_method):
+            return await super().api_call(api_method, **kwargs)
+
+
+async def refresh_data_hourly():
+    """Keep bywaterbot_data fresh, as run_scheduler does for bywaterbot.py."""
+    while True:
+        await refresh_data_async()
+        await asyncio.sleep(DATA_REFRESH_SECONDS)
+
+
+async def refresh_duty_roster_periodically():
+    """Keep the duty roster current; the Calendar client is synchronous."""
+    while True:
+        await asyncio.sleep(ROSTER_REFRESH_MINUTES * 60)
+        await asyncio.to_thread(refresh_duty_roster)
+
+
+async def main():
+    configure_logging()
+    logger.info("ByWaterBot %s (asyncio) is starting up!", __version__)
+
+    # 1. Load Configuration
+    load_config()
+
+    # Send anything left in the SMS outbox by the last run ( see sms_outbox )
+    get_sms_outbox()
+
+    # 2. Initialize App
+    app = AsyncApp(
+        client=MeteredAsyncWebClient(token=os.environ.get("SLACK_BOT_TOKEN"))
+    )
+
+    # 3. Start the scheduled refreshes ( references kept so they aren't collected )
+    background = [
+        asyncio.create_task(refresh_data_hourly()),
+        asyncio.create_task(refresh_duty_roster_periodically()),
+    ]
+
+    # 4. Initialize Google Calendar credentials
+    logger.info("Initializing Google Calendar credentials...")
+    try:
+        await asyncio.to_thread(get_google_creds)
+        logger.info("Google Calendar credentials initialized successfully")
+        await asyncio.to_thread(refresh_duty_roster)
+    except Exception as e:
+        logger.warning("Failed to initialize Google Calendar credentials: %s", e)
+
+    # 5. Register Handlers ( routed by priority — see register_handlers )
+    router = register_handlers(app, router_class=AsyncMessageRouter)
+
+    # 6. Serve metrics ( see metrics )
+    watch_worker_pool(router.lazy_pool)
+    if METRICS_PORT:
+        start_metrics_server()
+
+    # 7. Start the App
+    try:
+        await AsyncSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start_async()
+    finally:
+        for task in background:
+            task.cancel()
+        await async_http_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+"""
+Async HTTP Client Module
+
+The asyncio edition's counterpart to http_client: the same outbound REST calls
+( Bugzilla, the branches tool, Zoho Desk, GitHub ) over aiohttp, so hundreds of
+slow lookups can be in flight without a thread each.
+
+It follows http_client's policy: one kept-alive connection pool per host ( up
+to http_client.POOL_SIZE connections ), the same default timeout, and retries
+with backoff on 429 / 5xx, honouring Retry-After up to
+http_client.MAX_RETRY_AFTER, for GET / HEAD / OPTIONS only. Calls are counted
+in http_client.host_stats() alongside the sync ones.
+
+Responses are read eagerly and come back as a small Response object with the
+requests.Response attributes the callers use ( status_code, text, json(),
+raise_for_status() ), so the parsing code is the same in both editions.
+
+aiohttp is only needed by the asyncio edition ( async_bywaterbot.py ).
+"""
+
+import asyncio
+import json as jsonlib
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import requests
+
+import http_client
+
+try:
+    import aiohttp
+except ImportError:  # only the asyncio edition needs it
+    aiohttp = None
+
+_sessions = weakref.WeakKeyDictionary()  # event loop -> aiohttp.ClientSession
+
+
+class Response:
+    """A fully read HTTP response, shaped like the parts of requests.Response
+    the bot uses."""
+
+    __slots__ = ("url", "status_code", "reason", "headers", "text")
+
+    def __init__(self, url, status_code, reason, headers, text):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.text = text
+
+    def json(self):
+        return jsonlib.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(
+                f"{self.status_code} {self.reason} for url: {self.url}"
+            )
+
+
+def _client_timeout(timeout):
+    """aiohttp's equivalent of a requests timeout ( seconds, or a
+    ( connect, read ) pair )."""
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+    else:
+        connect = read = timeout
+    return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+
+def _require_aiohttp():
+    if aiohttp is None:
+        raise RuntimeError("The asyncio edition needs aiohttp ( pip install aiohttp )")
+
+
+def get_session():
+    """Return the running event loop's shared ClientSession, creating it once."""
+    _require_aiohttp()
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=http_client.POOL_SIZE)
+        session = _sessions[loop] = aiohttp.ClientSession(connector=connector)
+    return session
+
+
+async def close():
+    """Close the running event loop's session ( on shutdown )."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+def _retry_delay(response, attempt):
+    """Seconds to wait before retry number attempt ( 0-based ), or None if
+    Retry-After asks for more than http_client.MAX_RETRY_AFTER."""
+    retry_after = response is not None and response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        seconds = int(retry_after)
+        return seconds if seconds <= http_client.MAX_RETRY_AFTER else None
+    return http_client.RETRY.backoff_factor * (2**attempt)
+
+
+async def request(method, url, params=None, timeout=None, **kwargs):
+    """Send a request through the running loop's pooled session.
+
+    Takes the requests-style arguments the bot uses ( params, headers, json,
+    data, timeout ) and returns a Response. A request that raises or ends in
+    a 5xx counts as an error in http_client.host_stats().
+    """
+    _require_aiohttp()
+    retry = http_client.RETRY
+    idempotent = method.upper() in retry.allowed_methods
+    if params:
+        params = {key: str(value) for key, value in params.items()}
+    kwargs["timeout"] = _client_timeout(timeout or http_client.DEFAULT_TIMEOUT)
+
+    host = urlsplit(url).netloc
+    start = time.monotonic()
+    error = True
+    try:
+        attempt = 0
+        while True:
+            response = None
+            try:
+                async with get_session().request(
+                    method, url, params=params, **kwargs
+                ) as resp:
+                    response = Response(
+                        str(resp.url),
+                        resp.status,
+                        resp.reason,
+                        # A copy that keeps case-insensitive lookups
+                        resp.headers.copy(),
+                        await resp.text(),
+                    )
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if not idempotent or attempt >= retry.total:
+                    raise
+            else:
+                if (
+                    not idempotent
+                    or response.status_code not in retry.status_forcelist
+                    or attempt >= retry.total
+                ):
+                    error = response.status_code >= 500
+                    return response
+            delay = _retry_delay(response, attempt)
+            if delay is None:
+                error = response.status_code >= 500
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+    finally:
+        http_client.record(host, time.monotonic() - start, error, method)
+
+
+async def get(url, **kwargs):
+    return await request("GET", url, **kwargs)
+
+
+async def post(url, **kwargs):
+    return await request("POST", url, **kwargs)
+
+
+async def put(url, **kwargs):
+    return await request("PUT", url, **kwargs)
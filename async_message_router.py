@@ -0,0 +1,156 @@
+"""
+Async Message Router Module
+
+The asyncio edition's MessageRouter ( see async_bywaterbot ). It routes
+exactly as MessageRouter does ( same priorities, classifier, pre-filter and
+channel index ) but installs itself on a slack_bolt AsyncApp, whose listeners
+and middleware must be coroutines.
+
+The handler modules register the same listeners in both editions, and most of
+them are plain functions that call the Slack Web API and other blocking
+services ( Twilio, Google Calendar, users.info ). So each listener is run the
+way it was written:
+
+- coroutine functions ( the async Bugzilla / Zoho / branches lookups in
+  support_handlers ) are awaited on the event loop;
+- plain functions run on a thread ( asyncio.to_thread ) with blocking
+  versions of ack / say / respond and a synchronous WebClient as client, so
+  they behave exactly as they do under App.
+
+router.client is that synchronous WebClient too, so handlers that captured
+the app at registration time and call app.client.* keep working.
+
+Lazy functions are scheduled on an AsyncWorkerPool, so hundreds of slow
+lookups can be waiting on HTTP at once without a thread each. Listeners that
+pass straight through to the app ( @app.action, unrouted @app.event types )
+are wrapped the same way ( see MessageRouter._passthrough ).
+"""
+
+import asyncio
+import inspect
+
+from slack_bolt.response import BoltResponse
+
+from message_router import MessageRouter, _call
+from metered_clients import MeteredWebClient
+from metrics import track_handler
+from worker_pool import AsyncWorkerPool
+
+# Bolt arguments that are coroutine functions under AsyncApp
+_ASYNC_ARGS = ("ack", "say", "respond")
+
+
+def _blocking(async_callable, loop):
+    """A plain callable that runs async_callable on loop from another thread."""
+
+    def call(*args, **kwargs):
+        return asyncio.run_coroutine_threadsafe(
+            async_callable(*args, **kwargs), loop
+        ).result()
+
+    return call
+
+
+class AsyncMessageRouter(MessageRouter):
+    """MessageRouter for a slack_bolt AsyncApp.
+
+    Register handlers against it exactly as against MessageRouter:
+
+        router = AsyncMessageRouter(app)
+        register_general_handlers(router)
+    """
+
+    is_async = True
+
+    def __init__(self, app, client=None):
+        self.client = client or MeteredWebClient(token=app.client.token)
+        super().__init__(app)
+
+    def _new_lazy_pool(self):
+        return AsyncWorkerPool("lazy-listener")
+
+    def _install(self, app):
+        async def prefilter_messages(body, context, next):
+            if self._admit(body, context):
+                return await next()
+            # A plain 200 ends the chain and still acks the event
+            return BoltResponse(status=200, body="")
+
+        async def dispatch_message(args):
+            await self.dispatch(args)
+
+        async def dispatch_event(args):
+            await self.dispatch(args)
+
+        self._dispatch_event = dispatch_event
+        app.use(prefilter_messages)
+        app.event("message")(dispatch_message)
+
+    async def dispatch(self, args):
+        """Run the winning route for the message in Bolt's listener args.
+
+        Its ack function runs here; its lazy functions are scheduled on
+        lazy_pool.
+        """
+        route, available = self._route(args)
+        if route is None:
+            return None
+        result = None
+        if route.func:
+            result = await self._run(route.func, route.arg_names, available)
+        for func, arg_names in route.lazy:
+            self.lazy_pool.submit(self._run, func, arg_names, available)
+        return result
+
+    async def _run(self, func, arg_names, available):
+        """Await func if it's a coroutine function, else run it on a thread.
+        Either way it's counted and timed per handler."""
+        with track_handler(func.__name__):
+            if inspect.iscoroutinefunction(func):
+                return await _call(func, arg_names, available)
+            return await asyncio.to_thread(
+                _call, func, arg_names, self._blocking_args(available)
+            )
+
+    def _blocking_args(self, available):
+        """available, with the arguments a plain function can't use under
+        AsyncApp swapped for synchronous ones."""
+        loop = asyncio.get_running_loop()
+        blocking = dict(available, client=self.client)
+        for name in _ASYNC_ARGS:
+            if available.get(name) is not None:
+                blocking[name] = _blocking(available[name], loop)
+        return blocking
+
+    def _bridge(self, func, inline=False):
+        """An async listener that runs func via _run, or with inline=True an
+        async matcher that calls func directly ( matchers mustn't block )."""
+        if inline and inspect.iscoroutinefunction(func):
+            return func
+        arg_names = list(inspect.signature(func).parameters)
+
+        async def bridged(args):
+            available = dict(args.context)
+            available.update(vars(args))
+            if inline:
+                return _call(func, arg_names, available)
+            return await self._run(func, arg_names, available)
+
+        # Name it after func for Bolt's logs; not functools.wraps, or Bolt
+        # would inject func's arguments instead of args
+        bridged.__name__ = func.__name__
+        bridged.__qualname__ = func.__qualname__
+        return bridged
+
+    def _passthrough(self, register, matchers):
+        """Register a listener on the app via register, bridging it and its
+        matchers."""
+        decorator = register(
+            [self._bridge(m, inline=True) for m in matchers or []] or None
+        )
+
+        def __call__(func):
+            decorator(self._bridge(func))
+            return func
+
+        return __call__
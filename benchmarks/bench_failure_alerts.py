@@ -0,0 +1,135 @@
+"""
+Per-message cost of deciding whether a #devops-alerts post is a failure.
+
+Compares the old check, which lower-cased and concatenated every attachment's
+title, text, fallback and field values into one string before looking for
+"fail", with devops_alerts_handlers.FailureClassifier, which checks colors
+first and stops at the first signal.
+
+The posts are shaped like what GitHub Actions ( via the Slack notify action )
+and the rebaser send: successes with a handful of fields and a long fallback,
+failures flagged by the danger color, and rebaser failures in plain text. Each
+kind is timed on its own, since a success has to be read to the end either
+way and a failure is where stopping early pays.
+
+Run from the repository root:
+
+    python benchmarks/bench_failure_alerts.py [messages]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from devops_alerts_handlers import FailureClassifier  # noqa: E402
+
+
+def blob_is_failure_alert(event):
+    """The check FailureClassifier replaced."""
+    blob = (event.get("text") or "").lower()
+    danger = False
+    for att in event.get("attachments", []) or []:
+        color = (att.get("color") or "").lower()
+        if color in ("danger", "#a30200", "#d50200", "#cc0000"):
+            danger = True
+        blob += " " + (att.get("title") or "").lower()
+        blob += " " + (att.get("text") or "").lower()
+        blob += " " + (att.get("fallback") or "").lower()
+        for field in att.get("fields", []) or []:
+            blob += " " + str(field.get("value") or "").lower()
+    return danger or "fail" in blob
+
+
+def _actions_post(run, conclusion, color):
+    """A GitHub Actions workflow notification for run number run."""
+    repo = "bywatersolutions/bywater-koha"
+    url = f"https://github.com/{repo}/actions/runs/{8800000 + run}"
+    sha = f"{run * 2654435761 % 16**40:040x}"
+    commit = (
+        f"Bug {30000 + run} - Fix the thing in the other thing\n\n"
+        "Signed-off-by: Someone <someone@bywatersolutions.com>"
+    )
+    return {
+        "type": "message",
+        "subtype": "bot_message",
+        "channel": "CALERTS",
+        "text": "",
+        "attachments": [
+            {
+                "color": color,
+                "title": f"Koha CI #{run}",
+                "title_link": url,
+                "text": f"<{url}|Workflow run> {conclusion} for `{sha[:8]}`",
+                "fallback": f"[GitHub]: [{repo}] Koha CI {conclusion} {url} {commit}",
+                "fields": [
+                    {"title": "Repo", "value": repo, "short": True},
+                    {
+                        "title": "Ref",
+                        "value": "refs/heads/bywater-v24.05",
+                        "short": True,
+                    },
+                    {"title": "Commit", "value": sha, "short": True},
+                    {"title": "Author", "value": "kylemhall", "short": True},
+                    {"title": "Workflow", "value": "Koha CI", "short": True},
+                    {"title": "Took", "value": f"{run % 50 + 10} min", "short": True},
+                    {"title": "Message", "value": commit, "short": False},
+                ],
+                "footer": "GitHub Actions",
+                "ts": 1714560000 + run,
+            }
+        ],
+    }
+
+
+def _rebaser_post(i):
+    return {
+        "type": "message",
+        "channel": "CALERTS",
+        "text": f"Rebase of bywater-v24.05.{i:02d}-01 FAILED, "
+        f"see https://github.com/bywatersolutions/rebaser/runs/{i}",
+    }
+
+
+def _traffic(n):
+    """n posts of each kind: successes, danger-colored Actions failures, and
+    rebaser failures in plain text."""
+    return {
+        "success": [_actions_post(i, "succeeded", "good") for i in range(n)],
+        "danger": [_actions_post(i, "failed", "danger") for i in range(n)],
+        "rebaser": [_rebaser_post(i) for i in range(n)],
+    }
+
+
+def _time(check, events):
+    for event in events[:50]:
+        check(event)
+    start = time.perf_counter()
+    failures = sum(1 for event in events if check(event))
+    return (time.perf_counter() - start) / len(events) * 1e6, failures
+
+
+def run(n):
+    """{ kind: { check: ( us per message, failures found ) } }"""
+    checks = (("blob", blob_is_failure_alert), ("classifier", FailureClassifier()))
+    return {
+        kind: {name: _time(check, events) for name, check in checks}
+        for kind, events in _traffic(n).items()
+    }
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    results = run(n)
+    print(f"{n} messages of each kind")
+    for kind, timings in results.items():
+        (blob, _), (classifier, failures) = timings["blob"], timings["classifier"]
+        print(
+            f"{kind:>8}: blob {blob:6.2f} us   classifier {classifier:6.2f} us"
+            f"   speedup {blob / classifier:4.1f}x   failures {failures:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Per-message routing overhead: plain Bolt listeners vs the MessageRouter.
+
+Both apps get the same shape of listeners as the bot: a couple of dozen
+command patterns guarded by is_not_bot_message, a #devops-alerts watcher and a
+#devops reaction handler. The "bolt" app registers them the old way, with the
+watchers as catch-alls that compare the channel and return; the "router" app
+binds them to their channels with in_channel(...).
+
+Each app is fed the same traffic, mostly chatter in unrelated channels plus
+some alerts and reactions, through App.dispatch, and the script reports the
+mean time per event and how often each watcher's body was entered.
+
+Run from the repository root:
+
+    python benchmarks/bench_routing.py [events]
+"""
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slack_bolt import App  # noqa: E402
+from slack_bolt.authorization import AuthorizeResult  # noqa: E402
+from slack_bolt.request import BoltRequest  # noqa: E402
+
+from message_matchers import in_channel, is_not_bot_message  # noqa: E402
+from message_router import MessageRouter  # noqa: E402
+
+ALERTS = "CALERTS"
+DEVOPS = "CDEVOPS"
+
+COMMANDS = [
+    re.compile(r"(bug|bz)\s*([0-9]+)"),
+    re.compile(r"(ticket|zd)\s*#?\s*([0-9]+)", re.IGNORECASE),
+    re.compile(r"branches\s+([0-9]+)"),
+    re.compile(r"\((.+)\)\+\+"),
+    re.compile(r"(\S+)\s?\+\+"),
+    re.compile(r"^(\w+)(\-\-)"),
+    re.compile(r"^TEXT\s+(\S+)\s+(.+)", re.IGNORECASE),
+    re.compile(r"partners\s+(\w+)", re.IGNORECASE),
+    "list slack names",
+    "Refresh Data",
+    "Refresh Karma",
+    re.compile(r"\bhelp\b"),
+    re.compile(r"\bversion\b"),
+    re.compile(r"^\s*(?:my\s+(?:contact\s+)?info|whoami)\s*$", re.IGNORECASE),
+    re.compile(r"^\s*set\s+(sms|phone)\s+(\S+)", re.IGNORECASE),
+    re.compile(r"^\s*claim\s+(.+)$", re.IGNORECASE),
+    re.compile(r"^\s*weekend duty test( sms)?\s*$", re.IGNORECASE),
+    re.compile(r"\*New Ticket:\*\s+ZD\s+#(\d+)\s+-\s+(.+)"),
+]
+
+CHATTER = [
+    "morning all, coffee is on",
+    "can someone look at the staging box when they get a sec?",
+    "lunch anyone?",
+    "I pushed the fix, tests are green",
+    "thanks <@U024BE7LH> that worked",
+    "meeting moved to 3pm",
+]
+
+
+def _app():
+    return App(
+        signing_secret="secret",
+        token_verification_enabled=False,
+        request_verification_enabled=False,
+        ssl_check_enabled=False,
+        process_before_response=True,
+        raise_error_for_unhandled_request=False,
+        authorize=lambda *a, **k: AuthorizeResult(
+            enterprise_id=None,
+            team_id="T1",
+            bot_user_id="UBOT",
+            bot_id="BBOT",
+            bot_token="xoxb-bench",
+        ),
+    )
+
+
+def _register(app, entered, channel_index):
+    """Register the benchmark listeners; entered counts watcher bodies run."""
+    for pattern in COMMANDS:
+
+        @app.message(pattern, matchers=[is_not_bot_message])
+        def command(message):
+            entered["command"] += 1
+
+    if channel_index:
+
+        @app.event("message", matchers=[in_channel(ALERTS)])
+        def watch_alerts(event):
+            entered["alerts"] += 1
+
+        @app.event("reaction_added", matchers=[in_channel(DEVOPS)])
+        def watch_fires(event):
+            entered["fires"] += 1
+
+    else:
+
+        @app.event("message")
+        def watch_alerts(event):
+            entered["alerts"] += 1
+            if event.get("channel") != ALERTS:
+                return
+
+        @app.event("reaction_added")
+        def watch_fires(event):
+            entered["fires"] += 1
+            if event["item"]["channel"] != DEVOPS:
+                return
+
+
+def _traffic(n):
+    """n events: 1 in 20 an alert, 1 in 10 a reaction, the rest chatter."""
+    events = []
+    for i in range(n):
+        channel = f"C{i % 40:04d}"
+        if i % 20 == 0:
+            event = {
+                "type": "message",
+                "subtype": "bot_message",
+                "bot_id": "BALERT",
+                "channel": ALERTS,
+                "text": "[FIRING:1] disk usage above 90%",
+            }
+        elif i % 10 == 5:
+            event = {
+                "type": "reaction_added",
+                "user": "U1",
+                "reaction": "fire" if i % 30 == 5 else "eyes",
+                "item": {
+                    "type": "message",
+                    "channel": DEVOPS if i % 30 == 5 else channel,
+                    "ts": "1.1",
+                },
+            }
+        else:
+            event = {
+                "type": "message",
+                "user": "U1",
+                "channel": channel,
+                "channel_type": "channel",
+                "text": CHATTER[i % len(CHATTER)],
+            }
+        events.append(
+            BoltRequest(
+                body={"type": "event_callback", "team_id": "T1", "event": event},
+                mode="socket_mode",
+            )
+        )
+    return events
+
+
+def run(n):
+    results = {}
+    for name, channel_index in (("bolt", False), ("router", True)):
+        app = _app()
+        entered = {"command": 0, "alerts": 0, "fires": 0}
+        _register(MessageRouter(app) if channel_index else app, entered, channel_index)
+        requests = _traffic(n)
+        # Warm up: build the router's classifier, index and pre-filter
+        for req in requests[:50]:
+            app.dispatch(req)
+        entered.update(command=0, alerts=0, fires=0)
+
+        start = time.perf_counter()
+        for req in requests:
+            app.dispatch(req)
+        elapsed = time.perf_counter() - start
+        results[name] = (elapsed / n * 1e6, dict(entered))
+    return results
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    results = run(n)
+    print(f"{n} events")
+    for name, (us, entered) in results.items():
+        print(
+            f"{name:>7}: {us:8.1f} us/event   "
+            f"alerts watcher entered {entered['alerts']:>5}   "
+            f"fire watcher entered {entered['fires']:>5}"
+        )
+    bolt, router = results["bolt"][0], results["router"][0]
+    print(f"speedup: {bolt / router:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
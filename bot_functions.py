@@ -8,55 +8,84 @@ user mapping, data retrieval, and message handling.
 import base64
 import csv
 import json
+import logging
 import os
 import random
 import re
 import urllib.request
-import requests
+
+import async_http_client
+import http_client
+from directory_functions import get_channel_index, get_user_directory
+
+logger = logging.getLogger(__name__)
+
+
+BRANCHES_URL = "https://find-branches-by-bugs.tools.bywatersolutions.com"
 
 
 def load_bywaterbot_data():
     """Load bywaterbot_data from URL, environment variable, or local file."""
     data = None
-    source = ""
 
     # Try to load from URL first
     if os.environ.get("BYWATER_BOT_DATA_URL") and os.environ.get(
         "BYWATER_BOT_GITHUB_TOKEN"
     ):
-        print("Loading bywaterbot_data from URL")
+        logger.info("Loading bywaterbot_data from URL")
         data = get_data_from_url(
             os.environ["BYWATER_BOT_DATA_URL"],
             os.environ["BYWATER_BOT_GITHUB_TOKEN"],
         )
-        if data:
-            print("Successfully loaded bywaterbot_data from URL")
-            source = "URL"
+    return _bywaterbot_data_or_fallback(data)
+
+
+async def load_bywaterbot_data_async():
+    """load_bywaterbot_data for the asyncio edition, fetching the URL with
+    async_http_client."""
+    data = None
+    if os.environ.get("BYWATER_BOT_DATA_URL") and os.environ.get(
+        "BYWATER_BOT_GITHUB_TOKEN"
+    ):
+        logger.info("Loading bywaterbot_data from URL")
+        data = await get_data_from_url_async(
+            os.environ["BYWATER_BOT_DATA_URL"],
+            os.environ["BYWATER_BOT_GITHUB_TOKEN"],
+        )
+    return _bywaterbot_data_or_fallback(data)
+
+
+def _bywaterbot_data_or_fallback(data):
+    """Return data fetched from the URL, else from the environment or file."""
+    source = ""
+    if data:
+        logger.info("Successfully loaded bywaterbot_data from URL")
+        source = "URL"
 
     # Fall back to environment variable
     if not data and os.environ.get("BYWATER_BOT_DATA"):
         try:
-            print("Loading bywaterbot_data from environment variable")
+            logger.info("Loading bywaterbot_data from environment variable")
             data = json.loads(os.environ.get("BYWATER_BOT_DATA"))
             source = "environment variable"
         except json.JSONDecodeError as e:
-            print(f"Error parsing BYWATER_BOT_DATA: {e}")
+            logger.error("Error parsing BYWATER_BOT_DATA: %s", e)
 
     # Fall back to local file
     if not data and os.path.exists("data.json"):
         try:
             with open("data.json") as f:
-                print("Loading bywaterbot_data from local file")
+                logger.info("Loading bywaterbot_data from local file")
                 data = json.load(f)
                 source = "local file"
         except Exception as e:
-            print(f"Error loading data.json: {e}")
+            logger.error("Error loading data.json: %s", e)
 
     if data:
-        print(f"Successfully loaded bywaterbot_data from {source}")
+        logger.info("Successfully loaded bywaterbot_data from %s", source)
         return data
     else:
-        print("Failed to load bywaterbot_data from any source")
+        logger.error("Failed to load bywaterbot_data from any source")
         raise Exception("Failed to load bywaterbot_data from any source")
 
 
@@ -75,33 +104,64 @@ def get_data_from_url(url, token):
         The parsed JSON data (dict or list) if successful, otherwise None.
     """
     try:
-        # Convert GitHub blob/edit URL to API URL for reliable private access
-        # Matches: github.com/owner/repo/blob/branch/path/to/file
-        github_pattern = re.compile(
-            r"github\.com/([^/]+)/([^/]+)/(?:blob|edit)/([^/]+)/(.+)"
-        )
-        match = github_pattern.search(url)
-
-        if match:
-            owner, repo, branch, path = match.groups()
-            # Construct API URL: https://api.github.com/repos/OWNER/REPO/contents/PATH?ref=BRANCH
-            url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref={branch}"
-
-        response = requests.get(
-            url,
-            headers={
-                "Authorization": f"Bearer {token}",
-                "Accept": "application/vnd.github.v3.raw",
-            },
-            timeout=10,
+        url = _github_api_url(url)
+        response = http_client.get(url, headers=_github_headers(token), timeout=10)
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        logger.error("Error fetching data from URL %s: %s", url, e)
+        return None
+
+
+async def get_data_from_url_async(url, token):
+    """get_data_from_url, over async_http_client."""
+    try:
+        url = _github_api_url(url)
+        response = await async_http_client.get(
+            url, headers=_github_headers(token), timeout=10
         )
         response.raise_for_status()
         return response.json()
     except Exception as e:
-        print(f"Error fetching data from URL {url}: {e}")
+        logger.error("Error fetching data from URL %s: %s", url, e)
         return None
 
 
+def _github_api_url(url):
+    """Convert a GitHub blob/edit URL to the contents API URL for reliable
+    private access; any other URL is returned as is."""
+    # Matches: github.com/owner/repo/blob/branch/path/to/file
+    github_pattern = re.compile(
+        r"github\.com/([^/]+)/([^/]+)/(?:blob|edit)/([^/]+)/(.+)"
+    )
+    match = github_pattern.search(url)
+    if not match:
+        return url
+    owner, repo, branch, path = match.groups()
+    # Construct API URL: https://api.github.com/repos/OWNER/REPO/contents/PATH?ref=BRANCH
+    return f"https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref={branch}"
+
+
+def _github_headers(token):
+    return {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github.v3.raw",
+    }
+
+
+def find_branches(bug, shortname):
+    """Ask the find-branches tool which of shortname's Koha branches contain
+    bug. Returns a list of branch names; raises on errors."""
+    res = http_client.get(f"{BRANCHES_URL}/{bug}/{shortname}")
+    return json.loads(res.text)
+
+
+async def find_branches_async(bug, shortname):
+    """find_branches, over async_http_client."""
+    res = await async_http_client.get(f"{BRANCHES_URL}/{bug}/{shortname}")
+    return json.loads(res.text)
+
+
 def _parse_github_repo_url(url):
     """Parse a github.com blob/edit URL into (owner, repo, branch, path).
 
@@ -127,11 +187,11 @@ def read_bywaterbot_data_for_update():
     if url and token:
         coords = _parse_github_repo_url(url)
         if not coords:
-            print(f"Could not parse BYWATER_BOT_DATA_URL for update: {url}")
+            logger.error("Could not parse BYWATER_BOT_DATA_URL for update: %s", url)
             return None, None
         owner, repo, branch, path = coords
         try:
-            resp = requests.get(
+            resp = http_client.get(
                 f"https://api.github.com/repos/{owner}/{repo}/contents/{path}",
                 headers={
                     "Authorization": f"Bearer {token}",
@@ -155,7 +215,7 @@ def read_bywaterbot_data_for_update():
             }
             return data, context
         except Exception as e:
-            print(f"Error reading bywaterbot_data from GitHub for update: {e}")
+            logger.error("Error reading bywaterbot_data from GitHub for update: %s", e)
             return None, None
 
     # Local fallback ( dev / when no repo is configured )
@@ -165,7 +225,7 @@ def read_bywaterbot_data_for_update():
                 data = json.load(f)
             return data, {"source": "local", "path": "data.json"}
         except Exception as e:
-            print(f"Error reading local data.json for update: {e}")
+            logger.error("Error reading local data.json for update: %s", e)
             return None, None
 
     return None, None
@@ -181,7 +241,7 @@ def write_bywaterbot_data(data, context, commit_message):
 
     if context["source"] == "github":
         try:
-            resp = requests.put(
+            resp = http_client.put(
                 f"https://api.github.com/repos/{context['owner']}/{context['repo']}"
                 f"/contents/{context['path']}",
                 headers={
@@ -201,7 +261,7 @@ def write_bywaterbot_data(data, context, commit_message):
             resp.raise_for_status()
             return True
         except Exception as e:
-            print(f"Error writing bywaterbot_data to GitHub: {e}")
+            logger.error("Error writing bywaterbot_data to GitHub: %s", e)
             return False
 
     try:
@@ -209,7 +269,7 @@ def write_bywaterbot_data(data, context, commit_message):
             f.write(serialized)
         return True
     except Exception as e:
-        print(f"Error writing local data.json: {e}")
+        logger.error("Error writing local data.json: %s", e)
         return False
 
 
@@ -233,21 +293,24 @@ def get_devops_fire_duty_asignee(app, channel_id):
         # Get channel info
         channel_info = app.client.conversations_info(channel=channel_id)
         topic = channel_info.get("channel", {}).get("topic", {}).get("value", "")
-        print(f"Topic: {topic}")
+        logger.debug("Topic: %s", topic)
 
         # Extract name using regex
         name_match = re.search(r"is\s+(\w+\s*\w*)\n", topic)
         if name_match:
             name = name_match.group(1)
-            print(f"Found name in topic: {name}")
+            logger.debug("Found name in topic: %s", name)
             return name
     except Exception as e:
-        print(f"Error processing channel topic: {e}")
+        logger.error("Error processing channel topic: %s", e)
 
 
 def get_channel_id_by_name(app, channel_name):
     """Return the Slack channel ID for a given channel name.
 
+    Served from the shared channel index ( see directory_functions ), which
+    pages through conversations_list once and then follows channel events.
+
     Args:
         app: Slack ``App`` instance.
         channel_name: Human‑readable name of the channel (without the ``#``).
@@ -255,21 +318,10 @@ def get_channel_id_by_name(app, channel_name):
     Returns:
         The channel ID string if found, otherwise ``None``.
     """
-    """
-    Get channel ID by channel name
-    """
     try:
-        # Get all channels
-        result = app.client.conversations_list()
-        channels = result.get("channels", [])
-
-        # Find the channel by name
-        for channel in channels:
-            if channel.get("name", "") == channel_name:
-                return channel.get("id")
-        return None
+        return get_channel_index(app).channel_id(channel_name)
     except Exception as e:
-        print(f"Error getting channel ID: {e}")
+        logger.error("Error getting channel ID: %s", e)
         return None
 
 
@@ -277,7 +329,9 @@ def get_name_to_id_mapping(app):
     """Build a mapping from user display names to Slack user IDs.
 
     The mapping includes ``display_name``, ``name`` and ``real_name`` keys,
-    all lower‑cased for case‑insensitive lookup.
+    all lower‑cased for case‑insensitive lookup. Served from the shared user
+    directory cache ( see directory_functions ), so only the first call pays
+    for a users_list download.
 
     Args:
         app: Slack ``App`` instance.
@@ -285,20 +339,7 @@ def get_name_to_id_mapping(app):
     Returns:
         Dictionary mapping lower‑cased names to user IDs.
     """
-    name_to_id = {}
-    name_to_info = {}
-    resp = app.client.users_list()
-    users = resp["members"]
-    for u in users:
-        name_to_id[u["profile"]["display_name"].lower()] = u["id"]
-        if "name" in u and not u["name"].lower() in name_to_id:
-            name_to_id[u["name"].lower()] = u["id"]
-        if "real_name" in u and not u["real_name"].lower() in name_to_id:
-            name_to_id[u["real_name"].lower()] = u["id"]
-
-        if "real_name" in u and ("is_bot" not in u or not u["is_bot"]):
-            name_to_info[u["real_name"]] = u
-    return name_to_id, name_to_info
+    return get_user_directory(app).mappings()
 
 
 def get_karma_pep_talks(url):
@@ -0,0 +1,183 @@
+"""
+Bot Logging Module
+
+Structured, non-blocking logging for the bot. Modules log through the
+standard library as usual:
+
+    logger = logging.getLogger(__name__)
+    logger.info("Opened devops-alert incident %s", incident_id)
+
+and configure_logging(), called once at startup, routes every record
+through a QueueHandler: the handler thread only puts the record on a queue,
+and a QueueListener thread formats it and writes it to stdout. A slow or
+unbuffered stdout ( python -u in the Dockerfile ) no longer holds up a
+Slack handler.
+
+- LOG_LEVEL ( default INFO ) sets the level; per-event detail ( channel
+  topics, every duty calendar event, karma grants ) is logged at DEBUG, so
+  production doesn't pay for it.
+- LOG_FORMAT ( default json ) picks one JSON object per line, or "text" for
+  plain lines when running locally.
+- Secrets are redacted before anything is written: values under secret-looking
+  keys ( *TOKEN*, *SECRET*, *PASSWORD*, CREDENTIALS_JSON, ... ) in logged
+  dicts, and token-shaped strings ( Slack xox*/xapp-, GitHub ghp_, Bearer /
+  Zoho-oauthtoken headers ) anywhere in a message. Log bywaterbot_data with
+  redact() rather than printing it.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+
+REDACTED = "[REDACTED]"
+
+# Keys whose values are never logged
+SECRET_KEY_PATTERN = re.compile(
+    r"token|secret|passw(?:or)?d|credential|api[_-]?key|private[_-]?key"
+    r"|(?:^|_)auth(?:_|$)|(?:^|_)sid$",
+    re.IGNORECASE,
+)
+
+# Secrets that can turn up inside any string
+SECRET_VALUE_PATTERN = re.compile(
+    r"\b(?:xox[abposr]-[A-Za-z0-9-]+|xapp-[A-Za-z0-9-]+|gh[pousr]_[A-Za-z0-9]{20,})"
+    r"|(?<=Bearer )[A-Za-z0-9._~+/=-]+"
+    r"|(?<=Zoho-oauthtoken )[A-Za-z0-9._-]+"
+)
+
+# LogRecord attributes; anything else on a record came from extra={...}
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener = None
+
+
+def redact(value):
+    """A copy of value with secrets replaced by [REDACTED].
+
+    Dicts ( and lists of them ) are walked: a secret-looking key's value is
+    dropped whatever it is, and strings are scrubbed of token-shaped text.
+    """
+    if isinstance(value, dict):
+        return {key: _redact_field(key, item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(item) for item in value)
+    if isinstance(value, str):
+        return SECRET_VALUE_PATTERN.sub(REDACTED, value)
+    return value
+
+
+def _redact_field(key, value):
+    if isinstance(key, str) and SECRET_KEY_PATTERN.search(key) and value:
+        return REDACTED
+    return redact(value)
+
+
+class RedactingFilter(logging.Filter):
+    """Scrub secrets from a record's message, arguments and extra fields."""
+
+    def filter(self, record):
+        if record.args:
+            record.args = redact(record.args)
+        if isinstance(record.msg, (str, dict, list)):
+            record.msg = redact(record.msg)
+        for key, value in list(vars(record).items()):
+            if key not in _RECORD_FIELDS:
+                setattr(record, key, _redact_field(key, value))
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queue records with their message and traceback already rendered ( the
+    arguments may not survive the trip ), keeping the traceback separate."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, any extra
+    fields, and the traceback if there is one."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def _formatter(log_format):
+    if log_format == "text":
+        return logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(threadName)s] %(message)s"
+        )
+    return JsonFormatter()
+
+
+def configure_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, stream=None):
+    """Send every log record through a queue to a background writer thread.
+
+    Safe to call more than once; the last call's settings win. The writer
+    is stopped, and the queue flushed, by stop_logging() or at exit.
+    """
+    global _listener
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(_formatter(log_format))
+
+    records = queue.SimpleQueue()
+    # Redact on the queue side, before the record leaves the handler thread
+    queued = _QueueHandler(records)
+    queued.addFilter(RedactingFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queued)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(
+        records, output, respect_handler_level=True
+    )
+    _listener.start()
+
+
+def stop_logging():
+    """Write out everything queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,251 @@
+"""
+Bugzilla Functions Module
+
+Looks up Koha community bugs on bugs.koha-community.org via the Bugzilla REST
+API. Every bug mentioned in a message is fetched with one multi-id request,
+asking only for the fields the bot shows.
+
+Lookups read through a small SQLite cache ( BUGZILLA_CACHE_DB ) that survives
+restarts. Closed bugs stay fresh for days and open ones for minutes; once an
+entry goes stale it is revalidated by asking Bugzilla only for the bugs changed
+since their stored last_change_time, so unchanged bugs cost no bug data.
+
+get_koha_bugs_async is the asyncio edition's twin of get_koha_bugs, with the
+same cache, over async_http_client.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import async_http_client
+import http_client
+
+logger = logging.getLogger(__name__)
+
+BUGZILLA_URL = "https://bugs.koha-community.org/bugzilla3"
+BUG_FIELDS = "id,summary,status,is_open,last_change_time"
+
+BUG_CACHE_DB = os.environ.get("BUGZILLA_CACHE_DB", "bugzilla_cache.sqlite3")
+OPEN_BUG_TTL_SECONDS = 10 * 60
+CLOSED_BUG_TTL_SECONDS = 3 * 24 * 60 * 60
+
+_bug_cache = None
+_bug_cache_lock = threading.Lock()
+
+
+def bug_url(bug_id):
+    """Return the show_bug link for a Koha community bug."""
+    return f"{BUGZILLA_URL}/show_bug.cgi?id={bug_id}"
+
+
+def _request_bugs(bug_ids, **params):
+    """Run one /rest/bug query for bug_ids and return {id: bug} for the hits.
+
+    permissive=1 makes Bugzilla skip ids that don't exist ( or that we can't
+    see ) instead of failing the whole request.
+    """
+    resp = http_client.get(
+        f"{BUGZILLA_URL}/rest/bug", params=_bug_params(bug_ids, params), timeout=10
+    )
+    resp.raise_for_status()
+    return {str(bug["id"]): bug for bug in resp.json().get("bugs", [])}
+
+
+async def _request_bugs_async(bug_ids, **params):
+    """_request_bugs, over async_http_client."""
+    resp = await async_http_client.get(
+        f"{BUGZILLA_URL}/rest/bug", params=_bug_params(bug_ids, params), timeout=10
+    )
+    resp.raise_for_status()
+    return {str(bug["id"]): bug for bug in resp.json().get("bugs", [])}
+
+
+def _bug_params(bug_ids, params):
+    return {
+        "id": ",".join(bug_ids),
+        "include_fields": BUG_FIELDS,
+        "permissive": 1,
+        **params,
+    }
+
+
+class BugCache:
+    """SQLite table of bug id -> summary/status, with per-status freshness.
+
+    One connection is shared by every thread, serialized by a lock.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS bugs (
+                    id TEXT PRIMARY KEY,
+                    summary TEXT,
+                    status TEXT,
+                    is_open INTEGER,
+                    last_change_time TEXT,
+                    checked_at REAL
+                )"""
+            )
+
+    def get_many(self, bug_ids):
+        """Return {id: ( bug, last_change_time, fresh )} for the cached ids."""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, summary, status, is_open, last_change_time, checked_at"
+                f" FROM bugs WHERE id IN ({','.join('?' * len(bug_ids))})",
+                list(bug_ids),
+            ).fetchall()
+        cached = {}
+        for bug_id, summary, status, is_open, changed, checked_at in rows:
+            ttl = OPEN_BUG_TTL_SECONDS if is_open else CLOSED_BUG_TTL_SECONDS
+            bug = {"id": bug_id, "summary": summary, "status": status}
+            cached[bug_id] = (bug, changed, now - checked_at < ttl)
+        return cached
+
+    def put_many(self, bugs):
+        """Store freshly fetched bugs, marking them checked now."""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO bugs VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        str(bug["id"]),
+                        bug.get("summary"),
+                        bug.get("status"),
+                        int(bool(bug.get("is_open", True))),
+                        bug.get("last_change_time"),
+                        now,
+                    )
+                    for bug in bugs
+                ],
+            )
+
+    def touch(self, bug_ids):
+        """Mark cached bugs as checked now; Bugzilla says they haven't changed."""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE bugs SET checked_at = ? WHERE id = ?",
+                [(now, bug_id) for bug_id in bug_ids],
+            )
+
+
+def get_bug_cache():
+    """Return the shared BugCache, opening BUGZILLA_CACHE_DB on first use."""
+    global _bug_cache
+    with _bug_cache_lock:
+        if _bug_cache is None:
+            _bug_cache = BugCache(BUG_CACHE_DB)
+        return _bug_cache
+
+
+def _revalidate(cache, stale):
+    """Refresh stale cache entries, fetching only the bugs that changed.
+
+    stale is {id: ( bug, last_change_time )}. Asks for the stale ids changed
+    since the oldest stored last_change_time; anything not returned is
+    unchanged. Returns {id: bug}; on error the stale copies are returned.
+    """
+    try:
+        changed = _request_bugs(list(stale), **_changed_since(stale))
+    except Exception as e:
+        logger.error(
+            "Error revalidating bugs %s, serving cached copies: %s", list(stale), e
+        )
+        return {bug_id: bug for bug_id, (bug, _) in stale.items()}
+    return _apply_revalidation(cache, stale, changed)
+
+
+async def _revalidate_async(cache, stale):
+    """_revalidate, over async_http_client."""
+    try:
+        changed = await _request_bugs_async(list(stale), **_changed_since(stale))
+    except Exception as e:
+        logger.error(
+            "Error revalidating bugs %s, serving cached copies: %s", list(stale), e
+        )
+        return {bug_id: bug for bug_id, (bug, _) in stale.items()}
+    return _apply_revalidation(cache, stale, changed)
+
+
+def _changed_since(stale):
+    """The last_change_time filter for revalidating stale, if there is one."""
+    since = min((changed or "" for _, changed in stale.values()), default="")
+    return {"last_change_time": since} if since else {}
+
+
+def _apply_revalidation(cache, stale, changed):
+    cache.put_many(changed.values())
+    cache.touch([bug_id for bug_id in stale if bug_id not in changed])
+    return {bug_id: changed.get(bug_id, bug) for bug_id, (bug, _) in stale.items()}
+
+
+def get_koha_bugs(bug_ids):
+    """Fetch several Koha community bugs, reading through the bug cache.
+
+    Fresh cached bugs cost nothing; stale ones are revalidated and uncached
+    ones fetched, each group in at most one REST call.
+
+    Args:
+        bug_ids: Bug numbers, as strings or ints.
+
+    Returns:
+        A dict of bug id ( str ) -> {"id", "summary", "status"}, or None for
+        ids Bugzilla didn't return, in the order given.
+
+    Raises:
+        requests.RequestException ( or ValueError for a non-JSON reply ) when
+        uncached bugs can't be fetched from Bugzilla.
+    """
+    bug_ids, cache, found, stale, missing = _plan_lookup(bug_ids)
+    if stale:
+        found.update(_revalidate(cache, stale))
+    if missing:
+        fetched = _request_bugs(missing)
+        cache.put_many(fetched.values())
+        found.update(fetched)
+    return {bug_id: found.get(bug_id) for bug_id in bug_ids}
+
+
+async def get_koha_bugs_async(bug_ids):
+    """get_koha_bugs for the asyncio edition: same cache, same result, but
+    the Bugzilla requests go through async_http_client."""
+    bug_ids, cache, found, stale, missing = _plan_lookup(bug_ids)
+    if stale:
+        found.update(await _revalidate_async(cache, stale))
+    if missing:
+        fetched = await _request_bugs_async(missing)
+        cache.put_many(fetched.values())
+        found.update(fetched)
+    return {bug_id: found.get(bug_id) for bug_id in bug_ids}
+
+
+def _plan_lookup(bug_ids):
+    """Split a lookup into what the cache can answer and what it can't.
+
+    Returns ( bug_ids, cache, found, stale, missing ): the ids deduplicated as
+    strings, the BugCache, {id: bug} for fresh hits, {id: ( bug,
+    last_change_time )} to revalidate, and the ids to fetch outright.
+    """
+    bug_ids = list(dict.fromkeys(str(bug_id) for bug_id in bug_ids))
+    if not bug_ids:
+        return bug_ids, None, {}, {}, []
+
+    cache = get_bug_cache()
+    cached = cache.get_many(bug_ids)
+    found = {bug_id: bug for bug_id, (bug, _, fresh) in cached.items() if fresh}
+    stale = {
+        bug_id: (bug, changed)
+        for bug_id, (bug, changed, fresh) in cached.items()
+        if not fresh
+    }
+    missing = [bug_id for bug_id in bug_ids if bug_id not in cached]
+    return bug_ids, cache, found, stale, missing
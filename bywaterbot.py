@@ -5,26 +5,48 @@ Main application module for the ByWater Slack bot. Sets up the Slack Bolt app, l
 and registers message handlers from other modules.
 """
 
+import logging
 import os
 import threading
 import time
 import schedule
 from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
 
 # Import configuration and handlers
 from config import load_config, refresh_data
 from bot_functions import get_quote
+from bot_logging import configure_logging
 from version import __version__
 
-from calendar_functions import get_google_creds
+from calendar_functions import (
+    ROSTER_REFRESH_MINUTES,
+    get_google_creds,
+    refresh_duty_roster,
+)
 from devops_handlers import register_devops_handlers
 from devops_alerts_handlers import register_devops_alerts_handlers
+from directory_handlers import register_directory_handlers
 from general_handlers import register_general_handlers
 from karma_handlers import register_karma_handlers
 from support_handlers import register_support_handlers, register_ticket_notifier
 from partner_handlers import register_partner_handlers
 from contact_handlers import register_contact_handlers
+from message_router import MessageRouter
+from metered_clients import MeteredWebClient
+from metrics import METRICS_PORT, start_metrics_server, watch_worker_pool
+from sms_outbox import get_sms_outbox
+from socket_mode_metrics import (
+    MeteredListenerExecutor,
+    MeteredSocketModeHandler,
+    time_acks,
+)
+
+logger = logging.getLogger(__name__)
+
+# Message routing priorities, lowest first ( see register_handlers )
+NOTIFIER_PRIORITY = 10
+COMMAND_PRIORITY = 50
+WATCHER_PRIORITY = 90
 
 
 def run_scheduler():
@@ -32,43 +54,65 @@ def run_scheduler():
     # Initial refresh to ensure we have fresh data on startup
     refresh_data()
 
-    # Schedule hourly refreshes
+    # Schedule hourly refreshes, and keep the duty roster current
     schedule.every().hour.do(refresh_data)
+    schedule.every(ROSTER_REFRESH_MINUTES).minutes.do(refresh_duty_roster)
 
     while True:
         schedule.run_pending()
         time.sleep(60)  # Check every minute
 
 
-def register_handlers(app):
-    """Register every handler, in the order Bolt has to see them.
+def register_handlers(app, router_class=MessageRouter):
+    """Register every handler and return the MessageRouter that dispatches them.
+
+    Message listeners are routed by priority, not registration order ( see
+    message_router ). The #tickets new-ticket notifier goes first: its specific
+    "New Ticket" pattern must win over the broader help/lookup handlers, which
+    also match the Zoho Flow post. The #devops-alerts watcher is a catch-all
+    @app.event("message") that matches every message, so it goes last or it
+    shadows every command. Commands share the priority in between and keep
+    their registration order among themselves.
 
-    Bolt runs only the first @app.message listener that matches a message, so
-    order matters. The #tickets new-ticket notifier registers first: its
-    specific "New Ticket" pattern must win over the broader help/lookup handlers,
-    which also match the Zoho Flow post. The #devops-alerts watcher uses a
-    catch-all @app.event("message") that matches every message, so it registers
-    last or it shadows the partner and contact commands below it.
+    The user directory listeners handle user_change / team_join, not messages,
+    so they aren't routed at all.
+
+    The asyncio edition passes router_class=AsyncMessageRouter.
     """
-    register_ticket_notifier(app)
-    register_general_handlers(app)
-    register_karma_handlers(app)
-    register_support_handlers(app)
-    register_devops_handlers(app)
-    register_partner_handlers(app)
-    register_contact_handlers(app)
-    register_devops_alerts_handlers(app)
+    router = router_class(app)
+    register_directory_handlers(router)
+    with router.priority(NOTIFIER_PRIORITY):
+        register_ticket_notifier(router)
+    with router.priority(COMMAND_PRIORITY):
+        register_general_handlers(router)
+        register_karma_handlers(router)
+        register_support_handlers(router)
+        register_devops_handlers(router)
+        register_partner_handlers(router)
+        register_contact_handlers(router)
+    with router.priority(WATCHER_PRIORITY):
+        register_devops_alerts_handlers(router)
+    return router
 
 
 if __name__ == "__main__":
-    print(f"ByWaterBot {__version__} is starting up!")
+    configure_logging()
+    logger.info("ByWaterBot %s is starting up!", __version__)
 
     # 1. Load Configuration
     load_config()
 
+    # Send anything left in the SMS outbox by the last run ( see sms_outbox )
+    get_sms_outbox()
+
     # 2.Initialize App
     slack_bot_token = os.environ.get("SLACK_BOT_TOKEN")
-    app = App(token=slack_bot_token)
+    app = App(
+        client=MeteredWebClient(token=slack_bot_token),
+        listener_executor=MeteredListenerExecutor(),
+    )
+    # First, so it times the acks of requests the router's pre-filter drops too
+    app.use(time_acks)
 
     # 3. Start Scheduler
     scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
@@ -80,15 +124,21 @@ if __name__ == "__main__":
     # quote = get_quote(url=quotes_csv_url)
 
     # Initialize Google Calendar credentials
-    print("Initializing Google Calendar credentials...")
+    logger.info("Initializing Google Calendar credentials...")
     try:
         get_google_creds()
-        print("Google Calendar credentials initialized successfully")
+        logger.info("Google Calendar credentials initialized successfully")
+        refresh_duty_roster()
     except Exception as e:
-        print(f"Warning: Failed to initialize Google Calendar credentials: {e}")
+        logger.warning("Failed to initialize Google Calendar credentials: %s", e)
+
+    # 5. Register Handlers ( routed by priority — see register_handlers )
+    router = register_handlers(app)
 
-    # 5. Register Handlers ( order matters — see register_handlers )
-    register_handlers(app)
+    # 6. Serve metrics ( see metrics and socket_mode_metrics )
+    watch_worker_pool(router.lazy_pool)
+    if METRICS_PORT:
+        start_metrics_server()
 
-    # 6. Start the App
-    SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start()
+    # 7. Start the App
+    MeteredSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start()
@@ -2,12 +2,18 @@
 Calendar Functions Module
 
 Provides functionality to interact with the Google Calendar API.
-Used to identify the user currently assigned to weekend help desk duty.
+Used to identify the user currently assigned to weekend help desk duty and to
+developer / systems fire duty, answered from an in-memory duty roster.
 """
 
+import bisect
 import datetime
+import logging
+import os
 import os.path
 import re
+import threading
+import time
 
 from datetime import timedelta
 from google.auth.transport.requests import Request
@@ -16,6 +22,37 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from metered_clients import MeteredHttpRequest
+
+logger = logging.getLogger(__name__)
+
+WEEKEND_CALENDAR = "Weekend Help Desk"
+DEPARTMENT_CALENDARS = {
+    "dev": "Fire Duty - Developers",
+    "systems": "Fire Duty - Systems",
+}
+
+# Calendar summary -> id map; re-listed every few hours, or sooner when a
+# lookup misses ( a calendar was just shared with us or renamed )
+CALENDAR_IDS_TTL_SECONDS = 6 * 60 * 60
+CALENDAR_IDS_MISS_RETRY_SECONDS = 5 * 60
+
+# The duty roster holds each duty calendar's events from ROSTER_LOOKBACK_DAYS
+# ago to ROSTER_LOOKAHEAD_DAYS ahead in memory. The scheduler reloads it every
+# DUTY_ROSTER_REFRESH_MINUTES; a lookup reloads it itself if that stalls.
+ROSTER_LOOKBACK_DAYS = 7
+ROSTER_LOOKAHEAD_DAYS = 28
+ROSTER_REFRESH_MINUTES = int(os.environ.get("DUTY_ROSTER_REFRESH_MINUTES", "5"))
+ROSTER_MAX_AGE_SECONDS = ROSTER_REFRESH_MINUTES * 60 * 3
+# Refreshes only fetch what changed ( sync tokens ); a full listing still runs
+# daily so the lookahead window keeps moving forward
+ROSTER_FULL_SYNC_SECONDS = 24 * 60 * 60
+
+_service_local = threading.local()
+_calendar_ids = {}
+_calendar_ids_loaded_at = 0
+_calendar_ids_lock = threading.Lock()
+
 
 def main():
     """Execute the main flow to find and print the weekend duty user.
@@ -30,172 +67,274 @@ def main():
 
 
 def get_weekday_duty(department):
+    """Retrieve the current weekday duty event for a department.
 
-    if department == "dev":
-        calendar_name = "Fire Duty - Developers"
-    elif department == "systems":
-        calendar_name = "Fire Duty - Systems"
-
-    """Retrieve the current weekday duty event from Google Calendar.
-
-    Authenticates with the Google Calendar API (handling OAuth token flow),
-    finds the correct calendar based on the department parameter ( "dev" or "systems"),
-    and searches for the event overlapping the current date and time.
+    Answers from the in-memory duty roster for the department's calendar
+    ( "dev" or "systems" ). Only timed events count for weekday duty.
 
     Returns:
         dict: A dictionary representation of the Google Calendar event if found,
         otherwise None.
     """
+    if department not in DEPARTMENT_CALENDARS:
+        logger.warning("Unknown duty department '%s'.", department)
+        return None
+    return get_duty_event(department, timed_only=True)
 
-    try:
-        creds = get_google_creds()
-        service = build("calendar", "v3", credentials=creds)
 
-        # Find the Fire Duty calendar by name
-        page_token = None
-        fire_duty_calendar_id = None
-        while True:
-            calendar_list = service.calendarList().list(pageToken=page_token).execute()
-            for calendar_list_entry in calendar_list["items"]:
-                if calendar_list_entry["summary"] == calendar_name:
-                    fire_duty_calendar_id = calendar_list_entry["id"]
-                    break
-            page_token = calendar_list.get("nextPageToken")
-            if fire_duty_calendar_id or not page_token:
-                break
-
-        if not fire_duty_calendar_id:
-            print(f"Calendar '{calendar_name}' not found.")
-            return None
+def get_weekend_duty():
+    """Retrieve the current weekend help desk event.
 
-        # Get events for the current hour only
-        now = datetime.datetime.utcnow()
+    Answers from the in-memory duty roster for the "Weekend Help Desk"
+    calendar. All-day events cover their whole dates in local time.
 
-        # FIXME: list() will only return events that start after timeMin and end before timeMax
-        # This means that if an event starts before timeMin and ends after timeMax, it will not be returned
-        # https://chatgpt.com/share/6985f4b9-5208-800c-be86-adbf8c9cb9ae
+    Returns:
+        dict: A dictionary representation of the Google Calendar event if found,
+        otherwise None.
+    """
+    return get_duty_event("weekend")
 
-        start_of_yesterday = now.replace(
-            hour=0, minute=0, second=0, microsecond=0
-        ) - timedelta(days=1)
-        end_of_tomorrow = now.replace(
-            hour=23, minute=59, second=59, microsecond=999999
-        ) + timedelta(days=1)
 
-        time_min = start_of_yesterday.isoformat() + "Z"
-        time_max = end_of_tomorrow.isoformat() + "Z"
+def _event_bounds(event):
+    """Return ( start, end, timed ) for an event, as epoch seconds.
 
-        print(
-            f"Getting events for {calendar_name} from {start_of_yesterday} to {end_of_tomorrow} UTC"
-        )
-        events_result = (
-            service.events()
-            .list(
-                calendarId=fire_duty_calendar_id,
-                timeMin=time_min,
-                timeMax=time_max,
-                maxResults=100,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
+    Timed events use their exact dateTime; all-day events run from local
+    midnight on their start date to local midnight on their ( exclusive ) end
+    date, matching how weekend duty has always been read.
+    """
+    start = event["start"]
+    end = event["end"]
+    if "dateTime" in start:
+        return (
+            datetime.datetime.fromisoformat(start["dateTime"]).timestamp(),
+            datetime.datetime.fromisoformat(end["dateTime"]).timestamp(),
+            True,
         )
-        events = events_result.get("items", [])
+    return (
+        datetime.datetime.strptime(start["date"], "%Y-%m-%d").timestamp(),
+        datetime.datetime.strptime(end["date"], "%Y-%m-%d").timestamp(),
+        False,
+    )
 
-        if not events:
-            print("No events found for today.")
-            return None
-
-        # Find the event that overlaps with the current time
-        current_dt = datetime.datetime.now(datetime.timezone.utc)
-        print("Current time:", current_dt)
-        for event in events:
-            start_of_event = event["start"].get("dateTime", event["start"].get("date"))
-            end_of_event = event["end"].get("dateTime", event["end"].get("date"))
 
-            print(f"Event: {event['summary']} ({start_of_event} to {end_of_event})")
+class DutyIntervals:
+    """Sorted interval index over one duty calendar's events.
 
-            # For all-day events, compare dates; for timed events, compare timestamps
-            if "T" in start_of_event:  # Timed event
-                start_dt = datetime.datetime.fromisoformat(start_of_event)
-                end_dt = datetime.datetime.fromisoformat(end_of_event)
+    Events are kept sorted by start, alongside a running maximum of their
+    ends, so "who is on duty at t" is a bisect on the starts plus a short walk
+    back over just the events that could still be running at t.
+    """
 
-                if start_dt <= current_dt <= end_dt:
-                    print(
-                        f"Found current event: {event['summary']} ({start_of_event} to {end_of_event})"
-                    )
-                    return event
+    __slots__ = ("starts", "ends", "max_ends", "timed", "events")
 
-        print("No event found for current time.")
-        return None
+    def __init__(self, events):
+        entries = []
+        for event in events:
+            try:
+                start, end, timed = _event_bounds(event)
+            except (KeyError, ValueError) as e:
+                logger.warning(
+                    "Skipping unreadable duty event %s: %s", event.get("id"), e
+                )
+                continue
+            entries.append((start, end, timed, event))
+        entries.sort(key=lambda entry: entry[0])
+
+        self.starts = [entry[0] for entry in entries]
+        self.ends = [entry[1] for entry in entries]
+        self.timed = [entry[2] for entry in entries]
+        self.events = [entry[3] for entry in entries]
+        self.max_ends = []
+        running = float("-inf")
+        for end in self.ends:
+            running = max(running, end)
+            self.max_ends.append(running)
+
+    def __len__(self):
+        return len(self.events)
+
+    def at(self, when, timed_only=False):
+        """Return the earliest-starting event with start <= when < end, or None."""
+        found = None
+        i = bisect.bisect_right(self.starts, when) - 1
+        # Nothing at or before i can cover `when` once max_ends[i] <= when
+        while i >= 0 and self.max_ends[i] > when:
+            if self.ends[i] > when and (self.timed[i] or not timed_only):
+                found = self.events[i]
+            i -= 1
+        return found
+
+
+class DutyCalendar:
+    """One duty calendar's slice of the roster, kept in sync incrementally.
+
+    The first load lists the whole roster window and keeps the nextSyncToken
+    Google hands back; later loads send that token and only receive events
+    that changed or were deleted since. A 410 Gone ( token invalidated ), or a
+    sync older than ROSTER_FULL_SYNC_SECONDS, falls back to a full listing so
+    the window keeps sliding forward over recurring shifts.
+    """
 
-    except Exception as error:
-        print(f"An error occurred: {error}")
-        return None
+    def __init__(self, summary):
+        self.summary = summary
+        self.events = {}  # event id -> event
+        self.sync_token = None
+        self.full_synced_at = 0
+        self.intervals = None
+        self.loaded_at = 0
+        self.lock = threading.Lock()
+
+    def _list_events(self, service, **params):
+        """Page through events().list and return ( items, nextSyncToken )."""
+        items = []
+        page_token = None
+        while True:
+            events_result = (
+                service.events()
+                .list(maxResults=250, singleEvents=True, pageToken=page_token, **params)
+                .execute()
+            )
+            items.extend(events_result.get("items", []))
+            page_token = events_result.get("nextPageToken")
+            if not page_token:
+                return items, events_result.get("nextSyncToken")
+
+    def _full_sync(self, service, calendar_id):
+        """List every event in the roster window, replacing what we hold.
+
+        timeMin bounds an event's end and timeMax its start, so events that
+        straddle the window ( e.g. a week-long duty shift that started before
+        it ) are included.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        items, self.sync_token = self._list_events(
+            service,
+            calendarId=calendar_id,
+            timeMin=(now - timedelta(days=ROSTER_LOOKBACK_DAYS)).isoformat(),
+            timeMax=(now + timedelta(days=ROSTER_LOOKAHEAD_DAYS)).isoformat(),
+        )
+        self.events = {
+            event["id"]: event for event in items if event.get("status") != "cancelled"
+        }
+        self.full_synced_at = time.time()
+        logger.info("Full sync of '%s': %d events", self.summary, len(self.events))
+
+    def _incremental_sync(self, service, calendar_id):
+        """Apply the changes since the last sync. Returns how many there were."""
+        items, self.sync_token = self._list_events(
+            service, calendarId=calendar_id, syncToken=self.sync_token
+        )
+        for event in items:
+            if event.get("status") == "cancelled":
+                self.events.pop(event["id"], None)
+            else:
+                self.events[event["id"]] = event
+        return len(items)
+
+    def _prune(self):
+        """Drop events that ended before the roster window. Returns how many."""
+        cutoff = time.time() - ROSTER_LOOKBACK_DAYS * 24 * 60 * 60
+        expired = []
+        for event_id, event in self.events.items():
+            try:
+                if _event_bounds(event)[1] < cutoff:
+                    expired.append(event_id)
+            except (KeyError, ValueError):
+                continue
+        for event_id in expired:
+            del self.events[event_id]
+        return len(expired)
+
+    def load(self):
+        """Bring this calendar's events up to date and re-index them."""
+        service = get_calendar_service()
+        calendar_id = get_calendar_id(service, self.summary)
+        if not calendar_id:
+            raise LookupError(f"Calendar '{self.summary}' not found.")
+
+        changed = None
+        if (
+            self.sync_token
+            and time.time() - self.full_synced_at < ROSTER_FULL_SYNC_SECONDS
+        ):
+            try:
+                changed = self._incremental_sync(service, calendar_id)
+            except HttpError as error:
+                if error.resp.status != 410:
+                    raise
+                logger.info("Sync token for '%s' expired; resyncing.", self.summary)
+        if changed is None:
+            self._full_sync(service, calendar_id)
+
+        pruned = self._prune()
+        # An empty incremental sync leaves the index as it was
+        if changed != 0 or pruned or self.intervals is None:
+            self.intervals = DutyIntervals(self.events.values())
+        self.loaded_at = time.time()
+
+    def ensure_loaded(self):
+        """Load on first use, or reload if the scheduled refresh has stalled."""
+        if (
+            self.intervals is not None
+            and time.time() - self.loaded_at < ROSTER_MAX_AGE_SECONDS
+        ):
+            return
+        with self.lock:
+            if (
+                self.intervals is not None
+                and time.time() - self.loaded_at < ROSTER_MAX_AGE_SECONDS
+            ):
+                return
+            try:
+                self.load()
+            except Exception as error:
+                # A stale roster beats no roster; keep serving it if we have one
+                logger.error(
+                    "Error loading duty calendar '%s': %s", self.summary, error
+                )
 
 
-def get_weekend_duty():
-    """Retrieve the current weekend help desk event from Google Calendar.
+_duty_roster = {
+    key: DutyCalendar(summary)
+    for key, summary in {"weekend": WEEKEND_CALENDAR, **DEPARTMENT_CALENDARS}.items()
+}
 
-    Authenticates with the Google Calendar API (handling OAuth token flow),
-    finds the "Weekend Help Desk" calendar, and searches for the event
-    corresponding to the current date.
 
-    Returns:
-        dict: A dictionary representation of the Google Calendar event if found,
-        otherwise None.
-    """
+def refresh_duty_roster():
+    """Reload every duty calendar in the roster. Run by the scheduler."""
+    for calendar in _duty_roster.values():
+        with calendar.lock:
+            try:
+                calendar.load()
+            except Exception as error:
+                logger.error(
+                    "Error refreshing duty calendar '%s': %s", calendar.summary, error
+                )
 
-    try:
-        creds = get_google_creds()
-        service = build("calendar", "v3", credentials=creds)
 
-        page_token = None
-        weekend_help_desk_calendar_id = None
-        while True:
-            calendar_list = service.calendarList().list(pageToken=page_token).execute()
-            for calendar_list_entry in calendar_list["items"]:
-                if calendar_list_entry["summary"] == "Weekend Help Desk":
-                    weekend_help_desk_calendar_id = calendar_list_entry["id"]
-            page_token = calendar_list.get("nextPageToken")
-            if not page_token:
-                break
-
-        # Call the Calendar API
-        d = datetime.datetime.utcnow() - timedelta(days=7)
-        last_week = d.isoformat() + "Z"  # 'Z' indicates UTC time
-        print("Getting the upcoming 10 events")
-        events_result = (
-            service.events()
-            .list(
-                calendarId=weekend_help_desk_calendar_id,
-                timeMin=last_week,
-                maxResults=100,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-        )
-        events = events_result.get("items", [])
+def get_duty_event(key, when=None, timed_only=False):
+    """Return the roster event covering `when` ( default now ) for a calendar.
 
-        if not events:
-            print("No upcoming events found.")
-            return
+    Args:
+        key: "weekend", "dev" or "systems".
+        when: Epoch seconds to look up, defaulting to the current time.
+        timed_only: Ignore all-day events.
 
-        # Prints the start and name of the next 10 events
-        current_event = None
-        today = datetime.datetime.now().strftime("%Y-%m-%d")
-        for event in events:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            end = event["end"].get("dateTime", event["end"].get("date"))
-            if start <= today < end:
-                print(f"Found event where start {start} <= today {today} < end {end}")
-                current_event = event
-                print("FOUND EVENT: ", start, end, event["summary"])
-                return event
+    Returns:
+        The Google Calendar event dict, or None.
+    """
+    calendar = _duty_roster[key]
+    calendar.ensure_loaded()
+    intervals = calendar.intervals
+    if not intervals:
+        return None
 
-    except HttpError as error:
-        print("An error occurred: %s" % error)
+    event = intervals.at(time.time() if when is None else when, timed_only)
+    if event:
+        logger.debug("On duty for %s: %s", key, event.get("summary"))
+    else:
+        logger.debug("No %s duty event found for the current time.", key)
+    return event
 
 
 def get_user(event):
@@ -213,7 +352,7 @@ def get_user(event):
     """
     if event:
         summary = event["summary"]
-        print("get_user from event: ", summary)
+        logger.debug("get_user from event: %s", summary)
 
         if result := re.search(
             r"(.+?) - (?:Holiday )?Weekend (?:Help Desk|Duty)",
@@ -224,13 +363,73 @@ def get_user(event):
         elif result := re.search(r"Fire Duty: (.+)", summary, re.IGNORECASE):
             name = result.group(1)
         else:
-            print(f"Warning: Could not parse user from event summary: {summary}")
+            logger.warning("Could not parse user from event summary: %s", summary)
             return None
 
-        print("USER: ", name)
+        logger.debug("Duty user: %s", name)
         return name
 
 
+def get_calendar_service():
+    """Return a Calendar API service object, built once and reused.
+
+    Building a service parses the API discovery document, so we keep them
+    around rather than build one per lookup. Service objects share an httplib2
+    connection, which isn't thread-safe, so each thread gets its own. It's
+    rebuilt when get_google_creds() hands back new credentials.
+    """
+    creds = get_google_creds()
+    service = getattr(_service_local, "service", None)
+    if service is None or _service_local.creds is not creds:
+        service = build(
+            "calendar", "v3", credentials=creds, requestBuilder=MeteredHttpRequest
+        )
+        _service_local.service = service
+        _service_local.creds = creds
+    return service
+
+
+def _load_calendar_ids(service):
+    """Page through the calendar list and return a summary -> id dict."""
+    calendar_ids = {}
+    page_token = None
+    while True:
+        calendar_list = service.calendarList().list(pageToken=page_token).execute()
+        for calendar_list_entry in calendar_list["items"]:
+            calendar_ids.setdefault(
+                calendar_list_entry["summary"], calendar_list_entry["id"]
+            )
+        page_token = calendar_list.get("nextPageToken")
+        if not page_token:
+            return calendar_ids
+
+
+def get_calendar_id(service, summary):
+    """Return the id of the calendar named summary, or None.
+
+    Served from a cached summary -> id map. The map is re-listed once it is
+    CALENDAR_IDS_TTL_SECONDS old, or on a miss if the last listing is more than
+    CALENDAR_IDS_MISS_RETRY_SECONDS old, so a missing calendar can't turn
+    every lookup into a full calendarList walk.
+    """
+    global _calendar_ids, _calendar_ids_loaded_at
+
+    loaded_at = _calendar_ids_loaded_at
+    calendar_id = _calendar_ids.get(summary)
+    age = time.time() - loaded_at
+    if calendar_id and age < CALENDAR_IDS_TTL_SECONDS:
+        return calendar_id
+    if not calendar_id and age < CALENDAR_IDS_MISS_RETRY_SECONDS:
+        return None
+
+    with _calendar_ids_lock:
+        # Another thread may have re-listed while we waited for the lock
+        if _calendar_ids_loaded_at == loaded_at:
+            _calendar_ids = _load_calendar_ids(service)
+            _calendar_ids_loaded_at = time.time()
+        return _calendar_ids.get(summary)
+
+
 # Global credential cache to prevent race conditions
 _cached_creds = None
 
@@ -252,10 +451,10 @@ def get_google_creds():
 
     if os.path.exists("token.json"):
         try:
-            print("Loading credentials from token.json")
+            logger.info("Loading credentials from token.json")
             creds = Credentials.from_authorized_user_file("token.json", SCOPES)
         except Exception as e:
-            print(f"Error loading token.json: {e}. Will re-authenticate.")
+            logger.error("Error loading token.json: %s. Will re-authenticate.", e)
             # Remove corrupted file
             try:
                 os.remove("token.json")
@@ -265,17 +464,19 @@ def get_google_creds():
 
     # If there are no (valid) credentials available, let the user log in.
     if not creds or not creds.valid:
-        print("No valid credentials found")
+        logger.info("No valid credentials found")
         if creds and creds.expired and creds.refresh_token:
-            print("Refreshing credentials")
+            logger.info("Refreshing credentials")
             try:
                 creds.refresh(Request())
             except Exception as e:
-                print(f"Error refreshing credentials: {e}. Will re-authenticate.")
+                logger.error(
+                    "Error refreshing credentials: %s. Will re-authenticate.", e
+                )
                 creds = None
 
         if not creds:
-            print("Creating new credentials")
+            logger.info("Creating new credentials")
             flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
             creds = flow.run_local_server(port=0)
 
@@ -284,7 +485,7 @@ def get_google_creds():
             with open("token.json", "w") as token:
                 token.write(creds.to_json())
         except Exception as e:
-            print(f"Warning: Could not save token.json: {e}")
+            logger.warning("Could not save token.json: %s", e)
 
     # Cache the credentials
     _cached_creds = creds
@@ -4,13 +4,15 @@ Configuration Module for ByWater Slack Bot
 Handles loading of bywaterbot_data, environment variables, and Twilio client initialization.
 """
 
+import logging
 import os
-import pprint
 from datetime import datetime
 from twilio.rest import Client
-from bot_functions import load_bywaterbot_data
+from bot_functions import load_bywaterbot_data, load_bywaterbot_data_async
+from bot_logging import redact
+from metered_clients import MeteredTwilioHttpClient
 
-pp = pprint.PrettyPrinter(indent=2)
+logger = logging.getLogger(__name__)
 
 DEFAULT_DEVOPS_ASSIGNEE = "Kyle"
 
@@ -26,11 +28,11 @@ def load_config():
     """Load bywaterbot_data and initialize environment variables and clients."""
     global bywaterbot_data, twilio_client, twilio_phone
 
-    print("Loading configuration...")
+    logger.info("Loading configuration...")
 
     # Initial load of bywaterbot_data
     bywaterbot_data = load_bywaterbot_data()
-    pp.pprint(bywaterbot_data)
+    logger.debug("bywaterbot_data: %s", redact(bywaterbot_data))
 
     # Set environment variables from bywaterbot_data if they are not already set
     if "BYWATER_BOT_GITHUB_TOKEN" not in os.environ:
@@ -72,10 +74,12 @@ def load_config():
         auth_token = os.environ["TWILIO_AUTH_TOKEN"]
         twilio_phone = os.environ["TWILIO_PHONE"]
         if account_sid and auth_token:
-            twilio_client = Client(account_sid, auth_token)
-            print("Twilio client initialized")
+            twilio_client = Client(
+                account_sid, auth_token, http_client=MeteredTwilioHttpClient()
+            )
+            logger.info("Twilio client initialized")
     except Exception as e:
-        print(f"Error initializing Twilio client: {e}")
+        logger.error("Error initializing Twilio client: %s", e)
 
 
 def refresh_data():
@@ -85,8 +89,22 @@ def refresh_data():
         new_data = load_bywaterbot_data()
         if new_data:
             bywaterbot_data = new_data
-            print(f"Successfully refreshed bywaterbot_data at {datetime.now()}")
+            logger.info("Successfully refreshed bywaterbot_data at %s", datetime.now())
             return True
     except Exception as e:
-        print(f"Error refreshing bywaterbot_data at {datetime.now()}: {e}")
+        logger.error("Error refreshing bywaterbot_data at %s: %s", datetime.now(), e)
+    return False
+
+
+async def refresh_data_async():
+    """refresh_data for the asyncio edition."""
+    global bywaterbot_data
+    try:
+        new_data = await load_bywaterbot_data_async()
+        if new_data:
+            bywaterbot_data = new_data
+            logger.info("Successfully refreshed bywaterbot_data at %s", datetime.now())
+            return True
+    except Exception as e:
+        logger.error("Error refreshing bywaterbot_data at %s: %s", datetime.now(), e)
     return False
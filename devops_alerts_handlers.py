@@ -7,49 +7,159 @@ can't be ignored: it opens a DM to the on-call person with an Acknowledge button
 and keeps re-sending that DM on a timer until the button is clicked.
 
 Successes posted to #devops-alerts are left alone; only failures start a nag.
+What counts as a failure ( attachment colors, keywords ) can be set in the
+"devops_alerts" section of bywaterbot_data; see FailureClassifier.
+
+Failures are matched by a fingerprint of their text with run numbers, hashes,
+URLs and timestamps taken out, so a re-run of the same failure doesn't open a
+second incident. A burst of related failures ( the same job, going by the first
+few words of the fingerprint, each within DEVOPS_ALERT_BURST_SECONDS of the
+last ) is folded into one incident too: the DM already sent is updated in place
+with the count and every failure's link, rather than re-posted. Unrelated
+failures in the same burst are only folded with DEVOPS_ALERT_BURST_SCOPE=all.
+
+Re-nags are scheduled on a min-heap keyed by when they're due. The nag thread
+sleeps until the earliest one ( or until an incident is opened or acknowledged )
+and hands due DMs to a small worker pool, so they go out on time and together.
+
+Incidents live in an incident_store ( SQLite, DEVOPS_ALERT_DB ); the open ones
+and their nag schedule are picked up again when the handlers are registered.
 """
 
+import heapq
+import logging
 import os
+import re
 import threading
 import time
 
 import config
 from bot_functions import get_channel_id_by_name, get_name_to_id_mapping
+from incident_store import DEVOPS_ALERT_DB, SqliteIncidentStore
+from message_matchers import in_channel
+from permalinks import get_permalink, get_permalink_builder
+from worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
 
 # How long to wait between nags, and the action_id the Acknowledge button fires.
 NAG_INTERVAL_SECONDS = int(os.environ.get("DEVOPS_ALERT_NAG_MINUTES", "15")) * 60
 ACK_ACTION_ID = "ack_devops_alert"
+BURST_SECONDS = int(os.environ.get("DEVOPS_ALERT_BURST_SECONDS", "120"))
+# "job" folds a burst's failures of the same job, "all" every failure in it
+BURST_SCOPE = os.environ.get("DEVOPS_ALERT_BURST_SCOPE", "job").lower()
+JOB_KEY_WORDS = 3
+
+NAG_WORKERS = 4
 
-# Open, unacknowledged incidents keyed by a generated id. Guarded by _lock since
-# the message handler, the button handler and the nag thread all touch it.
-_incidents = {}
+# The incident store ( see get_incident_store ). Guarded by _lock since the
+# message handler, the button handler and the nag thread all touch it.
+_store = None
 _lock = threading.Lock()
-_counter = 0
 
+# ( next_nag, incident_id ) min-heap. Entries for incidents acknowledged or
+# rescheduled since are dropped when they reach the top. _wakeup shares _lock.
+_schedule = []
+_wakeup = threading.Condition(_lock)
+_nag_pool = WorkerPool("devops-nag", max_workers=NAG_WORKERS)
 
-def _is_failure_alert(event):
-    """True if the message looks like one of our failure posts.
 
-    We treat a danger-colored attachment, or any 'fail' text, as a failure. Our
-    success posts are plain text without either, so they don't trigger a nag.
+# Failure signals, unless bywaterbot_data's "devops_alerts" section sets its
+# own "failure_colors" / "failure_keywords". Slack may keep 'danger' or resolve
+# it to its red hex.
+DEFAULT_FAILURE_COLORS = ("danger", "#a30200", "#d50200", "#cc0000")
+DEFAULT_FAILURE_KEYWORDS = ("fail",)
+
+# Attachment text searched for keywords, in order
+_ATTACHMENT_TEXT = ("title", "text", "fallback")
+
+
+def _attachment_texts(attachments):
+    """Each attachment's text and field values, lower-cased, one at a time."""
+    for att in attachments:
+        for key in _ATTACHMENT_TEXT:
+            if att.get(key):
+                yield att[key].lower()
+        for field in att.get("fields") or ():
+            if field.get("value"):
+                yield str(field["value"]).lower()
+
+
+class FailureClassifier:
+    """Decides whether a #devops-alerts message is one of our failure posts.
+
+    A danger-colored attachment, or a failure keyword in the message, its
+    attachments' text or their field values, makes it a failure. Our success
+    posts are plain text without either. The colors and keywords are
+    lower-cased once, up front; a message is checked piece by piece ( its
+    text, its attachments' colors, then their text ) and the first signal
+    found decides it.
     """
-    blob = (event.get("text") or "").lower()
-    danger = False
-    for att in event.get("attachments", []) or []:
-        color = (att.get("color") or "").lower()
-        # Slack may keep 'danger' or resolve it to its red hex.
-        if color in ("danger", "#a30200", "#d50200", "#cc0000"):
-            danger = True
-        blob += " " + (att.get("title") or "").lower()
-        blob += " " + (att.get("text") or "").lower()
-        blob += " " + (att.get("fallback") or "").lower()
-        for field in att.get("fields", []) or []:
-            blob += " " + str(field.get("value") or "").lower()
-    return danger or "fail" in blob
+
+    __slots__ = ("colors", "keywords")
+
+    def __init__(
+        self, colors=DEFAULT_FAILURE_COLORS, keywords=DEFAULT_FAILURE_KEYWORDS
+    ):
+        self.colors = frozenset(color.lower() for color in colors)
+        self.keywords = tuple(dict.fromkeys(k.lower() for k in keywords if k))
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Build from a "devops_alerts" section ( or None for the defaults )."""
+        settings = settings or {}
+        return cls(
+            settings.get("failure_colors") or DEFAULT_FAILURE_COLORS,
+            settings.get("failure_keywords") or DEFAULT_FAILURE_KEYWORDS,
+        )
+
+    def __call__(self, event):
+        keywords = self.keywords
+        text = event.get("text")
+        if text:
+            text = text.lower()
+            for keyword in keywords:
+                if keyword in text:
+                    return True
+        attachments = event.get("attachments")
+        if not attachments:
+            return False
+        # Colors next: a set lookup per attachment, no text to scan
+        for att in attachments:
+            color = att.get("color")
+            if color and color.lower() in self.colors:
+                return True
+        # Plain substring tests; for a keyword or two they beat a regex
+        for text in _attachment_texts(attachments):
+            for keyword in keywords:
+                if keyword in text:
+                    return True
+        return False
+
+
+# ( "devops_alerts" section it was built from, FailureClassifier ). A refresh
+# replaces bywaterbot_data wholesale, so the section changing identity is the
+# cue to rebuild.
+_classifier = (None, FailureClassifier())
+
+
+def _failure_classifier():
+    global _classifier
+    settings = config.bywaterbot_data.get("devops_alerts")
+    built_from, classifier = _classifier
+    if settings is not built_from:
+        classifier = FailureClassifier.from_settings(settings)
+        _classifier = (settings, classifier)
+    return classifier
+
+
+def _is_failure_alert(event):
+    """True if the message looks like one of our failure posts."""
+    return _failure_classifier()(event)
 
 
 def _alert_summary(event):
-    """Readable summary of the alert, used in the DM and as a dedupe signature."""
+    """Readable summary of the alert, used in the DM and fingerprinted."""
     parts = []
     if event.get("text"):
         parts.append(event["text"])
@@ -61,25 +171,72 @@ def _alert_summary(event):
     return "\n".join(parts).strip() or "A DevOps job failed."
 
 
-def _send_dm(app, incident_id, repeat=False):
-    """Send ( or re-send ) the Acknowledge DM for an incident."""
-    with _lock:
-        inc = _incidents.get(incident_id)
-        if not inc or inc["acknowledged"]:
-            return
-        user_id = inc["user_id"]
-        summary = inc["text"]
-        permalink = inc.get("permalink")
-        count = inc["nag_count"]
+# What varies between runs of the same failure, in the order it's taken out
+_FINGERPRINT_NOISE = [
+    (re.compile(r"<([^<>|]*)\|([^<>]*)>"), r"\2"),  # Slack links: keep the label
+    (re.compile(r"<?https?://[^\s<>|]+>?"), " "),
+    (
+        re.compile(
+            r"\d{4}-\d\d-\d\d(?:[t ]\d\d:\d\d(?::\d\d(?:\.\d+)?)?)?"
+            r"(?:z|[+-]\d\d:?\d\d)?"
+        ),
+        " ",
+    ),
+    (re.compile(r"\b\d{1,2}:\d\d(?::\d\d)?\b"), " "),
+    (re.compile(r"\b(?=[0-9a-f]*\d)[0-9a-f]{7,40}\b"), " "),  # commit SHAs
+    (re.compile(r"\d+"), "#"),  # run, job and PR numbers
+    (re.compile(r"\s+"), " "),
+]
+
+
+def _fingerprint(summary):
+    """The part of an alert that stays the same when the same job fails again;
+    used as the incident signature."""
+    fingerprint = summary.lower()
+    for pattern, replacement in _FINGERPRINT_NOISE:
+        fingerprint = pattern.sub(replacement, fingerprint)
+    return fingerprint.strip()[:200]
+
+
+def _job_key(signature):
+    """What a failure's fingerprint says about which job failed: its first
+    few words ( "koha ci #", "rebase of bywater-v#.#.#-#" )."""
+    return " ".join(signature.split()[:JOB_KEY_WORDS])
+
+
+def _burst_incident(store, signature):
+    """The open incident a failure with this signature is part of a burst
+    with, or None. Called with _lock held."""
+    if BURST_SECONDS <= 0:
+        return None
+    cutoff = time.time() - BURST_SECONDS
+    key = _job_key(signature)
+    related = [
+        inc
+        for inc in store.open_incidents()
+        if inc.last_failure_at > cutoff
+        and (BURST_SCOPE == "all" or key in map(_job_key, inc.signatures))
+    ]
+    return max(related, key=lambda inc: inc.last_failure_at, default=None)
+
 
-    if repeat:
-        header = f":rotating_light: Still unacknowledged ( reminder #{count} ) — DevOps failure"
+def _render(inc, reminder):
+    """DM text and blocks for an incident; reminder is 0 for the first DM."""
+    if reminder:
+        header = f":rotating_light: Still unacknowledged ( reminder #{reminder} ) — DevOps failure"
     else:
         header = ":rotating_light: DevOps failure needs your acknowledgement"
-
-    body = summary
-    if permalink:
-        body += f"\n<{permalink}|View in #devops-alerts>"
+    if inc.failures > 1:
+        header += f" ( {inc.failures} failures )"
+
+    body = inc.text
+    if len(inc.permalinks) == 1:
+        body += f"\n<{inc.permalinks[0]}|View in #devops-alerts>"
+    elif inc.permalinks:
+        links = " · ".join(
+            f"<{link}|{n}>" for n, link in enumerate(inc.permalinks, start=1)
+        )
+        body += f"\nView in #devops-alerts: {links}"
 
     blocks = [
         {"type": "section", "text": {"type": "mrkdwn", "text": f"*{header}*\n{body}"}},
@@ -91,39 +248,125 @@ def _send_dm(app, incident_id, repeat=False):
                     "style": "primary",
                     "text": {"type": "plain_text", "text": "Acknowledge"},
                     "action_id": ACK_ACTION_ID,
-                    "value": incident_id,
+                    "value": inc.incident_id,
                 }
             ],
         },
     ]
+    return f"{header}: {inc.text}", blocks
 
+
+def get_incident_store():
+    """Return the incident store, opening DEVOPS_ALERT_DB on first use."""
+    global _store
+    with _lock:
+        if _store is None:
+            _store = SqliteIncidentStore(DEVOPS_ALERT_DB)
+        return _store
+
+
+def _send_dm(app, incident_id, repeat=False):
+    """Send ( or re-send ) the Acknowledge DM for an incident."""
+    with _lock:
+        inc = _store.get(incident_id)
+        if not inc or inc.acknowledged:
+            return
+        user_id = inc.user_id
+        failures = inc.failures
+        text, blocks = _render(inc, inc.nag_count if repeat else 0)
+
+    dm = None
     try:
         # Posting to a user id delivers to that user's DM with the bot.
-        app.client.chat_postMessage(
-            channel=user_id, text=f"{header}: {summary}", blocks=blocks
+        response = app.client.chat_postMessage(
+            channel=user_id, text=text, blocks=blocks
         )
+        dm = (response["channel"], response["ts"])
     except Exception as e:
-        print(f"Error sending devops-alert DM: {e}")
+        logger.error("Error sending devops-alert DM: %s", e)
 
     with _lock:
-        inc = _incidents.get(incident_id)
-        if inc:
-            inc["nag_count"] += 1
-            inc["next_nag"] = time.time() + NAG_INTERVAL_SECONDS
+        inc = _store.get(incident_id)
+        if not inc or inc.acknowledged:
+            return
+        if dm:
+            inc.dm_channel, inc.dm_ts = dm
+        inc.nag_count += 1
+        _schedule_nag(inc, time.time() + NAG_INTERVAL_SECONDS)
+        folded_meanwhile = inc.failures != failures
+    if folded_meanwhile:
+        _update_dm(app, incident_id)
+
+
+def _update_dm(app, incident_id):
+    """Edit the incident's latest DM to show every failure folded into it."""
+    with _lock:
+        inc = _store.get(incident_id)
+        if not inc or inc.acknowledged or not inc.dm_ts:
+            return
+        channel, ts = inc.dm_channel, inc.dm_ts
+        text, blocks = _render(inc, inc.nag_count - 1)
+    try:
+        app.client.chat_update(channel=channel, ts=ts, text=text, blocks=blocks)
+    except Exception as e:
+        logger.error("Error updating devops-alert DM: %s", e)
+
+
+def _schedule_nag(inc, when):
+    """Set an incident's next nag and wake the nag thread. Caller holds _lock."""
+    inc.next_nag = when
+    _store.save(inc)
+    heapq.heappush(_schedule, (when, inc.incident_id))
+    _wakeup.notify()
+
+
+def _recover_nags():
+    """Put the store's open incidents back on the schedule, nagging at once
+    about any that were mid-send or overdue when the bot stopped."""
+    now = time.time()
+    with _wakeup:
+        scheduled = {incident_id for _, incident_id in _schedule}
+        for inc in _store.open_incidents():
+            if inc.incident_id not in scheduled:
+                if inc.next_nag is None:
+                    inc.next_nag = now
+                heapq.heappush(_schedule, (inc.next_nag, inc.incident_id))
+        _wakeup.notify()
+
+
+def _take_due(now):
+    """Pop the incidents whose nag is due by now. Caller holds _lock.
+
+    Returns ( due incident ids, seconds until the next nag or None if there
+    isn't one ).
+    """
+    due = []
+    while _schedule:
+        when, incident_id = _schedule[0]
+        inc = _store.get(incident_id)
+        if inc is None or inc.acknowledged or inc.next_nag != when:
+            heapq.heappop(_schedule)  # stale
+        elif when <= now:
+            heapq.heappop(_schedule)
+            # Sending; _send_dm schedules the next one. Not saved: after a
+            # restart the stored, overdue next_nag sends it again
+            inc.next_nag = None
+            due.append(incident_id)
+        else:
+            return due, when - now
+    return due, None
 
 
 def _nag_loop(app):
-    """Background thread: re-send the DM for any incident whose nag is due."""
+    """Background thread: re-send each incident's DM when its nag is due."""
     while True:
-        now = time.time()
-        due = []
-        with _lock:
-            for incident_id, inc in _incidents.items():
-                if not inc["acknowledged"] and inc["next_nag"] <= now:
-                    due.append(incident_id)
+        with _wakeup:
+            due, wait = _take_due(time.time())
+            if not due:
+                _wakeup.wait(wait)
+                continue
         for incident_id in due:
-            _send_dm(app, incident_id, repeat=True)
-        time.sleep(30)
+            _nag_pool.submit(_send_dm, app, incident_id, repeat=True)
 
 
 def register_devops_alerts_handlers(app):
@@ -132,21 +375,26 @@ def register_devops_alerts_handlers(app):
         alerts_channel_id = get_channel_id_by_name(
             app=app, channel_name="devops-alerts"
         )
-        print(f"DEVOPS-ALERTS CHANNEL ID: {alerts_channel_id}")
+        logger.info("DEVOPS-ALERTS CHANNEL ID: %s", alerts_channel_id)
     except Exception as e:
-        print(f"Error getting devops-alerts channel ID: {e}")
+        logger.error("Error getting devops-alerts channel ID: %s", e)
         alerts_channel_id = None
 
+    store = get_incident_store()
+
     # Who gets nagged. Defaults to the same person as devops fire duty.
     dm_user_name = os.environ.get(
         "DEVOPS_ALERT_DM_USER", config.DEFAULT_DEVOPS_ASSIGNEE
     )
 
-    # Our own user id, so we never react to messages we posted ourselves.
+    # Our own user id, so we never react to messages we posted ourselves. The
+    # same response gives the workspace URL permalinks are built from.
     try:
-        bot_user_id = app.client.auth_test().get("user_id")
+        auth = app.client.auth_test()
+        bot_user_id = auth.get("user_id")
+        get_permalink_builder(app).load(auth)
     except Exception as e:
-        print(f"Error getting bot user id: {e}")
+        logger.error("Error getting bot user id: %s", e)
         bot_user_id = None
 
     def resolve_dm_user_id():
@@ -154,18 +402,15 @@ def register_devops_alerts_handlers(app):
             name_to_id, _ = get_name_to_id_mapping(app)
             return name_to_id.get(dm_user_name.lower())
         except Exception as e:
-            print(f"Error resolving DM user '{dm_user_name}': {e}")
+            logger.error("Error resolving DM user '%s': %s", dm_user_name, e)
             return None
 
-    @app.event("message")
-    def handle_alerts_message(body, logger):
+    # Only act on #devops-alerts. If we couldn't resolve that channel at startup
+    # the matcher matches nothing, rather than nagging on every channel.
+    @app.event("message", matchers=[in_channel(alerts_channel_id)])
+    def handle_alerts_message(body):
         event = body.get("event", {})
 
-        # Only act on #devops-alerts. If we couldn't resolve that channel at
-        # startup, do nothing rather than nag on messages from every channel.
-        if not alerts_channel_id or event.get("channel") != alerts_channel_id:
-            return
-
         # Never nag ourselves into a loop.
         if bot_user_id and event.get("user") == bot_user_id:
             return
@@ -183,59 +428,63 @@ def register_devops_alerts_handlers(app):
             return
 
         summary = _alert_summary(event)
-        signature = summary[:120]
+        signature = _fingerprint(summary)
 
-        # If we're already nagging about an identical failure, don't start a second
-        # one. This collapses the duplicate danger posts a rebase conflict can send.
+        permalink = None
+        try:
+            permalink = get_permalink(
+                app, event.get("channel"), event.get("ts"), event.get("thread_ts")
+            )
+        except Exception as e:
+            logger.error("Error getting permalink: %s", e)
+
+        # If we're already nagging about the same failure, or the same job
+        # failed moments ago, fold this one into it instead of starting a
+        # second nag. This collapses the bursts of danger posts a rebase
+        # conflict can send.
         with _lock:
-            for inc in _incidents.values():
-                if not inc["acknowledged"] and inc["signature"] == signature:
-                    print("Duplicate devops-alert failure; not starting a second nag.")
-                    return
+            inc = store.find_open(signature) or _burst_incident(store, signature)
+            if inc:
+                store.fold(inc, permalink, signature)
+        if inc:
+            logger.info(
+                "Folded devops-alert failure into incident %s (%d failures).",
+                inc.incident_id,
+                inc.failures,
+            )
+            _update_dm(app, inc.incident_id)
+            return
 
         user_id = resolve_dm_user_id()
         if not user_id:
-            print(f"Can't DM '{dm_user_name}' — user id not found.")
+            logger.warning("Can't DM '%s' — user id not found.", dm_user_name)
             return
 
-        permalink = None
-        try:
-            ts = event.get("ts")
-            if ts:
-                permalink = app.client.chat_getPermalink(
-                    channel=event.get("channel"), message_ts=ts
-                ).get("permalink")
-        except Exception as e:
-            print(f"Error getting permalink: {e}")
-
-        global _counter
+        # Its first nag is scheduled once the first DM is sent
         with _lock:
-            _counter += 1
-            incident_id = f"alert-{_counter}"
-            _incidents[incident_id] = {
-                "user_id": user_id,
-                "text": summary,
-                "permalink": permalink,
-                "signature": signature,
-                "acknowledged": False,
-                "nag_count": 0,
-                "next_nag": time.time(),
-            }
-        print(f"Opened devops-alert incident {incident_id}; nagging {dm_user_name}.")
-        _send_dm(app, incident_id)
+            inc = store.open(user_id, summary, permalink, signature)
+        if inc is None:
+            logger.info("Duplicate devops-alert failure; not starting a second nag.")
+            return
+        logger.info(
+            "Opened devops-alert incident %s; nagging %s.",
+            inc.incident_id,
+            dm_user_name,
+        )
+        _send_dm(app, inc.incident_id)
 
     @app.action(ACK_ACTION_ID)
-    def handle_ack(ack, body, logger):
+    def handle_ack(ack, body):
         ack()
 
         actions = body.get("actions", [])
         incident_id = actions[0].get("value") if actions else None
         who = body.get("user", {}).get("id")
 
-        with _lock:
-            inc = _incidents.get(incident_id)
-            if inc:
-                inc["acknowledged"] = True
+        # Its pending nag is dropped when it comes due
+        with _wakeup:
+            if store.acknowledge(incident_id, who):
+                _wakeup.notify()
 
         # Replace the button with a confirmation so the DM reads cleanly.
         try:
@@ -258,10 +507,12 @@ def register_devops_alerts_handlers(app):
                     ],
                 )
         except Exception as e:
-            print(f"Error updating ack message: {e}")
+            logger.error("Error updating ack message: %s", e)
 
-        print(f"Incident {incident_id} acknowledged by {who}.")
+        logger.info("Incident %s acknowledged by %s.", incident_id, who)
 
-    # Start the re-nag thread once handlers are registered.
+    # Pick up the nagging a restart interrupted, then start the re-nag thread
+    # once handlers are registered.
+    _recover_nags()
     nag_thread = threading.Thread(target=_nag_loop, args=(app,), daemon=True)
     nag_thread.start()
@@ -7,8 +7,14 @@ Contains message handlers for:
 """
 
 import config
+import logging
+import sms_outbox
 from calendar_functions import get_weekday_duty, get_user
 from bot_functions import get_devops_fire_duty_asignee, get_channel_id_by_name
+from permalinks import get_permalink, get_permalink_builder
+from message_matchers import in_channel, in_channel_named
+
+logger = logging.getLogger(__name__)
 
 
 def register_devops_handlers(app):
@@ -18,18 +24,18 @@ def register_devops_handlers(app):
     # For now, let's look it up when registering
     try:
         devops_channel_id = get_channel_id_by_name(app=app, channel_name="devops")
-        print(f"DEVOPS CHANNEL ID: {devops_channel_id}")
+        logger.info("DEVOPS CHANNEL ID: %s", devops_channel_id)
     except Exception as e:
-        print(f"Error getting devops channel ID: {e}")
+        logger.error("Error getting devops channel ID: %s", e)
         devops_channel_id = None
 
-    def alert_user(event, department, channel_id, message_ts, body, logger, permalink=None):
+    def alert_user(event, department, channel_id, message_ts, body, permalink=None):
         user = get_user(event)
-        print("FOUND USER: ", user)
+        logger.debug("FOUND USER: %s", user)
 
         # Check if user exists in our data
         if user not in config.bywaterbot_data["users"]:
-            print(f"User {user} not found in bywaterbot_data")
+            logger.warning("User %s not found in bywaterbot_data", user)
             # Optional: post to thread that user wasn't found?
             try:
                 app.client.chat_postMessage(
@@ -38,7 +44,7 @@ def register_devops_handlers(app):
                     thread_ts=message_ts,
                 )
             except Exception as e:
-                print(f"Error posting to Slack: {e}")
+                logger.error("Error posting to Slack: %s", e)
 
             return user
 
@@ -52,7 +58,7 @@ def register_devops_handlers(app):
                     thread_ts=message_ts,
                 )
             except Exception as e:
-                print(f"Error posting to Slack: {e}")
+                logger.error("Error posting to Slack: %s", e)
 
             if config.twilio_client:
                 # Construct a generic fire message since we don't have ticket details here
@@ -60,12 +66,9 @@ def register_devops_handlers(app):
                 if permalink:
                     sms_body += f" {permalink}"
                 try:
-                    message = config.twilio_client.messages.create(
-                        body=sms_body, from_=config.twilio_phone, to=sms
-                    )
-                    print(message.sid)
+                    sms_outbox.send_sms(sms, sms_body, tag=f"{department} fire")
                 except Exception as e:
-                    print(f"Error sending SMS: {e}")
+                    logger.error("Error queueing SMS: %s", e)
 
         if len(transports) == 0:
             try:
@@ -75,9 +78,9 @@ def register_devops_handlers(app):
                     thread_ts=message_ts,
                 )
             except Exception as e:
-                print(f"Error posting to Slack: {e}")
+                logger.error("Error posting to Slack: %s", e)
 
-    def handle_devops_fires(body, logger):
+    def handle_devops_fires(body):
         """Monitor #devops channel for fire emoji events."""
         event = body.get("event")
 
@@ -87,11 +90,7 @@ def register_devops_handlers(app):
         else:
             channel_id = event.get("channel")
 
-        print("CHANNEL ID: ", channel_id)
-
-        # Only process events in #devops channel
-        if devops_channel_id and channel_id != devops_channel_id:
-            return
+        logger.debug("CHANNEL ID: %s", channel_id)
 
         assignee = ""
         text = ""
@@ -99,22 +98,12 @@ def register_devops_handlers(app):
         # Check if this is a reaction event
         if event.get("type") == "reaction_added":
             reaction = event.get("reaction")
-            print("REACTION: ", reaction)
+            logger.debug("REACTION: %s", reaction)
             if reaction == "fire":
                 message_ts = event.get("item", {}).get("ts")
 
-                permalink = None
-                if message_ts:
-                    try:
-                        permalink_response = app.client.chat_getPermalink(
-                            channel=channel_id, message_ts=message_ts
-                        )
-                        permalink = permalink_response.get("permalink")
-                        print(f"Permalink: {permalink}")
-                    except Exception as e:
-                        print(f"Error getting permalink: {e}")
-
                 # Get the message text from the reaction
+                message = None
                 try:
                     if message_ts:
                         response = app.client.conversations_history(
@@ -125,16 +114,35 @@ def register_devops_handlers(app):
                         )
                         messages = response.get("messages")
                         if messages:
-                            text = messages[0].get("text")
-                            print(f"Found message text: {text}")
+                            message = messages[0]
+                            text = message.get("text")
+                            logger.debug("Found message text: %s", text)
                 except Exception as e:
-                    print(f"Error getting message text: {e}")
+                    logger.error("Error getting message text: %s", e)
                     text = ""  # Default empty text if we can't get it
 
+                # The reaction doesn't say whether the message is in a thread.
+                # conversations_history only has top-level messages, so if it
+                # didn't hand back this one it's a reply: ask Slack for its link.
+                permalink = None
+                if message_ts:
+                    try:
+                        if message and message.get("ts") == message_ts:
+                            permalink = get_permalink(
+                                app, channel_id, message_ts, message.get("thread_ts")
+                            )
+                        else:
+                            permalink = get_permalink_builder(app).from_slack(
+                                channel_id, message_ts
+                            )
+                        logger.debug("Permalink: %s", permalink)
+                    except Exception as e:
+                        logger.error("Error getting permalink: %s", e)
+
                 assignee = get_devops_fire_duty_asignee(app, channel_id)
 
                 if assignee:
-                    print(f"{assignee} is on duty for devops")
+                    logger.info("%s is on duty for devops", assignee)
 
                     if assignee not in config.bywaterbot_data["users"]:
                         body_text = (
@@ -149,22 +157,17 @@ def register_devops_handlers(app):
 
                     if assignee in config.bywaterbot_data["users"]:
                         transports = config.bywaterbot_data["users"][assignee]
-                        print(f"TRANSPORTS: {transports}")
+                        logger.debug("TRANSPORTS: %s", transports)
                         if transports.get("sms"):
                             sms = transports["sms"]
-                            print(f"BODY: {body_text}")
+                            logger.debug("BODY: %s", body_text)
                             try:
                                 if config.twilio_client:
-                                    message = config.twilio_client.messages.create(
-                                        body=body_text,
-                                        from_=config.twilio_phone,
-                                        to=sms,
-                                    )
-                                    print(
-                                        f"TWILIO SMS SENT TO {assignee}: {message.sid}"
+                                    sms_outbox.send_sms(
+                                        sms, body_text, tag=f"devops fire: {assignee}"
                                     )
                             except Exception as e:
-                                print(f"Error sending SMS: {e}")
+                                logger.error("Error queueing SMS: %s", e)
 
                 event_dev = get_weekday_duty("dev")
 
@@ -172,7 +175,7 @@ def register_devops_handlers(app):
                 if event_dev:
                     dev_user = get_user(event_dev)
                     alert_user(
-                        event_dev, "dev", channel_id, message_ts, body, logger,
+                        event_dev, "dev", channel_id, message_ts, body,
                         permalink=permalink,
                     )
 
@@ -181,11 +184,18 @@ def register_devops_handlers(app):
                     sys_user = get_user(event_sys)
                     if dev_user != sys_user:
                         alert_user(
-                            event_sys, "systems", channel_id, message_ts, body, logger,
+                            event_sys, "systems", channel_id, message_ts, body,
                             permalink=permalink,
                         )
 
-    @app.event("reaction_added")
-    def handle_reaction_events(body, logger):
-        """Entry point for reaction events."""
-        handle_devops_fires(body, logger)
+    # Only reactions in #devops; the router looks this up by channel, so
+    # reactions anywhere else never reach it. If #devops couldn't be found at
+    # startup it's looked up as reactions arrive, rather than every :fire:
+    # being dropped until a restart.
+    if devops_channel_id:
+        in_devops = in_channel(devops_channel_id)
+    else:
+        in_devops = in_channel_named(app, "devops")
+
+    # Registered as is, so routes and handler metrics name handle_devops_fires
+    app.event("reaction_added", matchers=[in_devops])(handle_devops_fires)
@@ -0,0 +1,279 @@
+"""
+Directory Functions Module
+
+Process-wide caches of the Slack user directory and channel list.
+
+The full member list is paged in once with users_list, kept current from
+user_change / team_join events ( see directory_handlers ) and refreshed in the
+background once it is older than SLACK_DIRECTORY_TTL_MINUTES, so name -> id and
+id -> profile lookups are plain dict reads instead of a full directory download
+per karma or alert.
+
+The channel name -> id index is built from one paginated conversations_list
+sweep at startup and then maintained from channel_created / channel_rename /
+channel_archive events, so every channel lookup after the first is served from
+memory.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+USER_DIRECTORY_TTL_SECONDS = (
+    int(os.environ.get("SLACK_DIRECTORY_TTL_MINUTES", "60")) * 60
+)
+# After a failed background refresh, wait this long before trying again
+USER_DIRECTORY_RETRY_SECONDS = 60
+USERS_PAGE_SIZE = 200
+CHANNELS_PAGE_SIZE = 1000
+
+# One directory / channel index per Bolt app ( in practice there is only one )
+_user_directories = {}
+_channel_indexes = {}
+_directories_lock = threading.Lock()
+
+
+def _build_user_indexes(members):
+    """Build the lower-cased name -> id index and the real name -> member index.
+
+    display_name always wins, then name and real_name fill in whatever isn't
+    taken yet, exactly as get_name_to_id_mapping has always resolved names.
+    Bots are left out of the real name index.
+    """
+    name_to_id = {}
+    name_to_info = {}
+    for u in members:
+        _index_user(name_to_id, name_to_info, u)
+    return name_to_id, name_to_info
+
+
+def _index_user(name_to_id, name_to_info, u):
+    """Add one member to the indexes, as _build_user_indexes does."""
+    name_to_id[u["profile"]["display_name"].lower()] = u["id"]
+    if "name" in u and not u["name"].lower() in name_to_id:
+        name_to_id[u["name"].lower()] = u["id"]
+    if "real_name" in u and not u["real_name"].lower() in name_to_id:
+        name_to_id[u["real_name"].lower()] = u["id"]
+
+    if "real_name" in u and ("is_bot" not in u or not u["is_bot"]):
+        name_to_info[u["real_name"]] = u
+
+
+def _unindex_user(name_to_id, name_to_info, u):
+    """Remove whatever entries of the indexes still point at member u."""
+    for key in ("name", "real_name"):
+        if key in u and name_to_id.get(u[key].lower()) == u["id"]:
+            del name_to_id[u[key].lower()]
+    display_name = u["profile"]["display_name"].lower()
+    if name_to_id.get(display_name) == u["id"]:
+        del name_to_id[display_name]
+    if "real_name" in u and name_to_info.get(u["real_name"]) is u:
+        del name_to_info[u["real_name"]]
+
+
+class UserDirectory:
+    """Cached Slack member list with precomputed lookup indexes.
+
+    A full load builds new indexes and swaps them in whole; a user_change or
+    team_join only touches that user's entries, in place. A lookup is a single
+    dict read either way; anything iterating an index should take a copy.
+    Between full loads, a name two people share may resolve differently than
+    a rebuild would have it.
+    """
+
+    def __init__(
+        self, app, ttl=USER_DIRECTORY_TTL_SECONDS, retry=USER_DIRECTORY_RETRY_SECONDS
+    ):
+        self._app = app
+        self._ttl = ttl
+        self._retry = retry
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._members = {}  # user id -> member, in users_list order
+        self._name_to_id = {}
+        self._name_to_info = {}
+        self._loaded_at = 0
+        self._refresh_started_at = 0
+        self._refreshing = False
+
+    def _fetch_members(self):
+        """Page through users_list and return every member, in order."""
+        members = []
+        cursor = None
+        while True:
+            resp = self._app.client.users_list(limit=USERS_PAGE_SIZE, cursor=cursor)
+            members.extend(resp["members"])
+            cursor = (resp.get("response_metadata") or {}).get("next_cursor")
+            if not cursor:
+                return members
+
+    def _install(self, members):
+        """Swap in a new member list and its indexes. Caller holds _lock."""
+        self._members = {u["id"]: u for u in members}
+        self._name_to_id, self._name_to_info = _build_user_indexes(members)
+
+    def load(self):
+        """Download the whole directory and replace the cached copy."""
+        members = self._fetch_members()
+        with self._lock:
+            self._install(members)
+            self._loaded_at = time.time()
+        logger.info("Loaded %d Slack users into the directory cache", len(members))
+
+    def _refresh_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            logger.error("Error refreshing Slack user directory: %s", e)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _ensure_fresh(self):
+        """Load on first use; past the TTL, serve what we have and refresh.
+
+        A refresh that fails leaves _loaded_at alone, so the next one waits
+        out the retry interval rather than starting with the next lookup.
+        """
+        if not self._loaded_at:
+            # Concurrent first callers wait on one download, not one each
+            with self._load_lock:
+                if not self._loaded_at:
+                    self.load()
+            return
+
+        now = time.time()
+        if now - self._loaded_at < self._ttl:
+            return
+        with self._lock:
+            if self._refreshing or now - self._refresh_started_at < self._retry:
+                return
+            self._refreshing = True
+            self._refresh_started_at = now
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def mappings(self):
+        """Return ( name_to_id, name_to_info ), as get_name_to_id_mapping does."""
+        self._ensure_fresh()
+        return self._name_to_id, self._name_to_info
+
+    def user_id(self, name):
+        """Return the user id for a display name, username or real name."""
+        self._ensure_fresh()
+        return self._name_to_id.get(name.lower())
+
+    def user_info(self, user_id):
+        """Return the cached users_list member for a user id, or None."""
+        self._ensure_fresh()
+        return self._members.get(user_id)
+
+    def upsert(self, user):
+        """Apply a user_change / team_join payload to the cached directory.
+
+        Ignored until the first full load, which will pick the user up anyway.
+        Only the user's own index entries are replaced.
+        """
+        if not user or not user.get("id") or "profile" not in user:
+            return
+        with self._lock:
+            if not self._loaded_at:
+                return
+            old = self._members.get(user["id"])
+            if old is not None:
+                _unindex_user(self._name_to_id, self._name_to_info, old)
+            self._members[user["id"]] = user
+            _index_user(self._name_to_id, self._name_to_info, user)
+
+
+def get_user_directory(app):
+    """Return the shared UserDirectory for this app, creating it on first use."""
+    with _directories_lock:
+        directory = _user_directories.get(app)
+        if directory is None:
+            directory = _user_directories[app] = UserDirectory(app)
+    return directory
+
+
+def get_user_info(app, user_id):
+    """Return the Slack profile ( users_list member ) for a user id, or None."""
+    return get_user_directory(app).user_info(user_id)
+
+
+def lookup_user_id(app, name):
+    """Return the Slack user id for a name ( case-insensitive ), or None."""
+    return get_user_directory(app).user_id(name)
+
+
+class ChannelIndex:
+    """Channel name -> id index for the workspace's unarchived public channels."""
+
+    def __init__(self, app):
+        self._app = app
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._name_to_id = {}
+        self._id_to_name = {}
+        self._loaded = False
+
+    def load(self):
+        """Page through conversations_list and rebuild the index."""
+        name_to_id = {}
+        cursor = None
+        while True:
+            resp = self._app.client.conversations_list(
+                exclude_archived=True, limit=CHANNELS_PAGE_SIZE, cursor=cursor
+            )
+            for channel in resp.get("channels", []):
+                if channel.get("name") and channel.get("id"):
+                    name_to_id[channel["name"]] = channel["id"]
+            cursor = (resp.get("response_metadata") or {}).get("next_cursor")
+            if not cursor:
+                break
+
+        with self._lock:
+            self._name_to_id = name_to_id
+            self._id_to_name = {cid: name for name, cid in name_to_id.items()}
+            self._loaded = True
+        logger.info("Loaded %d Slack channels into the channel index", len(name_to_id))
+
+    def channel_id(self, name):
+        """Return the id for a channel name ( without the # ), or None.
+
+        The first lookup loads the index; if that fails the error propagates
+        and the next lookup tries again.
+        """
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self.load()
+        return self._name_to_id.get(name)
+
+    def add(self, channel_id, name):
+        """Record a new or renamed channel."""
+        if not channel_id or not name:
+            return
+        with self._lock:
+            old_name = self._id_to_name.get(channel_id)
+            if old_name and self._name_to_id.get(old_name) == channel_id:
+                del self._name_to_id[old_name]
+            self._name_to_id[name] = channel_id
+            self._id_to_name[channel_id] = name
+
+    def remove(self, channel_id):
+        """Forget an archived or deleted channel."""
+        with self._lock:
+            name = self._id_to_name.pop(channel_id, None)
+            if name and self._name_to_id.get(name) == channel_id:
+                del self._name_to_id[name]
+
+
+def get_channel_index(app):
+    """Return the shared ChannelIndex for this app, creating it on first use."""
+    with _directories_lock:
+        index = _channel_indexes.get(app)
+        if index is None:
+            index = _channel_indexes[app] = ChannelIndex(app)
+    return index
@@ -0,0 +1,63 @@
+"""
+Directory Handlers Module
+
+Keeps the cached Slack user directory and channel index
+( directory_functions ) current:
+- user_change: a profile, display name or real name changed
+- team_join: someone new joined the workspace
+- channel_created / channel_rename: a channel appeared or changed its name
+- channel_archive / channel_deleted: a channel went away
+- channel_unarchive: an archived channel came back
+"""
+
+import logging
+
+from directory_functions import get_channel_index, get_user_directory
+
+logger = logging.getLogger(__name__)
+
+
+def register_directory_handlers(app):
+    @app.event("user_change")
+    def handle_user_change(event):
+        """Apply a profile change to the cached user directory."""
+        get_user_directory(app).upsert(event.get("user"))
+
+    @app.event("team_join")
+    def handle_team_join(event):
+        """Add a new workspace member to the cached user directory."""
+        get_user_directory(app).upsert(event.get("user"))
+
+    @app.event("channel_created")
+    def handle_channel_created(event):
+        """Add a new channel to the channel index."""
+        channel = event.get("channel") or {}
+        get_channel_index(app).add(channel.get("id"), channel.get("name"))
+
+    @app.event("channel_rename")
+    def handle_channel_rename(event):
+        """Point the channel's new name at its id."""
+        channel = event.get("channel") or {}
+        get_channel_index(app).add(channel.get("id"), channel.get("name"))
+
+    @app.event("channel_archive")
+    def handle_channel_archive(event):
+        """Drop an archived channel from the channel index."""
+        get_channel_index(app).remove(event.get("channel"))
+
+    @app.event("channel_deleted")
+    def handle_channel_deleted(event):
+        """Drop a deleted channel from the channel index."""
+        get_channel_index(app).remove(event.get("channel"))
+
+    @app.event("channel_unarchive")
+    def handle_channel_unarchive(event):
+        """Re-add an unarchived channel; the event only carries its id."""
+        channel_id = event.get("channel")
+        try:
+            info = app.client.conversations_info(channel=channel_id)
+            name = info.get("channel", {}).get("name")
+        except Exception as e:
+            logger.error("Error looking up unarchived channel %s: %s", channel_id, e)
+            return
+        get_channel_index(app).add(channel_id, name)
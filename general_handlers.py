@@ -9,6 +9,7 @@ Contains message handlers for:
 - Quote requests
 """
 
+import logging
 import os
 import re
 import config
@@ -16,6 +17,8 @@ from bot_functions import get_name_to_id_mapping, get_quote
 from message_matchers import is_direct_message, is_not_bot_message
 from version import __version__
 
+logger = logging.getLogger(__name__)
+
 
 def register_general_handlers(app):
     # Detailed capabilities, sent when you DM me "help" (any casing).
@@ -94,14 +97,15 @@ def register_general_handlers(app):
     @app.message("hello", matchers=[is_not_bot_message])
     def message_hello(message, say):
         # say() sends a message to the channel where the event was triggered
-        print(f"Hey there <@{message['user']}>!")
+        logger.debug("Hey there <@%s>!", message["user"])
         say(f"Hey there <@{message['user']}>!")
 
     @app.message("^list slack names", matchers=[is_not_bot_message])
     def message_names(message, say):
         name_to_id, name_to_info = get_name_to_id_mapping(app)
         say("Here are the names I know along with that persons Slack ID :")
-        for name, info in name_to_info.items():
+        # A copy: user_change events update the directory while we're saying these
+        for name, info in list(name_to_info.items()):
             say(f"{name}: {info['id']}")
 
     @app.message("^wow", matchers=[is_not_bot_message])
@@ -0,0 +1,170 @@
+"""
+HTTP Client Module
+
+One place for the bot's outbound REST calls ( Bugzilla, the branches tool, Zoho
+Desk, GitHub ). Each host gets its own long-lived requests.Session, so repeat
+calls reuse a kept-alive connection instead of paying for a new TCP + TLS
+handshake, and every request gets:
+- a default ( connect, read ) timeout unless the caller passes one
+- retries with exponential backoff on 429 / 5xx, honouring Retry-After, for
+  idempotent reads only ( GET / HEAD / OPTIONS ) so a token request or a
+  GitHub commit is never sent twice. A Retry-After longer than
+  MAX_RETRY_AFTER is not waited out: the response goes straight back to the
+  caller, so a rate limit can't hold a thread for an hour
+- per-host call counts and latency, see host_stats(), also exported as
+  per-dependency metrics ( bugzilla, branches, zoho, github, see metrics )
+
+Use it like requests: http_client.get(url, params=..., timeout=...).
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+from metrics import observe_dependency
+
+DEFAULT_TIMEOUT = (5, 15)  # seconds to connect, seconds between bytes read
+POOL_SIZE = 10  # kept-alive connections per host
+MAX_RETRY_AFTER = DEFAULT_TIMEOUT[1]  # longest Retry-After worth waiting for
+
+
+class BoundedRetry(Retry):
+    """Retry that gives up, rather than sleeping, when Retry-After asks for
+    more than MAX_RETRY_AFTER seconds."""
+
+    def increment(self, method=None, url=None, response=None, *args, **kwargs):
+        if response is not None:
+            retry_after = self.get_retry_after(response)
+            if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                # With raise_on_status off, urllib3 returns the response
+                raise MaxRetryError(None, url, "Retry-After too long")
+        return super().increment(method, url, response, *args, **kwargs)
+
+
+RETRY = BoundedRetry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+    respect_retry_after_header=True,
+    # Hand the last response back rather than raising, so callers keep seeing
+    # the status code ( e.g. via raise_for_status ) as they always have
+    raise_on_status=False,
+)
+
+# Outside services by host ( Zoho's hosts vary by data center, see dependency_for )
+DEPENDENCIES = {
+    "bugs.koha-community.org": "bugzilla",
+    "find-branches-by-bugs.tools.bywatersolutions.com": "branches",
+    "api.github.com": "github",
+    "raw.githubusercontent.com": "github",
+}
+
+_sessions = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+class HostStats:
+    """Running call count, error count and latency for one host."""
+
+    __slots__ = ("calls", "errors", "total_seconds", "max_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds, error):
+        self.calls += 1
+        self.errors += int(error)
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_seconds": self.total_seconds / self.calls if self.calls else 0.0,
+            "max_seconds": self.max_seconds,
+        }
+
+
+def _new_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=RETRY)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(url):
+    """Return the shared Session for url's scheme and host, creating it once."""
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _new_session()
+    return session
+
+
+def request(method, url, **kwargs):
+    """Send a request through the host's pooled Session.
+
+    Takes the same arguments as requests.request. A request that raises or
+    ends in a 5xx counts as an error in host_stats().
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    host = urlsplit(url).netloc
+    start = time.monotonic()
+    error = True
+    try:
+        response = get_session(url).request(method, url, **kwargs)
+        error = response.status_code >= 500
+        return response
+    finally:
+        record(host, time.monotonic() - start, error, method)
+
+
+def record(host, seconds, error, method=""):
+    """Add one call to host's stats and the per-dependency metrics
+    ( async_http_client reports here too )."""
+    with _lock:
+        _stats.setdefault(host, HostStats()).record(seconds, error)
+    observe_dependency(dependency_for(host), method, seconds, error)
+
+
+def dependency_for(host):
+    """The outside service a host belongs to, for the metrics; the host
+    itself if it isn't one we know."""
+    dependency = DEPENDENCIES.get(host)
+    if dependency:
+        return dependency
+    if ".zoho." in f".{host}":
+        return "zoho"
+    return host
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def host_stats():
+    """Return {host: {calls, errors, avg_seconds, max_seconds}} so far."""
+    with _lock:
+        return {host: stats.as_dict() for host, stats in _stats.items()}
@@ -0,0 +1,279 @@
+"""
+Incident Store Module
+
+Where devops_alerts_handlers keeps its #devops-alerts incidents: who is being
+nagged about what, how many reminders have gone out and when the next is due.
+
+- IncidentStore keeps them in memory.
+- SqliteIncidentStore also writes them through to a SQLite file
+  ( DEVOPS_ALERT_DB ), and loads the open ones back on startup, so a redeploy
+  picks up the nagging where it left off.
+
+Open incidents are indexed by signature, so spotting a duplicate failure is a
+dict lookup. More failures can be folded into an open incident ( fold() ); it
+counts them, keeps their permalinks and answers to their signatures too.
+Acknowledged incidents are kept for ACKNOWLEDGED_TTL_SECONDS ( so
+a late click on an old button still finds its incident ) and then evicted.
+
+Stores are not locked; devops_alerts_handlers calls them under its own lock.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+DEVOPS_ALERT_DB = os.environ.get("DEVOPS_ALERT_DB", "devops_alerts.sqlite3")
+ACKNOWLEDGED_TTL_SECONDS = (
+    int(os.environ.get("DEVOPS_ALERT_ACK_TTL_HOURS", "24")) * 60 * 60
+)
+MAX_PERMALINKS = 10  # an incident keeps its first failures' links
+
+
+class Incident:
+    """A failure, or a burst of related ones, someone is ( or was ) being
+    nagged about."""
+
+    __slots__ = (
+        "incident_id",
+        "user_id",
+        "text",
+        "permalinks",
+        "signatures",
+        "failures",
+        "opened_at",
+        "last_failure_at",
+        "nag_count",
+        "next_nag",
+        "dm_channel",
+        "dm_ts",
+        "acknowledged_by",
+        "acknowledged_at",
+    )
+
+    def __init__(
+        self,
+        incident_id,
+        user_id,
+        text,
+        permalinks=(),
+        signatures=(),
+        failures=1,
+        opened_at=None,
+        last_failure_at=None,
+        nag_count=0,
+        next_nag=None,
+        dm_channel=None,
+        dm_ts=None,
+        acknowledged_by=None,
+        acknowledged_at=None,
+    ):
+        self.incident_id = incident_id
+        self.user_id = user_id
+        self.text = text
+        self.permalinks = list(permalinks)
+        self.signatures = list(signatures)  # the first failure's comes first
+        self.failures = failures
+        self.opened_at = opened_at if opened_at is not None else time.time()
+        self.last_failure_at = last_failure_at or self.opened_at
+        self.nag_count = nag_count
+        self.next_nag = next_nag  # None while a DM is being sent
+        self.dm_channel = dm_channel  # the latest DM, to update in place
+        self.dm_ts = dm_ts
+        self.acknowledged_by = acknowledged_by
+        self.acknowledged_at = acknowledged_at
+
+    @property
+    def acknowledged(self):
+        return self.acknowledged_at is not None
+
+
+class IncidentStore:
+    """Incidents by id, open ones by signature, in memory."""
+
+    def __init__(self, acknowledged_ttl=ACKNOWLEDGED_TTL_SECONDS):
+        self.acknowledged_ttl = acknowledged_ttl
+        self._incidents = {}
+        self._open_by_signature = {}
+        self._acknowledged = OrderedDict()  # incident id -> acknowledged_at
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._incidents)
+
+    def get(self, incident_id):
+        return self._incidents.get(incident_id)
+
+    def find_open(self, signature):
+        """The open incident with this signature, if there is one."""
+        return self._open_by_signature.get(signature)
+
+    def open_incidents(self):
+        # An incident with folded failures is indexed under several signatures
+        return list(dict.fromkeys(self._open_by_signature.values()))
+
+    def open(self, user_id, text, permalink, signature):
+        """Record a new incident and return it, or None if one with the same
+        signature is already open."""
+        if signature in self._open_by_signature:
+            return None
+        self.evict()
+        incident = Incident(
+            self._new_id(),
+            user_id,
+            text,
+            permalinks=[permalink] if permalink else [],
+            signatures=[signature],
+        )
+        self._add(incident)
+        self._write(incident)
+        return incident
+
+    def fold(self, incident, permalink, signature):
+        """Count another failure against an open incident, which from now on
+        also answers to the failure's signature."""
+        incident.failures += 1
+        incident.last_failure_at = time.time()
+        if permalink and len(incident.permalinks) < MAX_PERMALINKS:
+            incident.permalinks.append(permalink)
+        if signature not in self._open_by_signature:
+            incident.signatures.append(signature)
+            self._open_by_signature[signature] = incident
+        self._write(incident)
+
+    def save(self, incident):
+        """Persist changes to an incident's nags and DM."""
+        self._write(incident)
+
+    def acknowledge(self, incident_id, who=None):
+        """Mark an open incident acknowledged and return it ( None if it isn't
+        open )."""
+        incident = self._incidents.get(incident_id)
+        if incident is None or incident.acknowledged:
+            return None
+        incident.acknowledged_by = who
+        incident.acknowledged_at = time.time()
+        for signature in incident.signatures:
+            del self._open_by_signature[signature]
+        self._acknowledged[incident_id] = incident.acknowledged_at
+        self._write(incident)
+        self.evict()
+        return incident
+
+    def evict(self, now=None):
+        """Drop incidents acknowledged more than acknowledged_ttl ago."""
+        cutoff = (now if now is not None else time.time()) - self.acknowledged_ttl
+        expired = []
+        # Oldest acknowledgement first, so stop at the first one still kept
+        for incident_id, acknowledged_at in self._acknowledged.items():
+            if acknowledged_at > cutoff:
+                break
+            expired.append(incident_id)
+        for incident_id in expired:
+            del self._acknowledged[incident_id]
+            del self._incidents[incident_id]
+        if expired:
+            self._delete_acknowledged(cutoff)
+        return len(expired)
+
+    def _add(self, incident):
+        self._incidents[incident.incident_id] = incident
+        if incident.acknowledged:
+            self._acknowledged[incident.incident_id] = incident.acknowledged_at
+        else:
+            for signature in incident.signatures:
+                self._open_by_signature[signature] = incident
+
+    def _new_id(self):
+        self._counter += 1
+        return f"alert-{self._counter}"
+
+    def _write(self, incident):
+        pass
+
+    def _delete_acknowledged(self, cutoff):
+        pass
+
+
+_COLUMNS = Incident.__slots__
+_LIST_COLUMNS = ("permalinks", "signatures")  # stored as JSON
+
+
+def _row(incident):
+    return tuple(
+        json.dumps(getattr(incident, column))
+        if column in _LIST_COLUMNS
+        else getattr(incident, column)
+        for column in _COLUMNS
+    )
+
+
+def _incident(row):
+    return Incident(
+        *(
+            json.loads(value) if column in _LIST_COLUMNS else value
+            for column, value in zip(_COLUMNS, row)
+        )
+    )
+
+
+class SqliteIncidentStore(IncidentStore):
+    """IncidentStore that writes every change through to SQLite and reloads
+    the incidents still open ( or recently acknowledged ) when opened."""
+
+    def __init__(self, path=DEVOPS_ALERT_DB, acknowledged_ttl=ACKNOWLEDGED_TTL_SECONDS):
+        super().__init__(acknowledged_ttl)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS incidents (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    incident_id TEXT UNIQUE,
+                    user_id TEXT,
+                    text TEXT,
+                    permalinks TEXT,
+                    signatures TEXT,
+                    failures INTEGER,
+                    opened_at REAL,
+                    last_failure_at REAL,
+                    nag_count INTEGER,
+                    next_nag REAL,
+                    dm_channel TEXT,
+                    dm_ts TEXT,
+                    acknowledged_by TEXT,
+                    acknowledged_at REAL
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS incidents_acknowledged"
+                " ON incidents (acknowledged_at)"
+            )
+        self._delete_acknowledged(time.time() - acknowledged_ttl)
+        rows = self._db.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM incidents"
+            " ORDER BY acknowledged_at IS NOT NULL, acknowledged_at, seq"
+        ).fetchall()
+        for row in rows:
+            self._add(_incident(row))
+        # AUTOINCREMENT remembers the highest seq ever used, evicted or not,
+        # so incident ids aren't reused after a restart
+        last = self._db.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'incidents'"
+        ).fetchone()
+        self._counter = last[0] if last else 0
+
+    def _write(self, incident):
+        seq = int(incident.incident_id.rsplit("-", 1)[1])
+        with self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO incidents (seq, {', '.join(_COLUMNS)})"
+                f" VALUES (?{', ?' * len(_COLUMNS)})",
+                (seq, *_row(incident)),
+            )
+
+    def _delete_acknowledged(self, cutoff):
+        with self._db:
+            self._db.execute(
+                "DELETE FROM incidents WHERE acknowledged_at <= ?", (cutoff,)
+            )
@@ -7,6 +7,7 @@ Contains message handlers for:
 - Refreshing karma messages
 """
 
+import logging
 import re
 import random
 import os
@@ -15,6 +16,8 @@ import config
 from bot_functions import get_name_to_id_mapping, get_karma_pep_talks, get_putdowns
 from message_matchers import is_direct_message, is_not_bot_message
 
+logger = logging.getLogger(__name__)
+
 # Load karma pep talks from csv
 karma_csv_url = os.environ.get("KARMA_CSV_URL")
 karma1, karma2, karma3, karma4 = [], [], [], []
@@ -22,7 +25,7 @@ if karma_csv_url:
     try:
         karma1, karma2, karma3, karma4 = get_karma_pep_talks(url=karma_csv_url)
     except Exception as e:
-        print(f"Error loading karma talks: {e}")
+        logger.error("Error loading karma talks: %s", e)
 
 putdowns = get_putdowns()
 
@@ -43,20 +46,20 @@ def register_karma_handlers(app):
 
         if is_user:
             try:
-                print("Giving karma to", user)
+                logger.debug("Giving karma to %s", user)
                 k1 = random.choice(karma1) if karma1 else "You rock!"
                 k2 = random.choice(karma2) if karma2 else ""
                 k3 = random.choice(karma3) if karma3 else ""
                 k4 = random.choice(karma4) if karma4 else ""
 
                 message = f"{user} {k1} {k2} {k3} {k4}"
-                print("Posting message:", message)
+                logger.debug("Posting message: %s", message)
                 app.client.chat_postMessage(
                     channel="#kudos",
                     text=message,
                 )
             except Exception as e:
-                print(f"Error giving karma: {e}")
+                logger.error("Error giving karma: %s", e)
                 say(f"Great job {user}!")
         else:
             say(text=f"Who doesn't love {user}, right?")
@@ -0,0 +1,102 @@
+"""
+Message Context Module
+
+Everything the router, its matchers and the handlers want to know about one
+message event, worked out once per event instead of once per listener: the
+bot / DM flags, the channel, the text and its lowercased form, the users it
+@-mentions, and the results of every regex and matcher run against it.
+
+The MessageRouter's pre-filter builds one for each message event and puts it
+in context["message_context"], so a listener ( or matcher ) can ask for it by
+naming a message_context argument. Handlers called without one ( e.g. from
+tests ) use MessageContext.of(context, message), which builds it on demand.
+"""
+
+import re
+
+# <@U123> or <@U123|name>
+MENTION_PATTERN = re.compile(r"<@([UW][A-Z0-9]+)(?:\|[^>]*)?>")
+
+
+def event_channel(event):
+    """The channel id an event happened in: a message's channel, or the channel
+    of the item a reaction was added to. None if it has no single channel."""
+    channel = event.get("channel")
+    if channel is None:
+        channel = (event.get("item") or {}).get("channel")
+    return channel if isinstance(channel, str) else None
+
+
+def is_bot_event(event):
+    """Was the message posted by a bot/integration ( e.g. Zoho Flow, GitHub )?"""
+    return bool(event.get("bot_id") or event.get("subtype") == "bot_message")
+
+
+def is_dm_event(event):
+    """Was the message sent in a DM with the bot?"""
+    return event.get("channel_type") == "im"
+
+
+class MessageContext:
+    """Per-event facts about a message, with memoized regex and matcher results."""
+
+    __slots__ = (
+        "event",
+        "channel",
+        "user",
+        "text",
+        "lower_text",
+        "is_bot",
+        "is_dm",
+        "mentions",
+        "_found",
+        "_checked",
+    )
+
+    def __init__(self, event):
+        self.event = event
+        self.channel = event_channel(event)
+        self.user = event.get("user")
+        self.text = event.get("text") or ""
+        self.lower_text = self.text.lower()
+        self.is_bot = is_bot_event(event)
+        self.is_dm = is_dm_event(event)
+        self.mentions = tuple(dict.fromkeys(MENTION_PATTERN.findall(self.text)))
+        self._found = {}  # pattern -> re.findall result
+        self._checked = {}  # matcher -> result
+
+    @classmethod
+    def of(cls, context, message):
+        """The event's MessageContext from context, building ( and storing ) one
+        for message if the router hasn't."""
+        message_context = context.get("message_context")
+        if message_context is None or message_context.event is not message:
+            message_context = cls(message or {})
+            context["message_context"] = message_context
+        return message_context
+
+    def findall(self, pattern):
+        """re.findall(pattern, text), run at most once per pattern."""
+        found = self._found.get(pattern)
+        if found is None:
+            found = self._found[pattern] = re.findall(pattern, self.text)
+        return found
+
+    def matches(self, pattern):
+        """context["matches"] for pattern, computed the way Bolt's
+        MessageListenerMatches does, or None if the pattern isn't in the text."""
+        found = self.findall(pattern)
+        if not found:
+            return None
+        return found[0] if type(found[0]) is tuple else tuple(found)
+
+    def check(self, matcher, call):
+        """matcher's result for this event; call() runs it the first time.
+
+        Matchers must depend only on the event, which holds for every matcher
+        in message_matchers.
+        """
+        result = self._checked.get(matcher)
+        if result is None:
+            result = self._checked[matcher] = bool(call())
+        return result
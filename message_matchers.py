@@ -1,26 +1,85 @@
 """
 Listener matchers shared across the handler modules.
 
-Bolt runs only the FIRST @app.message listener that matches an incoming
-message, so a handler that only conditionally acts ( DM-only, or one that
-should skip messages posted by other bots ) has to express that as a listener
-matcher, not an early return in its body. An early return still counts the
-message as handled, which shadows every handler registered after it. These
-matchers let such handlers decline to match instead, so the message falls
-through to the handler that should actually run.
+Only the FIRST message listener that matches an incoming message runs ( in
+the MessageRouter's priority order, see message_router ), so a handler that
+only conditionally acts ( DM-only, or one that should skip messages posted by
+other bots ) has to express that as a listener matcher, not an early return in
+its body. An early return still counts the message as handled, which shadows
+every handler routed after it. These matchers let such handlers decline to
+match instead, so the message falls through to the handler that should
+actually run.
 
 Convention: every human-command @app.message handler uses is_not_bot_message
 ( or is_direct_message for DM-only commands ) so bot posts can only ever reach
-the handlers meant for them ( the #tickets new-ticket notifier, registered
-first, and the #devops-alerts watcher, registered last ).
+the handlers meant for them ( the #tickets new-ticket notifier, routed
+first, and the #devops-alerts watcher, routed last ).
+
+Under the router each matcher also gets the event's MessageContext ( see
+message_context ), whose flags were worked out once for the event; called
+without one they read the message directly.
 """
 
+import logging
+
+from directory_functions import get_channel_index
+from message_context import event_channel, is_bot_event, is_dm_event
+
+logger = logging.getLogger(__name__)
+
 
-def is_direct_message(message):
+def is_direct_message(message, message_context=None):
     """Match only messages sent in a DM with the bot."""
-    return message.get("channel_type") == "im"
+    if message_context is not None:
+        return message_context.is_dm
+    return is_dm_event(message)
 
 
-def is_not_bot_message(message):
+def is_not_bot_message(message, message_context=None):
     """Skip messages posted by bots/integrations ( e.g. Zoho Flow, GitHub )."""
-    return not (message.get("bot_id") or message.get("subtype") == "bot_message")
+    if message_context is not None:
+        return not message_context.is_bot
+    return not is_bot_event(message)
+
+
+def in_channel(*channel_ids):
+    """Build a matcher for events in one of the given channels.
+
+    Works for messages and for reactions ( the reacted-to item's channel ).
+    Ids that couldn't be resolved ( None ) are dropped, so a handler whose
+    channel lookup failed matches nothing rather than everything. The ids are
+    kept on the matcher as .channels: the MessageRouter indexes routes by them,
+    so the handler is never even considered for another channel's events.
+    """
+    channels = frozenset(channel_id for channel_id in channel_ids if channel_id)
+
+    def matcher(event, message_context=None):
+        if message_context is not None:
+            return message_context.channel in channels
+        return event_channel(event or {}) in channels
+
+    matcher.channels = channels
+    return matcher
+
+
+def in_channel_named(app, name):
+    """in_channel for a channel known by name ( without the # ), for a handler
+    that must not go quiet when the name couldn't be resolved at startup.
+
+    The channel is looked up in the shared channel index ( see
+    directory_functions ) as each event arrives, so once Slack answers the
+    handler starts matching. Its route isn't bound to a channel, so the
+    MessageRouter considers it for every channel's events of its type.
+    """
+
+    def matcher(event, message_context=None):
+        try:
+            channel_id = get_channel_index(app).channel_id(name)
+        except Exception as e:
+            logger.error("Error looking up #%s: %s", name, e)
+            return False
+        if message_context is not None:
+            return channel_id is not None and message_context.channel == channel_id
+        return channel_id is not None and event_channel(event or {}) == channel_id
+
+    return matcher
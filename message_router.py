@@ -0,0 +1,634 @@
+"""
+Message Router Module
+
+Bolt keeps every @app.message listener in a list and, for each incoming
+message, walks it in registration order: run the listener's regex, then its
+matchers, and stop at the first listener that passes. That makes routing depend
+on the order handler modules happen to be registered in, and every
+non-command message still pays for the whole walk.
+
+MessageRouter stands in for the app while the handler modules register. It
+collects their @app.message / @app.event("message") listeners as routes with
+an explicit priority ( lower runs first; ties keep registration order ) and
+installs a single Bolt message listener in their place. Each message is then
+classified with one combined regex that reports every command pattern found
+in its text at once. The winner is the first route, in priority order, whose
+pattern was found and whose matchers pass. Only the winning pattern runs
+re.findall, to fill context["matches"] exactly as Bolt does. A message no route
+wants is dropped before any handler work.
+
+Before that, a global middleware pre-filters every message event: one regex
+search of the lowercased text for the literal words each route's pattern
+can't match without ( "bug", "zd", "++", ... ), plus a channel allowlist for
+the channel-bound catch-alls like the #devops-alerts watcher. Anything that
+fails both is acknowledged and dropped before Bolt walks a single listener;
+filtered_count says how many were.
+
+Routes bound to channels with in_channel(...) ( the #devops-alerts watcher,
+the #tickets test command, the #devops :fire: reaction handler ) are indexed
+by channel id. Each event only walks the routes for its own channel plus the
+unbound ones, looked up from a dict, so a channel watcher is never considered,
+let alone called, for another channel's traffic. Non-message events can be
+channel-routed the same way: router.event("reaction_added",
+matchers=[in_channel(...)]).
+
+The pre-filter also builds the event's MessageContext ( see message_context )
+and leaves it in context["message_context"]. The pre-filter, the classifier,
+every matcher and the handler then share its lowercased text, flags and
+memoized regex results, so a matcher shared by many routes runs once per
+message and the winner's findall is the one its handler reads back.
+
+Listeners can be split the way Bolt's lazy listeners are:
+router.message(pattern)(ack=reply_now, lazy=[do_the_slow_part]). The ack
+function ( optional here ) runs inline, then each lazy function goes to a
+bounded WorkerPool ( lazy_pool ), so a Bugzilla or Twilio call never holds a
+Socket Mode worker thread. The route is named after its first lazy function.
+
+Anything else ( @app.action, other @app.event types, app.client, ... ) passes
+straight through to the real app.
+
+Every listener run through the router, routed or passed through, is counted
+and timed per handler in the metrics endpoint ( see metrics.track_handler ).
+"""
+
+import functools
+import inspect
+import re
+import threading
+from contextlib import contextmanager
+
+from slack_bolt.response import BoltResponse
+from slack_bolt.util.utils import get_name_for_callable
+
+from message_context import MessageContext, event_channel
+from metrics import track_handler
+from worker_pool import WorkerPool
+
+try:  # Python 3.11+
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+# The subtypes Bolt's @app.message accepts; other message subtypes ( edits,
+# deletes, joins, ... ) only reach @app.event("message") listeners
+MESSAGE_SUBTYPES = (None, "bot_message", "thread_broadcast", "file_share")
+
+DEFAULT_PRIORITY = 50
+
+_UNBUILT = object()  # pre-filter rules not built since the last registration
+_NO_ROUTES = ({}, ())
+
+# Regex flags that can be scoped to one alternative of the combined pattern
+_SCOPED_FLAGS = {re.IGNORECASE: "i", re.MULTILINE: "m", re.DOTALL: "s", re.VERBOSE: "x"}
+
+
+def _arg_names(func):
+    return list(inspect.signature(func).parameters)
+
+
+def _call(func, arg_names, available):
+    """Call func with the arguments it names, as Bolt's kwargs injection does."""
+    return func(**{name: available.get(name) for name in arg_names})
+
+
+def _call_handler(func, arg_names, available):
+    """_call for a listener function, counted and timed per handler."""
+    with track_handler(func.__name__):
+        return _call(func, arg_names, available)
+
+
+def _tracked_listener(func):
+    """func as a Bolt listener that's counted and timed per handler. Bolt
+    unwraps it to see which arguments to inject."""
+
+    @functools.wraps(func)
+    def listener(**kwargs):
+        with track_handler(func.__name__):
+            return func(**kwargs)
+
+    return listener
+
+
+_GROUP_REFS = tuple(
+    getattr(sre_constants, name)
+    for name in ("GROUPREF", "GROUPREF_EXISTS")
+    if hasattr(sre_constants, name)
+)
+
+
+def _subpatterns(av):
+    """The parsed sequences nested anywhere in an opcode's argument."""
+    if isinstance(av, sre_parse.SubPattern):
+        yield av
+    elif isinstance(av, (tuple, list)):
+        for item in av:
+            yield from _subpatterns(item)
+
+
+def _refers_to_groups(parsed):
+    """Does a parsed regex use a backreference or a (?(1)...) conditional?"""
+    for op, av in parsed:
+        if op in _GROUP_REFS:
+            return True
+        if any(_refers_to_groups(sub) for sub in _subpatterns(av)):
+            return True
+    return False
+
+
+def _scoped_source(pattern):
+    """Return pattern's source with its flags scoped to it, or None if it can't
+    be embedded in the combined regex ( named groups, group references, inline
+    global flags, unsupported flags ).
+
+    Embedded, a pattern's groups are renumbered, so a backreference would
+    point at the wrong group, and a leading "(?i)" is no longer at the start.
+    """
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern)
+    if pattern.groupindex:
+        return None
+    try:
+        # Parsed without the compile flags, any flag it sets came inline
+        parsed = sre_parse.parse(pattern.pattern)
+    except re.error:  # e.g. a verbose pattern read as a plain one
+        return None
+    if parsed.state.flags & ~re.UNICODE or _refers_to_groups(parsed):
+        return None
+    flags = ""
+    remaining = pattern.flags & ~re.UNICODE
+    for flag, letter in _SCOPED_FLAGS.items():
+        if remaining & flag:
+            flags += letter
+            remaining &= ~flag
+    if remaining:
+        return None
+    return f"(?{flags}:{pattern.pattern})" if flags else f"(?:{pattern.pattern})"
+
+
+_REPEATS = tuple(
+    getattr(sre_constants, name)
+    for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(sre_constants, name)
+)
+
+
+def _requirements(parsed):
+    """Literal requirements of a parsed regex sequence.
+
+    Returns a list of sets of strings; a text the regex matches must contain
+    at least one string from every set ( e.g. the bug lookup's "(bug|bz)" gives
+    [{"bug", "bz"}] ). Strings are lowercased, which only loosens a
+    case-sensitive pattern's requirement.
+    """
+    requirements = []
+    run = []
+
+    def end_run():
+        if run:
+            requirements.append(frozenset(["".join(run).lower()]))
+            run.clear()
+
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        if op is sre_constants.BRANCH and run:
+            # The parser hoists a shared prefix out of alternatives ( "bug|bz"
+            # becomes "b" + "ug|z" ), so glue it back onto each one
+            leads = [_leading_literal(branch) for branch in av[1]]
+            if all(leads):
+                prefix = "".join(run)
+                requirements.append(
+                    frozenset((prefix + lead).lower() for lead in leads)
+                )
+        end_run()
+        if op is sre_constants.SUBPATTERN:
+            requirements.extend(_requirements(av[-1]))
+        elif op is sre_constants.BRANCH:
+            alternatives = set()
+            for branch in av[1]:
+                best = _best_requirement(_requirements(branch))
+                if best is None:
+                    break
+                alternatives |= best
+            else:
+                requirements.append(frozenset(alternatives))
+        elif op in _REPEATS and av[0] >= 1:
+            requirements.extend(_requirements(av[2]))
+    end_run()
+    return requirements
+
+
+def _leading_literal(parsed):
+    """The literal text a parsed regex sequence starts with, if any."""
+    lead = []
+    for op, av in parsed:
+        if op is not sre_constants.LITERAL:
+            break
+        lead.append(chr(av))
+    return "".join(lead)
+
+
+def _best_requirement(requirements):
+    """The most selective requirement: the one whose shortest string is longest."""
+    if not requirements:
+        return None
+    return max(requirements, key=lambda strings: min(map(len, strings)))
+
+
+def required_literals(pattern):
+    """Return a set of lowercase strings, one of which any text pattern matches
+    must contain, or None if the pattern doesn't require any literal text."""
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern)
+    best = _best_requirement(_requirements(sre_parse.parse(pattern.pattern)))
+    if best is None or not all(best):
+        return None
+    return best
+
+
+def _channel_bound(matchers):
+    """Any channel allowlist among matchers ( see in_channel ), intersected."""
+    channels = None
+    for m in matchers or []:
+        if hasattr(m, "channels"):
+            channels = m.channels if channels is None else channels & m.channels
+    return channels
+
+
+def _listener_functions(functions, ack, lazy):
+    """( ack function, lazy functions ) from Bolt-style listener arguments:
+    the listener itself, or ack=... and/or lazy=[...]. ack may be None when
+    there's nothing to say before the lazy work."""
+    if ack is None and not lazy:
+        if len(functions) != 1:
+            raise ValueError("Pass one listener function, or ack= and lazy=[...]")
+        return functions[0], ()
+    if functions:
+        raise ValueError("Pass either a listener function or ack=/lazy=, not both")
+    return ack, tuple(lazy or ())
+
+
+class Route:
+    """One registered listener: a message route, or a channel-bound event one."""
+
+    __slots__ = (
+        "name",
+        "func",
+        "arg_names",
+        "lazy",
+        "event_type",
+        "pattern",
+        "matchers",
+        "channels",
+        "subtypes",
+        "priority",
+        "order",
+        "group",
+    )
+
+    def __init__(
+        self, func, lazy, event_type, pattern, matchers, subtypes, priority, order
+    ):
+        self.name = get_name_for_callable(lazy[0] if lazy else func)
+        self.func = func
+        self.arg_names = _arg_names(func) if func else []
+        self.lazy = [(f, _arg_names(f)) for f in lazy]
+        self.event_type = event_type
+        self.pattern = pattern
+        # Channel matchers are enforced by the channel index, not called
+        self.channels = _channel_bound(matchers)
+        self.matchers = [
+            (m, _arg_names(m)) for m in matchers or [] if not hasattr(m, "channels")
+        ]
+        self.subtypes = subtypes
+        self.priority = priority
+        self.order = order
+        self.group = None  # named group in the combined regex, once built
+
+    def accepts(self, event):
+        """Does the event's subtype suit this route?"""
+        return self.subtypes is None or event.get("subtype") in self.subtypes
+
+
+class MessageRouter:
+    """Priority-ordered, single-pass dispatch for message listeners.
+
+    Register handlers against the router exactly as against the app:
+
+        router = MessageRouter(app)
+        with router.priority(10):
+            register_ticket_notifier(router)
+        register_general_handlers(router)
+    """
+
+    def __init__(self, app):
+        self._app = app
+        self._routes = []  # in dispatch order
+        self._priority = DEFAULT_PRIORITY
+        self._combined = None
+        self._prefilter = _UNBUILT
+        self._index = None  # {event type: ( {channel: routes}, unbound routes )}
+        self._lock = threading.Lock()
+        self.filtered_count = 0
+        self.lazy_pool = self._new_lazy_pool()
+        self._install(app)
+
+    def _new_lazy_pool(self):
+        return WorkerPool("lazy-listener")
+
+    def _install(self, app):
+        """Install the pre-filter middleware and the dispatching listeners."""
+
+        def prefilter_messages(body, context, next):
+            if self._admit(body, context):
+                return next()
+            # A plain 200 ends the chain and still acks the event
+            return BoltResponse(status=200, body="")
+
+        def dispatch_message(args):
+            self.dispatch(args)
+
+        def dispatch_event(args):
+            self.dispatch(args)
+
+        self._dispatch_event = dispatch_event
+        app.use(prefilter_messages)
+        app.event("message")(dispatch_message)
+
+    def __getattr__(self, name):
+        return getattr(self._app, name)
+
+    @contextmanager
+    def priority(self, priority):
+        """Give the routes registered inside this block the given priority."""
+        previous = self._priority
+        self._priority = priority
+        try:
+            yield self
+        finally:
+            self._priority = previous
+
+    def _add(self, functions, ack, lazy, event_type, pattern, matchers, subtypes):
+        func, lazy = _listener_functions(functions, ack, lazy)
+        with self._lock:
+            first_of_type = all(r.event_type != event_type for r in self._routes)
+            route = Route(
+                func,
+                lazy,
+                event_type,
+                pattern,
+                matchers,
+                subtypes,
+                self._priority,
+                len(self._routes),
+            )
+            self._routes.append(route)
+            self._routes.sort(key=lambda r: (r.priority, r.order))
+            self._combined = None
+            self._prefilter = _UNBUILT
+            self._index = None
+        if event_type != "message" and first_of_type:
+            self._app.event(event_type)(self._dispatch_event)
+        return func or lazy[0]
+
+    def message(self, keyword, matchers=None):
+        """Register a message listener, like App.message ( including
+        ack=/lazy= listeners )."""
+
+        def __call__(*functions, ack=None, lazy=None):
+            return self._add(
+                functions, ack, lazy, "message", keyword, matchers, MESSAGE_SUBTYPES
+            )
+
+        return __call__
+
+    def event(self, event, matchers=None, middleware=None):
+        """Register an event listener, like App.event.
+
+        "message" listeners become catch-all routes ( no pattern, every
+        subtype ). Other event types are routed here too when a matcher binds
+        them to channels ( and there's no listener middleware ); anything else
+        goes straight to the app.
+        """
+        if not self._routes_event(event, matchers, middleware):
+            return self._passthrough(
+                lambda m: self._app.event(event, matchers=m, middleware=middleware),
+                matchers,
+            )
+
+        def __call__(*functions, ack=None, lazy=None):
+            return self._add(functions, ack, lazy, event, None, matchers, None)
+
+        return __call__
+
+    def action(self, constraints, matchers=None, middleware=None):
+        """Register an action listener, like App.action ( straight to the app )."""
+        return self._passthrough(
+            lambda m: self._app.action(constraints, matchers=m, middleware=middleware),
+            matchers,
+        )
+
+    def _passthrough(self, register, matchers):
+        """Register a listener on the app via register(matchers), counted and
+        timed like the routed ones."""
+        decorator = register(matchers)
+
+        def __call__(func):
+            decorator(_tracked_listener(func))
+            return func
+
+        return __call__
+
+    def _routes_event(self, event, matchers, middleware):
+        """Should this event listener be a route rather than go to the app?"""
+        return event == "message" or not (
+            middleware or not isinstance(event, str) or _channel_bound(matchers) is None
+        )
+
+    def _routes_for(self, event_type, channel):
+        """The routes, in dispatch order, that could handle an event of this
+        type in this channel: the unbound ones plus those bound to channel."""
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._build_index()
+                index = self._index
+        by_channel, unbound = index.get(event_type, _NO_ROUTES)
+        return by_channel.get(channel, unbound)
+
+    def _build_index(self):
+        index = {}
+        for event_type in {route.event_type for route in self._routes}:
+            routes = [r for r in self._routes if r.event_type == event_type]
+            unbound = tuple(r for r in routes if r.channels is None)
+            channels = set().union(*(r.channels or () for r in routes))
+            by_channel = {
+                channel: tuple(
+                    r for r in routes if r.channels is None or channel in r.channels
+                )
+                for channel in channels
+            }
+            index[event_type] = (by_channel, unbound)
+        return index
+
+    def _classifier(self):
+        """The combined regex: one optional lookahead per routed pattern.
+
+        Matched at position 0, each lookahead scans the text for its pattern
+        and, when found, sets its named group, so a single match() call reports
+        every pattern present. Patterns that can't be embedded are left to a
+        findall of their own.
+        """
+        combined = self._combined
+        if combined is not None:
+            return combined
+        with self._lock:
+            if self._combined is None:
+                parts = []
+                for i, route in enumerate(self._message_routes()):
+                    source = route.pattern and _scoped_source(route.pattern)
+                    route.group = f"r{i}" if source else None
+                    if source:
+                        parts.append(f"(?:(?=[\\s\\S]*?(?P<r{i}>{source})))?")
+                self._combined = re.compile("".join(parts))
+            return self._combined
+
+    def _message_routes(self):
+        return [route for route in self._routes if route.event_type == "message"]
+
+    def _prefilter_rules(self):
+        """Build ( literal regex, channel allowlist ) from the routes.
+
+        Returns None when some route could match any text in any channel ( a
+        pattern with no required literal, or an unrestricted catch-all ), in
+        which case nothing can be filtered.
+        """
+        literals = set()
+        channels = set()
+        for route in self._message_routes():
+            if route.pattern is not None:
+                required = required_literals(route.pattern)
+                if required is None:
+                    return None
+                literals |= required
+                continue
+            if route.channels is None:
+                return None
+            channels |= route.channels
+
+        words = sorted(literals, key=len, reverse=True)
+        literal_re = re.compile("|".join(map(re.escape, words))) if words else None
+        return literal_re, frozenset(channels)
+
+    def _admit(self, body, context):
+        """The pre-filter: build a message event's MessageContext and decide
+        whether it goes on to the listeners. Non-message events always do."""
+        event = body.get("event") or {}
+        if event.get("type") != "message":
+            return True
+        message_context = context["message_context"] = MessageContext(event)
+        if self.wants(event, message_context):
+            return True
+        with self._lock:
+            self.filtered_count += 1
+        return False
+
+    def wants(self, event, message_context=None):
+        """Could any route want this message event? ( The pre-filter check. )"""
+        if event.get("type") != "message":
+            return True
+        rules = self._prefilter
+        if rules is _UNBUILT:
+            with self._lock:
+                if self._prefilter is _UNBUILT:
+                    self._prefilter = self._prefilter_rules()
+                rules = self._prefilter
+        if rules is None:
+            return True
+        literal_re, channels = rules
+        if event.get("channel") in channels:
+            return True
+        if literal_re is None or not event.get("text"):
+            return False
+        message_context = message_context or MessageContext(event)
+        return literal_re.search(message_context.lower_text) is not None
+
+    def select(self, event, available):
+        """Return ( route, matches ) for the route that should handle event.
+
+        available supplies the arguments matchers may ask for ( message, body,
+        context, ... ) and, if the pre-filter built one, the event's
+        message_context. Returns ( None, None ) if no route wants the event.
+        """
+        if event.get("type") != "message":
+            for route in self._routes_for(event.get("type"), event_channel(event)):
+                if all(_call(m, names, available) for m, names in route.matchers):
+                    return route, None
+            return None, None
+
+        message_context = available.get("message_context")
+        if message_context is None or message_context.event is not event:
+            message_context = available["message_context"] = MessageContext(event)
+        text = message_context.text
+        found = self._classifier().match(text) if text else None
+
+        for route in self._routes_for("message", message_context.channel):
+            if not route.accepts(event):
+                continue
+            if route.pattern is not None:
+                if not text:
+                    continue
+                if route.group:
+                    if found.group(route.group) is None:
+                        continue
+                elif not message_context.findall(route.pattern):
+                    continue
+            if all(
+                message_context.check(m, lambda: _call(m, names, available))
+                for m, names in route.matchers
+            ):
+                if route.pattern is None:
+                    return route, None
+                return route, message_context.matches(route.pattern)
+        return None, None
+
+    def resolve(self, event):
+        """Name of the listener that would handle event, without running it."""
+        body = {"type": "event_callback", "event": event}
+        route, _ = self.select(
+            event, {"message": event, "event": event, "body": body, "context": {}}
+        )
+        return route.name if route else None
+
+    def _route(self, args):
+        """Return ( route, available arguments ) for the event in Bolt's listener
+        args, with context["matches"] set for the winner. route is None if no
+        route wants the event."""
+        # Context values are injectable too, unless they clash with a Bolt arg
+        available = dict(args.context)
+        available.update(vars(args))
+        route, matches = self.select(args.event or {}, available)
+        if route is None:
+            return None, available
+        if "message_context" in available:
+            args.context["message_context"] = available["message_context"]
+        if matches is not None:
+            args.context["matches"] = matches
+        return route, available
+
+    def dispatch(self, args):
+        """Run the winning route for the message in Bolt's listener args.
+
+        Its ack function runs here; its lazy functions are queued on lazy_pool.
+        """
+        route, available = self._route(args)
+        if route is None:
+            return None
+        result = route.func and _call_handler(route.func, route.arg_names, available)
+        for func, arg_names in route.lazy:
+            self.lazy_pool.submit(_call_handler, func, arg_names, available)
+        return result
@@ -0,0 +1,63 @@
+"""
+Metered Clients Module
+
+Drop-in subclasses of the clients the bot uses for outside services that
+count and time every call into the per-dependency metrics
+( bywaterbot_dependency_* , see metrics ):
+
+- MeteredWebClient: the Slack Web API, by method ( "chat.postMessage", ... )
+- MeteredHttpRequest: Google Calendar requests, by API method
+  ( "calendar.events.list", ... ); pass it to build() as requestBuilder
+- MeteredTwilioHttpClient: Twilio REST calls, by HTTP method
+
+Bugzilla, the branches tool, Zoho Desk and GitHub go through http_client
+( and async_http_client ), which reports them itself.
+"""
+
+import time
+
+from googleapiclient.http import HttpRequest
+from slack_sdk import WebClient
+from twilio.http.http_client import TwilioHttpClient
+
+import http_client
+from metrics import observe_dependency, track_dependency
+
+# Twilio's client takes one timeout, not a ( connect, read ) pair; give it
+# http_client's read timeout so a hung call can't hold an SMS worker forever
+TWILIO_TIMEOUT = http_client.DEFAULT_TIMEOUT[1]
+
+
+class MeteredWebClient(WebClient):
+    """A Slack WebClient that records each API call's latency and failures."""
+
+    def api_call(self, api_method, **kwargs):
+        with track_dependency("slack", api_method):
+            return super().api_call(api_method, **kwargs)
+
+
+class MeteredHttpRequest(HttpRequest):
+    """A Google API request that records its latency and failures."""
+
+    def execute(self, *args, **kwargs):
+        with track_dependency("google_calendar", self.methodId or ""):
+            return super().execute(*args, **kwargs)
+
+
+class MeteredTwilioHttpClient(TwilioHttpClient):
+    """Twilio's HTTP client, recording each request's latency and failures
+    ( errors are raised later, by the Twilio resource, so a 4xx / 5xx response
+    counts as one here ). Requests time out after TWILIO_TIMEOUT seconds."""
+
+    def __init__(self, *args, timeout=TWILIO_TIMEOUT, **kwargs):
+        super().__init__(*args, timeout=timeout, **kwargs)
+
+    def request(self, method, url, *args, **kwargs):
+        start = time.monotonic()
+        error = True
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            error = response.status_code >= 400
+            return response
+        finally:
+            observe_dependency("twilio", method, time.monotonic() - start, error)
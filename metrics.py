@@ -0,0 +1,443 @@
+"""
+Metrics Module
+
+A small, dependency-free metrics registry in the Prometheus style, and a local
+HTTP endpoint that serves it in the Prometheus text format:
+
+    curl http://127.0.0.1:9102/metrics
+
+Metrics are created once, at import time of the module that owns them, and
+are safe to update from any thread:
+
+    EVENTS = metrics.counter("bywaterbot_events_total", "Events received.", ["type"])
+    EVENTS.labels(type="events_api").inc()
+
+    WAIT = metrics.histogram("bywaterbot_queue_wait_seconds", "Time queued.")
+    WAIT.observe(0.012)
+
+Asking for a metric name that's already registered returns the existing
+metric, so re-registering handlers ( e.g. in tests ) doesn't duplicate it. A
+gauge can also be computed when scraped, with set_function.
+
+Besides the Socket Mode saturation metrics ( see socket_mode_metrics ), every
+listener is counted and timed per handler ( bywaterbot_handler_*, recorded
+by the MessageRouter ) and every call to an outside service per dependency
+and operation ( bywaterbot_dependency_*: slack, google_calendar, twilio from
+metered_clients; bugzilla, branches, zoho and github from http_client ), so
+a slow command can be traced to the hop that made it slow.
+
+The endpoint is off unless start_metrics_server() is called; bywaterbot.py
+starts it on METRICS_ADDRESS:METRICS_PORT ( 127.0.0.1:9102 by default, set
+METRICS_PORT=0 to turn it off ).
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_ADDRESS = os.environ.get("METRICS_ADDRESS", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9102"))
+
+# Seconds; suits everything from a regex match to a slow Calendar call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = {}  # name -> metric, in registration order
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A named metric family: one child per combination of label values."""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **labels):
+        """The child for these label values ( positional or by name )."""
+        if labels:
+            values = tuple(labels[name] for name in self.labelnames)
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} needs labels {self.labelnames}")
+        return self._children[()]
+
+    def collect(self):
+        """Return the metric's lines in the Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(child.collect(self, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("Counters can only go up")
+        with self._lock:
+            self.value += amount
+
+    def collect(self, metric, values):
+        labels = _format_labels(metric.labelnames, values)
+        return [f"{metric.name}{labels} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """A count that only goes up ( events received, errors, ... )."""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+    @property
+    def value(self):
+        return self._unlabelled().value
+
+
+class _GaugeChild:
+    __slots__ = ("_lock", "_value", "_function")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+        self._function = None
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Compute the gauge by calling function() whenever it's read."""
+        self._function = function
+
+    @property
+    def value(self):
+        function = self._function
+        if function is not None:
+            try:
+                return function()
+            except Exception as e:
+                logger.error("Error reading gauge: %s", e)
+                return math.nan
+        return self._value
+
+    def collect(self, metric, values):
+        labels = _format_labels(metric.labelnames, values)
+        return [f"{metric.name}{labels} {_format_value(self.value)}"]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down ( queue depth, listeners in flight, ... )."""
+
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._unlabelled().set(value)
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount=1):
+        self._unlabelled().dec(amount)
+
+    def set_function(self, function):
+        self._unlabelled().set_function(function)
+
+    @property
+    def value(self):
+        return self._unlabelled().value
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "_upper_bounds", "_counts", "sum", "count")
+
+    def __init__(self, upper_bounds):
+        self._lock = threading.Lock()
+        self._upper_bounds = upper_bounds
+        self._counts = [0] * len(upper_bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect_left(self._upper_bounds, value)  # first bound >= value
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            self._counts[i] += 1
+
+    @contextmanager
+    def time(self):
+        """Observe how long the with block takes."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start)
+
+    def buckets(self):
+        """Return [( upper bound, cumulative count )], ending with +Inf."""
+        with self._lock:
+            counts = list(self._counts)
+        cumulative = 0
+        result = []
+        for bound, count in zip(self._upper_bounds, counts):
+            cumulative += count
+            result.append((bound, cumulative))
+        return result
+
+    def collect(self, metric, values):
+        names = metric.labelnames
+        lines = []
+        for bound, cumulative in self.buckets():
+            labels = _format_labels(names, values, [("le", _format_value(bound))])
+            lines.append(f"{metric.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(names, values)
+        lines.append(f"{metric.name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{metric.name}_count{labels} {self.count}")
+        return lines
+
+
+class Histogram(_Metric):
+    """A distribution of observed values ( latencies ), counted into buckets."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        bounds = sorted(float(b) for b in buckets if not math.isinf(b))
+        self._upper_bounds = tuple(bounds) + (math.inf,)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self._upper_bounds)
+
+    def observe(self, value):
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+
+def _register(cls, name, documentation, labelnames, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, documentation, labelnames, **kwargs)
+        elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered differently")
+        return metric
+
+
+def counter(name, documentation, labelnames=()):
+    """Return the Counter called name, registering it if it's new."""
+    return _register(Counter, name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    """Return the Gauge called name, registering it if it's new."""
+    return _register(Gauge, name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Return the Histogram called name, registering it if it's new."""
+    return _register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def get(name):
+    """The registered metric called name, or None."""
+    return _registry.get(name)
+
+
+def render():
+    """Every registered metric, in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+HANDLER_CALLS = counter(
+    "bywaterbot_handler_calls_total", "Listener invocations, by handler.", ["handler"]
+)
+HANDLER_ERRORS = counter(
+    "bywaterbot_handler_errors_total", "Listener invocations that raised.", ["handler"]
+)
+HANDLER_SECONDS = histogram(
+    "bywaterbot_handler_seconds", "Time spent in each listener.", ["handler"]
+)
+DEPENDENCY_CALLS = counter(
+    "bywaterbot_dependency_calls_total",
+    "Calls to outside services, by service and operation.",
+    ["dependency", "operation"],
+)
+DEPENDENCY_ERRORS = counter(
+    "bywaterbot_dependency_errors_total",
+    "Calls to outside services that failed.",
+    ["dependency", "operation"],
+)
+DEPENDENCY_SECONDS = histogram(
+    "bywaterbot_dependency_seconds",
+    "Latency of calls to outside services.",
+    ["dependency", "operation"],
+)
+
+
+def _observe(calls, errors, latency, labels, seconds, error):
+    calls.labels(*labels).inc()
+    if error:
+        errors.labels(*labels).inc()
+    latency.labels(*labels).observe(seconds)
+
+
+@contextmanager
+def _tracked(calls, errors, latency, labels):
+    start = time.monotonic()
+    error = True
+    try:
+        yield
+        error = False
+    finally:
+        _observe(calls, errors, latency, labels, time.monotonic() - start, error)
+
+
+def track_handler(handler):
+    """Count and time the listener ( named by function ) run in a with block."""
+    return _tracked(HANDLER_CALLS, HANDLER_ERRORS, HANDLER_SECONDS, (handler,))
+
+
+def track_dependency(dependency, operation=""):
+    """Count and time a call to an outside service made in a with block."""
+    return _tracked(
+        DEPENDENCY_CALLS,
+        DEPENDENCY_ERRORS,
+        DEPENDENCY_SECONDS,
+        (dependency, operation),
+    )
+
+
+def observe_dependency(dependency, operation, seconds, error):
+    """Record one call to an outside service that was timed elsewhere."""
+    _observe(
+        DEPENDENCY_CALLS,
+        DEPENDENCY_ERRORS,
+        DEPENDENCY_SECONDS,
+        (dependency, operation),
+        seconds,
+        error,
+    )
+
+
+def watch_worker_pool(pool, prefix="bywaterbot_lazy_jobs"):
+    """Export a WorkerPool's ( or AsyncWorkerPool's ) stats() as gauges."""
+    for key, documentation in (
+        ("queued", "Lazy listener jobs waiting for a worker."),
+        ("running", "Lazy listener jobs running."),
+        ("max_depth", "Most lazy listener jobs ever waiting at once."),
+        ("ran_inline", "Lazy listener jobs run inline because the pool was full."),
+        ("errors", "Lazy listener jobs that raised."),
+        ("avg_wait_seconds", "Mean time lazy listener jobs waited for a worker."),
+    ):
+        gauge(f"{prefix}_{key}", documentation).set_function(
+            lambda key=key: pool.stats()[key]
+        )
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes would drown out the bot's own output
+
+
+def start_metrics_server(port=METRICS_PORT, address=METRICS_ADDRESS):
+    """Serve /metrics from a daemon thread. Returns the server ( port 0 picks
+    a free port, see server.server_port ), or None if it can't be bound."""
+    try:
+        server = ThreadingHTTPServer((address, port), _MetricsRequestHandler)
+    except OSError as e:
+        logger.error("Error starting metrics endpoint on %s:%s: %s", address, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    logger.info("Serving metrics on http://%s:%s/metrics", address, server.server_port)
+    return server
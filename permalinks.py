@@ -0,0 +1,89 @@
+"""
+Permalinks Module
+
+Message permalinks for the #devops and #devops-alerts handlers, built locally
+from the workspace URL ( auth_test, once ) instead of with a chat_getPermalink
+call per message; only thread replies, or a workspace whose URL couldn't be
+loaded, still go through the API.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# One builder per Bolt app ( in practice there is only one )
+_builders = {}
+_builders_lock = threading.Lock()
+
+
+class PermalinkBuilder:
+    """Formats message permalinks from the workspace URL.
+
+    A permalink is the workspace URL, the channel id and the message ts with
+    its dot taken out. Thread replies need the parent's ts as well, in a form
+    Slack doesn't document, so those are left to chat_getPermalink.
+    """
+
+    def __init__(self, app):
+        self._app = app
+        self._load_lock = threading.Lock()
+        self._workspace_url = None
+        self._loaded = False
+
+    def load(self, auth=None):
+        """Load the workspace URL, from an auth_test response if one is given
+        ( saving a call ). Returns whether the URL is known."""
+        with self._load_lock:
+            self._load(auth)
+        return self._workspace_url is not None
+
+    def _load(self, auth):
+        try:
+            url = (auth or self._app.client.auth_test()).get("url")
+        except Exception as e:
+            logger.error("Error getting workspace URL: %s", e)
+            url = None
+        if isinstance(url, str) and url.startswith("https://"):
+            self._workspace_url = url.rstrip("/") + "/"
+        else:
+            logger.warning("Workspace URL unknown; using chat_getPermalink")
+        self._loaded = True
+
+    def permalink(self, channel_id, ts, thread_ts=None):
+        """Return the permalink to a message, or None if there isn't one.
+
+        The workspace URL is loaded on first use; if that fails, or the
+        message is a thread reply, Slack is asked instead.
+        """
+        if not channel_id or not ts:
+            return None
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load(None)
+        if self._workspace_url and (not thread_ts or thread_ts == ts):
+            return f"{self._workspace_url}archives/{channel_id}/p{ts.replace('.', '')}"
+        return self.from_slack(channel_id, ts)
+
+    def from_slack(self, channel_id, ts):
+        """Ask Slack for a message's permalink ( for a reply whose parent
+        isn't known, say )."""
+        return self._app.client.chat_getPermalink(
+            channel=channel_id, message_ts=ts
+        ).get("permalink")
+
+
+def get_permalink_builder(app):
+    """Return the shared PermalinkBuilder for this app, creating it on first
+    use."""
+    with _builders_lock:
+        builder = _builders.get(app)
+        if builder is None:
+            builder = _builders[app] = PermalinkBuilder(app)
+    return builder
+
+
+def get_permalink(app, channel_id, ts, thread_ts=None):
+    """Return the permalink to a message ( see PermalinkBuilder )."""
+    return get_permalink_builder(app).permalink(channel_id, ts, thread_ts)
@@ -0,0 +1,360 @@
+"""
+SMS Outbox Module
+
+Outbound text messages go through a durable outbox instead of calling Twilio
+from the Slack listener. send_sms() stores the message in a small SQLite queue
+( SMS_OUTBOX_DB ) and returns at once; a few worker threads ( SMS_WORKERS )
+send queued messages through config.twilio_client.
+
+- Transient failures ( connection errors, timeouts, Twilio 429s and 5xxs )
+  are retried with exponential backoff, up to SMS_MAX_ATTEMPTS attempts;
+  anything else ( a bad number, an unverified sender, Twilio not being
+  configured, ... ) fails the message at once.
+- Messages survive a restart: whatever was queued, or being sent when the bot
+  stopped, is sent by the next run's workers.
+- Every message keeps its status ( queued, sending, sent, failed ), attempt
+  count, Twilio sid and last error, so get() / recent() can say what happened
+  to it, and bywaterbot_sms_* metrics count the outcomes.
+- Sent and failed messages ( phone numbers and bodies included ) are deleted
+  once they're SMS_RETENTION_DAYS old; the workers sweep for them hourly. Log
+  lines name a message by its id and only show a number's last 4 digits.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from twilio.base.exceptions import TwilioRestException
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SMS_OUTBOX_DB = os.environ.get("SMS_OUTBOX_DB", "sms_outbox.sqlite3")
+SMS_WORKERS = int(os.environ.get("SMS_WORKERS", "2"))
+SMS_MAX_ATTEMPTS = int(os.environ.get("SMS_MAX_ATTEMPTS", "5"))
+SMS_RETENTION_DAYS = int(os.environ.get("SMS_RETENTION_DAYS", "30"))
+SMS_RETRY_SECONDS = 15
+SMS_MAX_RETRY_SECONDS = 15 * 60
+IDLE_POLL_SECONDS = 60
+PRUNE_INTERVAL_SECONDS = 60 * 60
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+SMS_MESSAGES = metrics.counter(
+    "bywaterbot_sms_messages_total",
+    "Outbox SMS outcomes: sent, failed, or retried after a transient error.",
+    ["status"],
+)
+SMS_QUEUED = metrics.gauge(
+    "bywaterbot_sms_queued", "SMS messages waiting in the outbox to be sent."
+)
+
+_FIELDS = (
+    "id",
+    "to_number",
+    "from_number",
+    "body",
+    "tag",
+    "status",
+    "attempts",
+    "next_attempt_at",
+    "sid",
+    "error",
+    "created_at",
+    "updated_at",
+)
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+# Errors reaching Twilio at all, which another try may not hit
+TRANSIENT_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def _is_transient(error):
+    """Whether sending again later might work."""
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def _masked(error, number):
+    """error as text, with number ( e.g. quoted back by Twilio ) cut down to
+    its last 4 digits."""
+    text = str(error)
+    return text.replace(number, "***" + number[-4:]) if number else text
+
+
+def _retry_delay(attempts):
+    return min(SMS_RETRY_SECONDS * 2 ** (attempts - 1), SMS_MAX_RETRY_SECONDS)
+
+
+class SmsOutbox:
+    """SQLite-backed queue of outbound SMS, drained by worker threads.
+
+    One connection is shared by every thread, serialized by a lock. With
+    workers=0 nothing is sent until send_due() is called.
+    """
+
+    def __init__(
+        self, path, workers=SMS_WORKERS, client=None, retention_days=SMS_RETENTION_DAYS
+    ):
+        self._client = client
+        self._retention_seconds = retention_days * 24 * 60 * 60
+        self._next_prune = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    to_number TEXT,
+                    from_number TEXT,
+                    body TEXT,
+                    tag TEXT,
+                    status TEXT,
+                    attempts INTEGER,
+                    next_attempt_at REAL,
+                    sid TEXT,
+                    error TEXT,
+                    created_at REAL,
+                    updated_at REAL
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS messages_due"
+                " ON messages (status, next_attempt_at)"
+            )
+            # A send interrupted by a restart may or may not have gone out;
+            # sending it again beats losing an alert
+            self._db.execute(
+                "UPDATE messages SET status = ? WHERE status = ?", (QUEUED, SENDING)
+            )
+        self._workers = [
+            threading.Thread(target=self._work, name=f"sms-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def enqueue(self, to, body, tag="", from_=None):
+        """Queue a message for sending and return its outbox id."""
+        now = time.time()
+        with self._wakeup, self._db:
+            message_id = self._db.execute(
+                "INSERT INTO messages (to_number, from_number, body, tag, status,"
+                " attempts, next_attempt_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)",
+                (to, from_ or config.twilio_phone, body, tag, QUEUED, now, now, now),
+            ).lastrowid
+            self._wakeup.notify()
+        return message_id
+
+    def get(self, message_id):
+        """Return a message's row as a dict, or None if there isn't one."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(_FIELDS)} FROM messages WHERE id = ?",
+                (message_id,),
+            ).fetchone()
+        return dict(zip(_FIELDS, row)) if row else None
+
+    def recent(self, limit=20):
+        """Return the newest messages, newest first."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(_FIELDS)} FROM messages"
+                " ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(zip(_FIELDS, row)) for row in rows]
+
+    def pending(self):
+        """How many messages are queued or being sent."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM messages WHERE status IN (?, ?)",
+                (QUEUED, SENDING),
+            ).fetchone()[0]
+
+    def send_due(self):
+        """Send every message that is due now, in this thread. Returns how
+        many were attempted."""
+        attempted = 0
+        while (message := self._claim()) is not None:
+            self._send(message)
+            attempted += 1
+        return attempted
+
+    def prune(self, now=None):
+        """Delete sent and failed messages last touched more than the
+        retention period ago. Returns how many were deleted."""
+        if self._retention_seconds <= 0:
+            return 0
+        cutoff = (now if now is not None else time.time()) - self._retention_seconds
+        with self._lock, self._db:
+            deleted = self._db.execute(
+                "DELETE FROM messages WHERE status IN (?, ?) AND updated_at < ?",
+                (SENT, FAILED, cutoff),
+            ).rowcount
+        if deleted:
+            logger.info("Pruned %d old message(s) from the SMS outbox", deleted)
+        return deleted
+
+    def close(self):
+        """Stop the workers once they finish the message in hand."""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def _work(self):
+        while True:
+            try:
+                self._prune_if_due()
+                message = self._claim()
+                if message is not None:
+                    self._send(message)
+                    continue
+            except Exception:
+                logger.exception("Error in SMS outbox worker")
+            with self._wakeup:
+                if self._stopping:
+                    return
+                self._wakeup.wait(self._idle_seconds())
+
+    def _prune_if_due(self):
+        """prune(), at most once per PRUNE_INTERVAL_SECONDS across workers."""
+        now = time.time()
+        with self._lock:
+            if now < self._next_prune:
+                return
+            self._next_prune = now + PRUNE_INTERVAL_SECONDS
+        self.prune(now)
+
+    def _claim(self):
+        """Mark the next due message as sending and return it."""
+        now = time.time()
+        with self._lock, self._db:
+            if self._stopping:
+                return None
+            row = self._db.execute(
+                f"SELECT {', '.join(_FIELDS)} FROM messages"
+                " WHERE status = ? AND next_attempt_at <= ?"
+                " ORDER BY next_attempt_at, id LIMIT 1",
+                (QUEUED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            message = dict(zip(_FIELDS, row))
+            self._db.execute(
+                "UPDATE messages SET status = ?, attempts = attempts + 1,"
+                " updated_at = ? WHERE id = ?",
+                (SENDING, now, message["id"]),
+            )
+        message["attempts"] += 1
+        return message
+
+    def _idle_seconds(self):
+        """How long a worker can sleep before the next retry is due. Called
+        with the lock held."""
+        due = self._db.execute(
+            "SELECT MIN(next_attempt_at) FROM messages WHERE status = ?", (QUEUED,)
+        ).fetchone()[0]
+        if due is None:
+            return IDLE_POLL_SECONDS
+        return min(max(due - time.time(), 0), IDLE_POLL_SECONDS)
+
+    def _send(self, message):
+        client = self._client or config.twilio_client
+        try:
+            if client is None:
+                raise RuntimeError("Twilio is not configured")
+            sent = client.messages.create(
+                body=message["body"],
+                from_=message["from_number"],
+                to=message["to_number"],
+            )
+        except Exception as e:
+            self._failed(message, e)
+            return
+        self._update(message["id"], status=SENT, sid=sent.sid, error=None)
+        SMS_MESSAGES.labels(status=SENT).inc()
+        logger.info("SMS %s (%s) sent: %s", message["id"], message["tag"], sent.sid)
+
+    def _failed(self, message, error):
+        if _is_transient(error) and message["attempts"] < SMS_MAX_ATTEMPTS:
+            delay = _retry_delay(message["attempts"])
+            self._update(
+                message["id"],
+                status=QUEUED,
+                next_attempt_at=time.time() + delay,
+                error=str(error),
+            )
+            SMS_MESSAGES.labels(status="retried").inc()
+            logger.warning(
+                "SMS %s (%s) attempt %d failed, retrying in %ds: %s",
+                message["id"],
+                message["tag"],
+                message["attempts"],
+                delay,
+                _masked(error, message["to_number"]),
+            )
+            with self._wakeup:
+                self._wakeup.notify()
+            return
+        self._update(message["id"], status=FAILED, error=str(error))
+        SMS_MESSAGES.labels(status=FAILED).inc()
+        logger.error(
+            "SMS %s (%s) failed after %d attempt(s): %s",
+            message["id"],
+            message["tag"],
+            message["attempts"],
+            _masked(error, message["to_number"]),
+        )
+
+    def _update(self, message_id, **fields):
+        fields["updated_at"] = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                f"UPDATE messages SET {', '.join(f'{key} = ?' for key in fields)}"
+                " WHERE id = ?",
+                (*fields.values(), message_id),
+            )
+
+
+def get_sms_outbox():
+    """Return the shared SmsOutbox, opening SMS_OUTBOX_DB and starting its
+    workers on first use."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = SmsOutbox(SMS_OUTBOX_DB)
+            SMS_QUEUED.set_function(_outbox.pending)
+        return _outbox
+
+
+def send_sms(to, body, tag=""):
+    """Queue an SMS through config.twilio_client and return its outbox id.
+
+    tag says what the message is for ( "ticket 215390", "TEXT from ...") in
+    the logs and in the outbox.
+    """
+    return get_sms_outbox().enqueue(to, body, tag=tag)
@@ -0,0 +1,186 @@
+"""
+Socket Mode Metrics Module
+
+How busy the bot is, measured where events wait. An event Slack sends over
+Socket Mode passes through two thread pools before its listener runs:
+
+1. the Socket Mode client's workers ( SOCKET_MODE_CONCURRENCY, 10 by default
+   in slack_sdk ), which run Bolt's middleware and routing and send the ack;
+2. Bolt's listener executor ( LISTENER_CONCURRENCY; Bolt defaults to 5 ),
+   which runs the listener functions once the event has been acked.
+
+Both sizes are configurable here, and both pools report to metrics:
+
+- bywaterbot_socket_mode_queued_events / _in_flight_events: events received
+  but not yet picked up by a worker, and events a worker is handling
+- bywaterbot_socket_mode_queue_wait_seconds: receipt to a worker picking it up
+- bywaterbot_socket_mode_ack_seconds: receipt to the ack being sent, the
+  number Slack holds us to ( 3 seconds )
+- bywaterbot_listeners_queued / _in_flight and
+  bywaterbot_listener_queue_wait_seconds: the same for listener functions
+
+When queue waits climb while everything is in flight, the pool is too small
+for the traffic.
+
+Everything is measured through public slack_sdk / slack_bolt interfaces: the
+Socket Mode side by MeteredSocketModeClient, a SocketModeClient subclass that
+MeteredSocketModeHandler builds in place of the stock one, and the ack time
+by the time_acks middleware, which has to be the app's first ( app.use it
+before registering any handlers ) so it sees requests other middleware ends
+early too.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_sdk.socket_mode.builtin import SocketModeClient
+
+import metrics
+
+SOCKET_MODE_CONCURRENCY = int(os.environ.get("SOCKET_MODE_CONCURRENCY", "10"))
+LISTENER_CONCURRENCY = int(os.environ.get("LISTENER_CONCURRENCY", "10"))
+
+EVENTS = metrics.counter(
+    "bywaterbot_socket_mode_events_total",
+    "Socket Mode requests received, by type.",
+    ["type"],
+)
+QUEUED_EVENTS = metrics.gauge(
+    "bywaterbot_socket_mode_queued_events",
+    "Socket Mode messages received but not yet picked up by a worker.",
+)
+IN_FLIGHT_EVENTS = metrics.gauge(
+    "bywaterbot_socket_mode_in_flight_events",
+    "Socket Mode messages a worker is handling.",
+)
+EVENT_WAIT = metrics.histogram(
+    "bywaterbot_socket_mode_queue_wait_seconds",
+    "Time from receiving a Socket Mode message to a worker picking it up.",
+)
+ACK_SECONDS = metrics.histogram(
+    "bywaterbot_socket_mode_ack_seconds",
+    "Time from receiving a Socket Mode request to sending its ack.",
+)
+SOCKET_MODE_WORKERS = metrics.gauge(
+    "bywaterbot_socket_mode_concurrency", "Socket Mode worker threads."
+)
+QUEUED_LISTENERS = metrics.gauge(
+    "bywaterbot_listeners_queued", "Listener functions waiting for a thread."
+)
+IN_FLIGHT_LISTENERS = metrics.gauge(
+    "bywaterbot_listeners_in_flight", "Listener functions running."
+)
+LISTENER_WAIT = metrics.histogram(
+    "bywaterbot_listener_queue_wait_seconds",
+    "Time a listener function waited for a thread.",
+)
+LISTENER_WORKERS = metrics.gauge(
+    "bywaterbot_listener_concurrency", "Listener executor threads."
+)
+
+_current = threading.local()  # when the message a worker is handling arrived
+
+
+class _Received(str):
+    """A raw Socket Mode message, stamped with when it arrived."""
+
+    received_at = None
+
+
+def _is_disconnect(raw_message):
+    """Is this a disconnect notice? The client reconnects on those itself
+    instead of handing them to a worker."""
+    if '"disconnect"' not in raw_message or not raw_message.startswith("{"):
+        return False
+    try:
+        return json.loads(raw_message).get("type") == "disconnect"
+    except ValueError:
+        return False
+
+
+class MeteredListenerExecutor(ThreadPoolExecutor):
+    """Bolt's listener executor ( App(listener_executor=...) ), counting
+    queued and running listener functions and how long they waited."""
+
+    def __init__(self, max_workers=LISTENER_CONCURRENCY):
+        super().__init__(max_workers=max_workers, thread_name_prefix="listener")
+        LISTENER_WORKERS.set(max_workers)
+
+    def submit(self, fn, *args, **kwargs):
+        submitted_at = time.monotonic()
+        QUEUED_LISTENERS.inc()
+
+        def run():
+            QUEUED_LISTENERS.dec()
+            LISTENER_WAIT.observe(time.monotonic() - submitted_at)
+            IN_FLIGHT_LISTENERS.inc()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                IN_FLIGHT_LISTENERS.dec()
+
+        return super().submit(run)
+
+
+class MeteredSocketModeClient(SocketModeClient):
+    """SocketModeClient that stamps each message with when it arrived and
+    counts messages waiting for, and being handled by, a worker."""
+
+    def enqueue_message(self, message):
+        if not _is_disconnect(message):
+            message = _Received(message)
+            message.received_at = time.monotonic()
+            QUEUED_EVENTS.inc()
+        super().enqueue_message(message)
+
+    def run_message_listeners(self, message, raw_message):
+        received_at = getattr(raw_message, "received_at", None)
+        if received_at is not None:
+            QUEUED_EVENTS.dec()
+            EVENT_WAIT.observe(time.monotonic() - received_at)
+        if message.get("envelope_id"):
+            EVENTS.labels(type=message.get("type")).inc()
+        _current.received_at = received_at
+        IN_FLIGHT_EVENTS.inc()
+        try:
+            super().run_message_listeners(message, raw_message)
+        finally:
+            IN_FLIGHT_EVENTS.dec()
+            _current.received_at = None
+
+
+class MeteredSocketModeHandler(SocketModeHandler):
+    """SocketModeHandler with a configurable worker count, over a
+    MeteredSocketModeClient.
+
+    Bolt's handler builds its own SocketModeClient, so this one builds the
+    metered client instead, from the same public arguments.
+    """
+
+    def __init__(
+        self, app, app_token=None, concurrency=SOCKET_MODE_CONCURRENCY, **kwargs
+    ):
+        self.app = app
+        self.app_token = app_token or os.environ["SLACK_APP_TOKEN"]
+        kwargs.setdefault("logger", app.logger)
+        kwargs.setdefault("web_client", app.client)
+        kwargs.setdefault("proxy", app.client.proxy)
+        self.client = MeteredSocketModeClient(
+            app_token=self.app_token, concurrency=concurrency, **kwargs
+        )
+        self.client.socket_mode_request_listeners.append(self.handle)
+        SOCKET_MODE_WORKERS.set(concurrency)
+
+
+def time_acks(next):
+    """Bolt middleware timing each Socket Mode request from receipt to its
+    ack: Bolt hands back the response to ack with once the chain returns."""
+    response = next()
+    received_at = getattr(_current, "received_at", None)
+    if received_at is not None:
+        ACK_SECONDS.observe(time.monotonic() - received_at)
+    return response
@@ -9,18 +9,32 @@ Contains message handlers for:
 - SMS relay (TEXT <user> <message>)
 """
 
-import pprint
-import requests
-import json
+import logging
 import re
 
 import config
+import sms_outbox
 from calendar_functions import get_weekend_duty, get_user
-from bot_functions import get_channel_id_by_name
-from zoho_functions import zoho_configured, get_zoho_ticket
-from message_matchers import is_not_bot_message
-
-pp = pprint.PrettyPrinter(indent=2)
+from bot_functions import find_branches, find_branches_async, get_channel_id_by_name
+from bugzilla_functions import bug_url, get_koha_bugs, get_koha_bugs_async
+from zoho_functions import (
+    zoho_configured,
+    get_zoho_ticket,
+    get_zoho_tickets,
+    get_zoho_ticket_async,
+    get_zoho_tickets_async,
+)
+from message_context import MessageContext
+from message_matchers import in_channel, is_not_bot_message
+
+logger = logging.getLogger(__name__)
+
+KOHA_BUG_PATTERN = re.compile(r"(bug|bz)\s*([0-9]+)")
+# Bugs past this many in one message are linked but not looked up
+MAX_BUGS_PER_MESSAGE = 10
+ZOHO_TICKET_PATTERN = re.compile(r"(ticket|zd)\s*#?\s*([0-9]+)", re.IGNORECASE)
+# A message naming more tickets than this gets the first ones and a note
+MAX_TICKETS_PER_MESSAGE = 10
 
 
 def resolve_weekend_duty_user():
@@ -44,17 +58,430 @@ def _mask_sms(sms):
     return "***-***-" + sms[-4:] if sms else ""
 
 
+def _full_name(person):
+    """Join a Zoho contact/agent's first and last name, or return None."""
+    person = person or {}
+    return " ".join(filter(None, [person.get("firstName"), person.get("lastName")]))
+
+
+def _ticket_fields(ticket):
+    """Pull the displayed fields out of a Zoho Desk ticket, with fallbacks."""
+    contact = ticket.get("contact") or {}
+    return {
+        "subject": ticket.get("subject") or "(no subject)",
+        "status": ticket.get("status") or "Unknown",
+        "priority": ticket.get("priority") or "—",
+        "assignee": _full_name(ticket.get("assignee")) or "Unassigned",
+        "requestor": _full_name(contact) or "—",
+        "account": (contact.get("account") or {}).get("accountName") or "—",
+        "web_url": ticket.get("webUrl") or "https://help.bywatersolutions.com",
+    }
+
+
+def zoho_ticket_numbers(message_context):
+    """Return every ZD number mentioned in the message, in order, without repeats."""
+    found = message_context.findall(ZOHO_TICKET_PATTERN)
+    return list(dict.fromkeys(m[1] for m in found))
+
+
+def zoho_tickets_reply(tickets, more=0):
+    """Render several looked-up tickets as one compact message.
+
+    Args:
+        tickets: dict of ticket number -> ticket dict, or None if not found.
+        more: how many further tickets were mentioned but not looked up.
+
+    Returns:
+        ( blocks, text ) for say().
+    """
+    blocks = [
+        {
+            "type": "header",
+            "text": {"type": "plain_text", "text": f"{len(tickets)} tickets"},
+        }
+    ]
+    lines = []
+    for ticket_number, ticket in tickets.items():
+        if not ticket:
+            line = f"Ticket ZD #{ticket_number} not found."
+            blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": line}})
+            lines.append(line)
+            continue
+
+        f = _ticket_fields(ticket)
+        blocks.append(
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": (
+                        f"*<{f['web_url']}|ZD #{ticket_number}>*: {f['subject']}\n"
+                        f"*{f['status']}* · {f['assignee']} · {f['account']}"
+                    ),
+                },
+            }
+        )
+        lines.append(
+            f"<{f['web_url']}|Ticket ZD #{ticket_number}>: _{f['subject']}_ [*{f['status']}*]"
+        )
+
+    if more:
+        note = f"…and {more} more not shown."
+        blocks.append(
+            {"type": "context", "elements": [{"type": "mrkdwn", "text": note}]}
+        )
+        lines.append(note)
+    return blocks, "\n".join(lines)
+
+
+def koha_bug_numbers(message_context):
+    """Return every Koha bug number in the message, in order, without repeats."""
+    found = message_context.findall(KOHA_BUG_PATTERN)
+    return list(dict.fromkeys(m[1] for m in found))
+
+
+def koha_bugs_reply(bugs, unexpanded=()):
+    """Render several looked-up bugs as one compact message.
+
+    Args:
+        bugs: dict of bug id -> {"summary", "status"}, or None if not found.
+        unexpanded: further bug ids that were mentioned but not looked up;
+            they're linked at the bottom.
+
+    Returns:
+        ( blocks, text ) for say().
+    """
+    lines = []
+    for bug_id, bug in bugs.items():
+        if bug:
+            lines.append(
+                f"<{bug_url(bug_id)}|Bug {bug_id}>: _{bug['summary']}_ [*{bug['status']}*]"
+            )
+        else:
+            lines.append(f"<{bug_url(bug_id)}|Bug {bug_id}>: couldn't find details")
+
+    blocks = [
+        {"type": "section", "text": {"type": "mrkdwn", "text": line}} for line in lines
+    ]
+    if unexpanded:
+        also = ", ".join(f"<{bug_url(b)}|{b}>" for b in unexpanded)
+        lines.append(f"Also mentioned: {also}")
+        blocks.append(
+            {"type": "context", "elements": [{"type": "mrkdwn", "text": lines[-1]}]}
+        )
+    return blocks, "\n".join(lines)
+
+
+def koha_bug_reply(bug_ids, bugs):
+    """say() arguments answering a lookup of bug_ids.
+
+    Args:
+        bug_ids: every bug mentioned, in order.
+        bugs: dict of bug id -> {"summary", "status"} or None, for the first
+            MAX_BUGS_PER_MESSAGE of them.
+
+    Returns:
+        A dict of keyword arguments for say(): one bug gets the full card,
+        several get a single compact list.
+    """
+    if len(bug_ids) > 1:
+        blocks, text = koha_bugs_reply(bugs, bug_ids[MAX_BUGS_PER_MESSAGE:])
+        return {"blocks": blocks, "text": text}
+
+    bug = bug_ids[0]
+    if not bugs.get(bug):
+        return {
+            "text": f"I couldn't find details for bug {bug}. It might not exist or the API is down."
+        }
+
+    summary = bugs[bug]["summary"]
+    status = bugs[bug]["status"]
+    bugzilla = bug_url(bug)
+
+    logger.debug("BUG: %s", bug)
+    logger.debug("SUMMARY: %s", summary)
+    logger.debug("STATUS: %s", status)
+
+    blocks = [
+        {
+            "type": "header",
+            "text": {"type": "plain_text", "text": f"Bug {bug}: {summary}"[:150]},
+        },
+        {
+            "type": "section",
+            "fields": [{"type": "mrkdwn", "text": f"*Status*\n{status}"}],
+        },
+        {
+            "type": "actions",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": f"View bug {bug}"},
+                    "style": "primary",
+                    "value": f"View bug {bug}",
+                    "url": f"{bugzilla}",
+                }
+            ],
+        },
+    ]
+    return {
+        "blocks": blocks,
+        "text": f"Koha community <{bugzilla}|bug {bug}>: _{summary}_ [*{status}*]",
+    }
+
+
+def zoho_ticket_reply(ticket_number, ticket):
+    """say() arguments answering a single ticket lookup: the full card, or a
+    note that the ticket wasn't found."""
+    if not ticket:
+        return {"text": f"Ticket ZD #{ticket_number} not found."}
+
+    f = _ticket_fields(ticket)
+    subject, status, web_url = f["subject"], f["status"], f["web_url"]
+
+    blocks = [
+        {
+            "type": "header",
+            "text": {
+                "type": "plain_text",
+                "text": f"Ticket ZD #{ticket_number}: {subject}"[:150],
+            },
+        },
+        {
+            "type": "section",
+            "fields": [
+                {"type": "mrkdwn", "text": f"*Status*\n{status}"},
+                {"type": "mrkdwn", "text": f"*Priority*\n{f['priority']}"},
+                {"type": "mrkdwn", "text": f"*Assignee*\n{f['assignee']}"},
+                {"type": "mrkdwn", "text": f"*Partner*\n{f['account']}"},
+                {"type": "mrkdwn", "text": f"*Requestor*\n{f['requestor']}"},
+            ],
+        },
+        {
+            "type": "actions",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": {
+                        "type": "plain_text",
+                        "text": f"View ticket {ticket_number}",
+                    },
+                    "style": "primary",
+                    "value": f"View ticket {ticket_number}",
+                    "url": web_url,
+                }
+            ],
+        },
+    ]
+    return {
+        "blocks": blocks,
+        "text": f"<{web_url}|Ticket ZD #{ticket_number}>: _{subject}_ [*{status}*]",
+    }
+
+
+def branches_reply(bug, shortname, branches):
+    """The answer to a branches lookup, as message text."""
+    if not branches:
+        return f"I could not find bug {bug} in any branches for {shortname}!"
+    text = f"I found bug {bug} in the following branches:\n"
+    for branch in branches:
+        text += f"* {branch}\n"
+    return text
+
+
+def _mentioned_bugs(context, message):
+    return koha_bug_numbers(MessageContext.of(context, message)) or [
+        context["matches"][1]
+    ]
+
+
+def _mentioned_tickets(context, message):
+    return zoho_ticket_numbers(MessageContext.of(context, message)) or [
+        context["matches"][1]
+    ]
+
+
+def _branch_query(context):
+    """( bug, shortname ) from a branches command's matches."""
+    return context["matches"][1], context["matches"][2] or "bywater"
+
+
+def announce_branch_search(say, context):
+    """Say which branches are being searched, before the lookup runs."""
+    bug, shortname = _branch_query(context)
+    say(
+        text=f"Looking for bug {bug} ( https://bugs.koha-community.org/bugzilla3/show_bug.cgi?id={bug} ) on {shortname} branches..."
+    )
+
+
+def _bugs_not_fetched(shown, e):
+    """The bugs dict to reply with when the Bugzilla request failed."""
+    logger.error("Error fetching bugs %s: %s", shown, e)
+    return dict.fromkeys(shown)
+
+
+def handle_koha_bug(say, context, message=None):
+    """Look up the Koha bugs in a message and post their details.
+
+    All of them are fetched with one Bugzilla request; one bug gets the
+    full card, several get a single compact list.
+    """
+    bug_ids = _mentioned_bugs(context, message)
+    shown = bug_ids[:MAX_BUGS_PER_MESSAGE]
+    try:
+        bugs = get_koha_bugs(shown)
+    except Exception as e:
+        bugs = _bugs_not_fetched(shown, e)
+    say(**koha_bug_reply(bug_ids, bugs))
+
+
+def handle_zoho_ticket(say, context, message):
+    """Look up the ZD numbers in a message and post their details.
+
+    One ticket gets the full card; several are looked up side by side and
+    answered in a single combined message.
+    """
+    ticket_numbers = _mentioned_tickets(context, message)
+
+    if not zoho_configured():
+        say("Zoho Desk credentials are not configured!")
+        return
+
+    if len(ticket_numbers) > 1:
+        shown = ticket_numbers[:MAX_TICKETS_PER_MESSAGE]
+        try:
+            tickets = get_zoho_tickets(shown)
+        except Exception as e:
+            logger.error("Error fetching Zoho tickets %s: %s", shown, e)
+            say("Error fetching those tickets.")
+            return
+        blocks, text = zoho_tickets_reply(
+            tickets, more=len(ticket_numbers) - len(shown)
+        )
+        say(blocks=blocks, text=text)
+        return
+
+    ticket_number = ticket_numbers[0]
+    try:
+        ticket = get_zoho_ticket(ticket_number)
+    except Exception as e:
+        logger.error("Error fetching Zoho ticket %s: %s", ticket_number, e)
+        say(f"Error fetching ticket ZD #{ticket_number}.")
+        return
+    say(**zoho_ticket_reply(ticket_number, ticket))
+
+
+def handle_branches(say, context):
+    """Find Koha branches containing a bug."""
+    bug, shortname = _branch_query(context)
+    logger.debug("BUG: %s, SHORTNAME: %s", bug, shortname)
+
+    try:
+        branches = find_branches(bug, shortname)
+    except Exception as e:
+        logger.error("Error finding branches for bug %s: %s", bug, e)
+        say(f"Error finding branches for bug {bug}.")
+        return
+    logger.debug("Branches for bug %s: %s", bug, branches)
+    say(text=branches_reply(bug, shortname, branches))
+
+
+def _register_lookups(app, handle_koha_bug, handle_zoho_ticket, handle_branches):
+    """Register the bug, ticket and branches lookups as lazy listeners: their
+    Bugzilla, Zoho Desk and branches-tool requests run off the listener."""
+
+    # Koha bugzilla links, recognizes "bug 1234" and "bz 1234"
+    app.message(KOHA_BUG_PATTERN, matchers=[is_not_bot_message])(lazy=[handle_koha_bug])
+
+    # Zoho Desk links, recognizes "ticket 1234", "zd 1234" and "zd #1234".
+    # is_not_bot_message keeps this off the Zoho Flow "New Ticket" announcement
+    # ( which contains "ZD #NNNN" ) so it neither does a second lookup nor shadows
+    # the new-ticket notifier.
+    app.message(ZOHO_TICKET_PATTERN, matchers=[is_not_bot_message])(
+        lazy=[handle_zoho_ticket]
+    )
+
+    # ByWater "Koha branches that contain this bug" tool
+    app.message(
+        re.compile(r"(branches)\s*(\d+)\s*(\S*)"), matchers=[is_not_bot_message]
+    )(ack=announce_branch_search, lazy=[handle_branches])
+
+
+def _register_async_lookups(app):
+    """_register_lookups for the asyncio edition ( an AsyncMessageRouter ):
+    the same handlers as coroutines, awaiting async_http_client requests
+    instead of holding a thread each. They keep the sync handlers' names, so
+    routes and metrics read the same in both editions."""
+
+    async def handle_koha_bug(say, context, message=None):
+        """handle_koha_bug for the asyncio edition."""
+        bug_ids = _mentioned_bugs(context, message)
+        shown = bug_ids[:MAX_BUGS_PER_MESSAGE]
+        try:
+            bugs = await get_koha_bugs_async(shown)
+        except Exception as e:
+            bugs = _bugs_not_fetched(shown, e)
+        await say(**koha_bug_reply(bug_ids, bugs))
+
+    async def handle_zoho_ticket(say, context, message):
+        """handle_zoho_ticket for the asyncio edition."""
+        ticket_numbers = _mentioned_tickets(context, message)
+
+        if not zoho_configured():
+            await say("Zoho Desk credentials are not configured!")
+            return
+
+        if len(ticket_numbers) > 1:
+            shown = ticket_numbers[:MAX_TICKETS_PER_MESSAGE]
+            try:
+                tickets = await get_zoho_tickets_async(shown)
+            except Exception as e:
+                logger.error("Error fetching Zoho tickets %s: %s", shown, e)
+                await say("Error fetching those tickets.")
+                return
+            blocks, text = zoho_tickets_reply(
+                tickets, more=len(ticket_numbers) - len(shown)
+            )
+            await say(blocks=blocks, text=text)
+            return
+
+        ticket_number = ticket_numbers[0]
+        try:
+            ticket = await get_zoho_ticket_async(ticket_number)
+        except Exception as e:
+            logger.error("Error fetching Zoho ticket %s: %s", ticket_number, e)
+            await say(f"Error fetching ticket ZD #{ticket_number}.")
+            return
+        await say(**zoho_ticket_reply(ticket_number, ticket))
+
+    async def handle_branches(say, context):
+        """handle_branches for the asyncio edition."""
+        bug, shortname = _branch_query(context)
+        logger.debug("BUG: %s, SHORTNAME: %s", bug, shortname)
+
+        try:
+            branches = await find_branches_async(bug, shortname)
+        except Exception as e:
+            logger.error("Error finding branches for bug %s: %s", bug, e)
+            await say(f"Error finding branches for bug {bug}.")
+            return
+        logger.debug("Branches for bug %s: %s", bug, branches)
+        await say(text=branches_reply(bug, shortname, branches))
+
+    _register_lookups(app, handle_koha_bug, handle_zoho_ticket, handle_branches)
+
+
 def register_ticket_notifier(app):
     """Register the #tickets new-ticket SMS notifier.
 
-    This has to be registered before every other message handler. Bolt runs
-    only the first @app.message listener that matches an incoming message, and
-    the Zoho Flow "New Ticket" post also matches broader handlers: the help
-    command's 'help' trigger matches the word 'help' inside the
-    help.bywatersolutions.com case link, and the ticket-lookup handler matches
-    the "ZD #NNNN" in the post. If any of those win first, this notifier never
-    runs and nobody on weekend duty gets texted. Registering it first lets the
-    specific "New Ticket" pattern win.
+    This has to be routed before every other message handler. Only the first
+    message listener that matches an incoming message runs, and the Zoho Flow
+    "New Ticket" post also matches broader handlers: the help command's 'help'
+    trigger matches the word 'help' inside the help.bywatersolutions.com case
+    link, and the ticket-lookup handler matches the "ZD #NNNN" in the post. If
+    any of those win first, this notifier never runs and nobody on weekend duty
+    gets texted. register_handlers gives it the highest routing priority so the
+    specific "New Ticket" pattern wins.
     """
 
     # ByWater Weekend Updater, sends sms to person on weekend duty.
@@ -81,15 +508,19 @@ def register_ticket_notifier(app):
         url_match = re.search(r"<(https?://help\.bywatersolutions\.com/[^>]+)>", text)
         ticket_url = url_match.group(1) if url_match else ""
 
-        print(
-            f"TICKET: {ticket}, PRODUCT: {product}, PARTNER: {partner}, SUBJECT: {subject}"
+        logger.info(
+            "TICKET: %s, PRODUCT: %s, PARTNER: %s, SUBJECT: %s",
+            ticket,
+            product,
+            partner,
+            subject,
         )
 
         event = get_weekend_duty()
         if event:
-            print(event)
+            logger.debug("Weekend duty event: %s", event)
             user = get_user(event)
-            print("FOUND USER: ", user)
+            logger.debug("FOUND USER: %s", user)
 
             if user in config.bywaterbot_data["users"]:
                 transports = config.bywaterbot_data["users"][user]
@@ -108,19 +539,16 @@ def register_ticket_notifier(app):
                         body += f" {ticket_url}"
                     try:
                         if config.twilio_client:
-                            message = config.twilio_client.messages.create(
-                                body=body, from_=config.twilio_phone, to=sms
-                            )
-                            print(message.sid)
+                            sms_outbox.send_sms(sms, body, tag=f"ticket {ticket}")
                     except Exception as e:
-                        print(f"Error sending SMS: {e}")
+                        logger.error("Error queueing SMS: %s", e)
                         say(f"Failed to send SMS to {user}.")
                 else:
                     say(text=f"{user} does not have an SMS number configured!")
             else:
                 say(text=f"{user} not found in my records for alerts.")
         else:
-            print("No weekend duty event found.")
+            logger.info("No weekend duty event found.")
 
 
 def register_support_handlers(app):
@@ -129,190 +557,19 @@ def register_support_handlers(app):
     # restrict itself to that channel (fail closed if we can't find it)
     try:
         tickets_channel_id = get_channel_id_by_name(app=app, channel_name="tickets")
-        print(f"TICKETS CHANNEL ID: {tickets_channel_id}")
+        logger.info("TICKETS CHANNEL ID: %s", tickets_channel_id)
     except Exception as e:
-        print(f"Error getting tickets channel ID: {e}")
+        logger.error("Error getting tickets channel ID: %s", e)
         tickets_channel_id = None
 
-    def in_tickets_channel(message):
-        """Listener matcher: only match messages posted in #tickets."""
-        return tickets_channel_id is not None and (
-            message.get("channel") == tickets_channel_id
-        )
-
-    # Koha bugzilla links, recognizes "bug 1234" and "bz 1234"
-    @app.message(re.compile(r"(bug|bz)\s*([0-9]+)"), matchers=[is_not_bot_message])
-    def handle_koha_bug(say, context):
-        """Lookup a Koha bug and post its details."""
-        bug = context["matches"][1]
-        try:
-            url = requests.get(
-                f"https://bugs.koha-community.org/bugzilla3/rest/bug/{bug}"
-            )
-            text = url.text
-            data = json.loads(text)
-
-            summary = data["bugs"][0]["summary"]
-            status = data["bugs"][0]["status"]
-            bugzilla = (
-                f"https://bugs.koha-community.org/bugzilla3/show_bug.cgi?id={bug}"
-            )
-
-            print(f"BUG: {bug}")
-            print(f"SUMMARY: {summary}")
-            print(f"STATUS: {status}")
-
-            blocks = [
-                {
-                    "type": "header",
-                    "text": {"type": "plain_text", "text": f"Bug {bug}: {summary}"},
-                },
-                {
-                    "type": "section",
-                    "fields": [{"type": "mrkdwn", "text": f"*Status*\n{status}"}],
-                },
-                {
-                    "type": "actions",
-                    "elements": [
-                        {
-                            "type": "button",
-                            "text": {"type": "plain_text", "text": f"View bug {bug}"},
-                            "style": "primary",
-                            "value": f"View bug {bug}",
-                            "url": f"{bugzilla}",
-                        }
-                    ],
-                },
-            ]
-            say(
-                blocks=blocks,
-                text=f"Koha community <{bugzilla}|bug {bug}>: _{summary}_ [*{status}*]",
-            )
-        except Exception as e:
-            print(f"Error fetching bug {bug}: {e}")
-            say(
-                f"I couldn't find details for bug {bug}. It might not exist or the API is down."
-            )
-
-    # Zoho Desk links, recognizes "ticket 1234", "zd 1234" and "zd #1234".
-    # is_not_bot_message keeps this off the Zoho Flow "New Ticket" announcement
-    # ( which contains "ZD #NNNN" ) so it neither does a second lookup nor shadows
-    # the new-ticket notifier.
-    @app.message(
-        re.compile(r"(ticket|zd)\s*#?\s*([0-9]+)", re.IGNORECASE),
-        matchers=[is_not_bot_message],
-    )
-    def handle_zoho_ticket(say, context, message):
-        """Look up a Zoho Desk ticket by its ZD number and post its details."""
-        ticket_number = context["matches"][1]
-
-        if not zoho_configured():
-            say("Zoho Desk credentials are not configured!")
-            return
-
-        try:
-            ticket = get_zoho_ticket(ticket_number)
-            if not ticket:
-                say(f"Ticket ZD #{ticket_number} not found.")
-                return
-
-            subject = ticket.get("subject") or "(no subject)"
-            status = ticket.get("status") or "Unknown"
-            priority = ticket.get("priority") or "—"
-
-            assignee = ticket.get("assignee") or {}
-            assignee_name = (
-                " ".join(
-                    filter(None, [assignee.get("firstName"), assignee.get("lastName")])
-                )
-                or "Unassigned"
-            )
-
-            contact = ticket.get("contact") or {}
-            contact_name = (
-                " ".join(
-                    filter(None, [contact.get("firstName"), contact.get("lastName")])
-                )
-                or "—"
-            )
-            account = (contact.get("account") or {}).get("accountName") or "—"
-
-            web_url = ticket.get("webUrl") or "https://help.bywatersolutions.com"
-
-            blocks = [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": f"Ticket ZD #{ticket_number}: {subject}"[:150],
-                    },
-                },
-                {
-                    "type": "section",
-                    "fields": [
-                        {"type": "mrkdwn", "text": f"*Status*\n{status}"},
-                        {"type": "mrkdwn", "text": f"*Priority*\n{priority}"},
-                        {"type": "mrkdwn", "text": f"*Assignee*\n{assignee_name}"},
-                        {"type": "mrkdwn", "text": f"*Partner*\n{account}"},
-                        {"type": "mrkdwn", "text": f"*Requestor*\n{contact_name}"},
-                    ],
-                },
-                {
-                    "type": "actions",
-                    "elements": [
-                        {
-                            "type": "button",
-                            "text": {
-                                "type": "plain_text",
-                                "text": f"View ticket {ticket_number}",
-                            },
-                            "style": "primary",
-                            "value": f"View ticket {ticket_number}",
-                            "url": web_url,
-                        }
-                    ],
-                },
-            ]
-            say(
-                blocks=blocks,
-                text=f"<{web_url}|Ticket ZD #{ticket_number}>: _{subject}_ [*{status}*]",
-            )
-        except Exception as e:
-            print(f"Error fetching Zoho ticket {ticket_number}: {e}")
-            say(f"Error fetching ticket ZD #{ticket_number}.")
-
-    # ByWater "Koha branches that contain this bug" tool
-    @app.message(
-        re.compile(r"(branches)\s*(\d+)\s*(\S*)"), matchers=[is_not_bot_message]
-    )
-    def handle_branches(say, context):
-        """Find Koha branches containing a bug."""
-        bug = context["matches"][1]
-        shortname = context["matches"][2] or "bywater"
-        print(f"BUG: {bug}, SHORTNAME: {shortname}")
-
-        say(
-            text=f"Looking for bug {bug} ( https://bugs.koha-community.org/bugzilla3/show_bug.cgi?id={bug} ) on {shortname} branches..."
-        )
+    # Listener matcher: only match messages posted in #tickets
+    in_tickets_channel = in_channel(tickets_channel_id)
 
-        try:
-            url = f"https://find-branches-by-bugs.tools.bywatersolutions.com/{bug}/{shortname}"
-            print(f"URL: {url}")
-            res = requests.get(url)
-            text = res.text
-            data = json.loads(text)
-            pp.pprint(data)
-
-            if len(data):
-                text = f"I found bug {bug} in the following branches:\n"
-                for d in data:
-                    text += f"* {d}\n"
-                say(text=text)
-            else:
-                say(text=f"I could not find bug {bug} in any branches for {shortname}!")
-        except Exception as e:
-            print(f"Error finding branches for bug {bug}: {e}")
-            say(f"Error finding branches for bug {bug}.")
+    # Bug, ticket and branches lookups; the asyncio edition gets async twins
+    if getattr(app, "is_async", False) is True:
+        _register_async_lookups(app)
+    else:
+        _register_lookups(app, handle_koha_bug, handle_zoho_ticket, handle_branches)
 
     # Weekend duty self-test, #tickets only:
     #   "test weekend duty"      -> dry run, report who'd be alerted, no SMS
@@ -359,22 +616,18 @@ def register_support_handlers(app):
         sent = False
         if config.twilio_client:
             try:
-                msg = config.twilio_client.messages.create(
-                    body=body, from_=config.twilio_phone, to=sms
-                )
-                print(msg.sid)
+                sms_outbox.send_sms(sms, body, tag="weekend duty test")
                 sent = True
             except Exception as e:
-                print(f"Error sending test SMS: {e}")
+                logger.error("Error queueing test SMS: %s", e)
         if sent:
-            say(text=f"🧪 Weekend duty test: sent a test SMS to *{user}* ({masked}).")
+            say(text=f"🧪 Weekend duty test: queued a test SMS to *{user}* ({masked}).")
         else:
             say(
                 text=f"🧪 Weekend duty test: *{user}* is on duty ({masked}) but the SMS didn't send (Twilio not configured or errored)."
             )
 
     # Text someone from slack
-    @app.message(re.compile("TEXT (.*)"), matchers=[is_not_bot_message])
     def handle_text_command(say, context):
         """Relay a Slack message to a user via SMS."""
         message_text = context["matches"][0]
@@ -385,7 +638,7 @@ def register_support_handlers(app):
             response = app.client.users_info(user=sender)
             origin_user = response.data["user"]["real_name"]
         except Exception as e:
-            print(f"Error details: {e}")
+            logger.error("Error details: %s", e)
             origin_user = "Unknown User"
 
         destination_user_found = False
@@ -399,14 +652,11 @@ def register_support_handlers(app):
                     body = f"You have a message from {origin_user} via Slack: {message_body}"
                     try:
                         if config.twilio_client:
-                            message = config.twilio_client.messages.create(
-                                body=body, from_=config.twilio_phone, to=sms
-                            )
-                            print(message.sid)
+                            sms_outbox.send_sms(sms, body, tag=f"TEXT from {sender}")
                             destination_user_found = True
-                            say("Message sent!")
+                            say("Message queued for sending!")
                     except Exception as e:
-                        print(f"Twilio error: {e}")
+                        logger.error("Error queueing SMS: %s", e)
                         say("Failed to send SMS via Twilio.")
                 else:
                     say(f"{user} has no SMS number configured.")
@@ -415,3 +665,8 @@ def register_support_handlers(app):
 
         if not destination_user_found:
             say("I was unable to find someone matching that user.")
+
+    # users.info and Twilio run lazily, on the router's worker pool
+    app.message(re.compile("TEXT (.*)"), matchers=[is_not_bot_message])(
+        lazy=[handle_text_command]
+    )
@@ -0,0 +1,183 @@
+"""
+Worker Pool Module
+
+A bounded thread pool for the work a listener hands off after acking: the
+slow half of a lazy listener ( see MessageRouter.message ), such as a Bugzilla,
+Zoho Desk or branches lookup, or a Twilio send. Socket Mode's own worker
+threads go straight back to acking other events instead of waiting on HTTP.
+
+At most max_workers jobs run at once and at most max_queued more wait. When
+both are full the job runs on the submitting thread instead: slower for that
+event, but nothing is dropped and the backlog can't grow without bound.
+
+AsyncWorkerPool is the asyncio edition's equivalent: jobs are coroutines run
+as tasks, at most max_running at a time.
+
+stats() reports the queue depth and how long jobs waited for a worker.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+LAZY_WORKERS = int(os.environ.get("LAZY_WORKERS", "8"))
+LAZY_QUEUE_SIZE = int(os.environ.get("LAZY_QUEUE_SIZE", "100"))
+ASYNC_LAZY_CONCURRENCY = int(os.environ.get("ASYNC_LAZY_CONCURRENCY", "200"))
+
+
+class _PoolStats:
+    """Queue depth, throughput and wait-time bookkeeping shared by the pools."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.queued = 0  # submitted, waiting for a worker
+        self.running = 0
+        self.max_depth = 0
+        self.completed = 0
+        self.errors = 0
+        self.ran_inline = 0  # jobs run by the submitter because the pool was full
+        self.started = 0  # jobs a worker picked up
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _queue(self):
+        """Count a newly submitted job. Caller holds _lock."""
+        self.queued += 1
+        self.max_depth = max(self.max_depth, self.queued)
+
+    def _start(self, submitted_at):
+        """Count a job starting; submitted_at is None for one run inline."""
+        with self._lock:
+            if submitted_at is not None:
+                waited = time.monotonic() - submitted_at
+                self.queued -= 1
+                self.started += 1
+                self.total_wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            self.running += 1
+
+    def _finish(self, func, error):
+        if error is not None:
+            logger.error(
+                "Error in %s job %s: %s",
+                self.name,
+                getattr(func, "__name__", func),
+                error,
+            )
+        with self._lock:
+            self.running -= 1
+            self.completed += 1
+            self.errors += int(error is not None)
+
+    def stats(self):
+        """Return the pool's queue depth, throughput and wait times so far."""
+        with self._lock:
+            started = self.started
+            return {
+                "queued": self.queued,
+                "running": self.running,
+                "max_depth": self.max_depth,
+                "completed": self.completed,
+                "errors": self.errors,
+                "ran_inline": self.ran_inline,
+                "avg_wait_seconds": (
+                    self.total_wait_seconds / started if started else 0.0
+                ),
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+
+
+class WorkerPool(_PoolStats):
+    """Run jobs on a bounded pool of threads, tracking queue depth and waits."""
+
+    def __init__(self, name, max_workers=LAZY_WORKERS, max_queued=LAZY_QUEUE_SIZE):
+        super().__init__(name)
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the pool, or inline if the pool is full.
+
+        Returns True if the job was queued, False if it ran inline.
+        """
+        with self._lock:
+            full = self.queued + self.running >= self.max_workers + self.max_queued
+            if full:
+                self.ran_inline += 1
+            else:
+                self._queue()
+        if full:
+            self._run(func, args, kwargs, None)
+            return False
+        self._executor.submit(self._run, func, args, kwargs, time.monotonic())
+        return True
+
+    def _run(self, func, args, kwargs, submitted_at):
+        self._start(submitted_at)
+        error = None
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            error = e
+        finally:
+            self._finish(func, error)
+            with self._lock:
+                if not self.queued and not self.running:
+                    self._idle.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Block until nothing is queued or running. Returns False on timeout."""
+        with self._lock:
+            return self._idle.wait_for(
+                lambda: not self.queued and not self.running, timeout
+            )
+
+
+class AsyncWorkerPool(_PoolStats):
+    """Run coroutine jobs as tasks, at most max_running at once; the rest wait
+    their turn. Tracks the same queue depth and waits as WorkerPool."""
+
+    def __init__(self, name, max_running=ASYNC_LAZY_CONCURRENCY):
+        super().__init__(name)
+        self.max_running = max_running
+        self._semaphore = asyncio.Semaphore(max_running)
+        self._tasks = set()  # kept until they finish, so they aren't collected
+
+    def submit(self, coroutine_function, *args, **kwargs):
+        """Schedule coroutine_function(*args, **kwargs) on the running loop."""
+        with self._lock:
+            self._queue()
+        task = asyncio.get_running_loop().create_task(
+            self._run(coroutine_function, args, kwargs, time.monotonic())
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, func, args, kwargs, submitted_at):
+        async with self._semaphore:
+            self._start(submitted_at)
+            error = None
+            try:
+                await func(*args, **kwargs)
+            except Exception as e:
+                error = e
+            finally:
+                self._finish(func, error)
+
+    async def wait_idle(self, timeout=None):
+        """Wait until every submitted job has finished. Returns False on timeout."""
+        if not self._tasks:
+            return True
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        return not pending
@@ -4,16 +4,44 @@ Zoho Desk Functions Module
 Looks up support tickets in Zoho Desk ( help.bywatersolutions.com ) via the REST
 API. Authenticates with an OAuth2 refresh token ( server-to-server ), caching the
 short-lived access token between calls so we don't mint a new one every lookup.
+
+Ticket lookups go through a small LRU cache: a fresh hit is answered from
+memory, a stale one is answered from memory while a background refresh runs,
+and "no such ticket" answers are remembered briefly so typos don't each cost a
+search request.
+
+The *_async functions are the asyncio edition's twins, sharing the token and
+the ticket cache but making their requests through async_http_client.
 """
 
+import asyncio
+import logging
 import os
+import threading
 import time
-import requests
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import async_http_client
+import http_client
+
+logger = logging.getLogger(__name__)
 
 # Cache the access token so we don't request a new one on every lookup
 _access_token = None
 _access_token_expiry = 0
 
+TICKET_CACHE_SIZE = 256
+TICKET_CACHE_TTL_SECONDS = int(os.environ.get("ZOHO_TICKET_CACHE_SECONDS", "300"))
+# Past the TTL an entry is still served ( and refreshed behind the scenes ) for
+# this long; after that the lookup waits on Zoho again
+TICKET_CACHE_STALE_SECONDS = 60 * 60
+TICKET_NOT_FOUND_TTL_SECONDS = 60
+# At most this many ticket searches run at once for a multi-ticket message
+TICKET_LOOKUP_CONCURRENCY = 4
+
+_access_token_lock = threading.Lock()
+
 
 def _zoho_config():
     """Return the Zoho OAuth/Desk settings from the environment.
@@ -50,19 +78,41 @@ def get_zoho_access_token():
     Uses the OAuth2 refresh-token grant. Returns None if Zoho isn't configured
     or the token request fails.
     """
+    # Reuse the cached token until ~1 minute before it expires
+    if _access_token and time.time() < _access_token_expiry - 60:
+        return _access_token
+
+    # Concurrent ticket lookups share one token request
+    with _access_token_lock:
+        return _refresh_zoho_access_token()
+
+
+async def get_zoho_access_token_async():
+    """get_zoho_access_token for the asyncio edition.
+
+    The cached token is returned straight away; the rare refresh runs the sync
+    path on a thread, so both editions share one token and one lock.
+    """
+    if _access_token and time.time() < _access_token_expiry - 60:
+        return _access_token
+    return await asyncio.to_thread(get_zoho_access_token)
+
+
+def _refresh_zoho_access_token():
+    """Mint a new access token. Caller holds _access_token_lock."""
     global _access_token, _access_token_expiry
 
-    # Reuse the cached token until ~1 minute before it expires
+    # Another thread may have refreshed it while we waited for the lock
     if _access_token and time.time() < _access_token_expiry - 60:
         return _access_token
 
     config = _zoho_config()
     if not config:
-        print("Zoho Desk is not configured (missing env vars)")
+        logger.warning("Zoho Desk is not configured (missing env vars)")
         return None
 
     try:
-        resp = requests.post(
+        resp = http_client.post(
             f"{config['accounts_url']}/oauth/v2/token",
             params={
                 "refresh_token": config["refresh_token"],
@@ -76,50 +126,276 @@ def get_zoho_access_token():
         data = resp.json()
         token = data.get("access_token")
         if not token:
-            print(f"Zoho token response had no access_token: {data}")
+            logger.error("Zoho token response had no access_token: %s", data)
             return None
 
         _access_token = token
         _access_token_expiry = time.time() + data.get("expires_in", 3600)
         return _access_token
     except Exception as e:
-        print(f"Error getting Zoho access token: {e}")
+        logger.error("Error getting Zoho access token: %s", e)
         return None
 
 
+def _fetch_zoho_ticket(ticket_number):
+    """Search Zoho Desk for a ticket by its ZD number.
+
+    Returns the ticket dict, or None if no ticket has that number. Raises on
+    configuration, token, network and HTTP errors so the cache can tell "not
+    found" apart from "couldn't ask".
+    """
+    config = _zoho_config()
+    token = get_zoho_access_token()
+    if not config or not token:
+        raise RuntimeError("Zoho Desk is not configured or has no access token")
+
+    resp = http_client.get(**_ticket_search(config, token, ticket_number))
+    return _search_result(resp)
+
+
+async def _fetch_zoho_ticket_async(ticket_number):
+    """_fetch_zoho_ticket, over async_http_client."""
+    config = _zoho_config()
+    token = await get_zoho_access_token_async()
+    if not config or not token:
+        raise RuntimeError("Zoho Desk is not configured or has no access token")
+
+    resp = await async_http_client.get(**_ticket_search(config, token, ticket_number))
+    return _search_result(resp)
+
+
+def _ticket_search(config, token, ticket_number):
+    return {
+        "url": f"{config['desk_url']}/api/v1/tickets/search",
+        "headers": {
+            "Authorization": f"Zoho-oauthtoken {token}",
+            "orgId": config["org_id"],
+        },
+        "params": {"ticketNumber": ticket_number, "limit": 1},
+        "timeout": 10,
+    }
+
+
+def _search_result(resp):
+    # The search endpoint returns 204 No Content when nothing matches
+    if resp.status_code == 204:
+        return None
+    resp.raise_for_status()
+    results = resp.json().get("data", [])
+    return results[0] if results else None
+
+
+class TicketCache:
+    """Bounded LRU of ticket lookups with stale-while-revalidate.
+
+    Entries are ( ticket or None, fetched_at ). A found ticket is fresh for
+    ttl seconds and servable, while a refresh runs, for stale more; a None
+    ( 204, no such ticket ) is only kept for not_found_ttl. Errors are never
+    cached.
+
+    Misses are single-flight: while one lookup fetches a ticket, others for
+    the same ticket wait for its result instead of asking Zoho again.
+    """
+
+    def __init__(
+        self,
+        fetch,
+        maxsize=TICKET_CACHE_SIZE,
+        ttl=TICKET_CACHE_TTL_SECONDS,
+        stale=TICKET_CACHE_STALE_SECONDS,
+        not_found_ttl=TICKET_NOT_FOUND_TTL_SECONDS,
+    ):
+        self._fetch = fetch
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._stale = stale
+        self._not_found_ttl = not_found_ttl
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._tasks = set()  # running async refreshes, kept until they finish
+        self._fetching = {}  # key -> Future of the miss being fetched
+        self._fetching_async = {}  # the same for get_async, as asyncio Futures
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def _load(self, key):
+        value = self._fetch(key)
+        self._store(key, value)
+        return value
+
+    def _refresh(self, key):
+        try:
+            self._load(key)
+        except Exception as e:
+            logger.error("Error refreshing Zoho ticket %s: %s", key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _refresh_async(self, key, fetch):
+        try:
+            self._store(key, await fetch(key))
+        except Exception as e:
+            logger.error("Error refreshing Zoho ticket %s: %s", key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _peek(self, key):
+        """Return ( servable, value, refresh ) for key's entry.
+
+        refresh is True when the entry is stale and nobody is refreshing it
+        yet; the caller is then responsible for starting the refresh.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            return False, None, False
+        value, fetched_at = entry
+        age = time.time() - fetched_at
+        if value is None:
+            return age < self._not_found_ttl, None, False
+        if age < self._ttl:
+            return True, value, False
+        if age < self._ttl + self._stale:
+            with self._lock:
+                start = key not in self._refreshing
+                self._refreshing.add(key)
+            return True, value, start
+        return False, None, False
+
+    def get(self, key):
+        """Return the ticket for key, or None if not found or on error."""
+        servable, value, refresh = self._peek(key)
+        if refresh:
+            threading.Thread(target=self._refresh, args=(key,), daemon=True).start()
+        if servable:
+            return value
+
+        with self._lock:
+            fetching = self._fetching.get(key)
+            first = fetching is None
+            if first:
+                fetching = self._fetching[key] = Future()
+        if not first:
+            return fetching.result()
+
+        value = None
+        try:
+            value = self._load(key)
+        except Exception as e:
+            logger.error("Error fetching Zoho ticket %s: %s", key, e)
+        finally:
+            with self._lock:
+                del self._fetching[key]
+            fetching.set_result(value)
+        return value
+
+    async def get_async(self, key, fetch):
+        """get for the asyncio edition: misses and refreshes await fetch(key)
+        instead of calling the cache's own fetch."""
+        servable, value, refresh = self._peek(key)
+        if refresh:
+            task = asyncio.get_running_loop().create_task(
+                self._refresh_async(key, fetch)
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if servable:
+            return value
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            fetching = self._fetching_async.get(key)
+            first = fetching is None or fetching.get_loop() is not loop
+            if first:
+                fetching = self._fetching_async[key] = loop.create_future()
+        if not first:
+            # shield, so a waiter being cancelled doesn't cancel the fetch
+            return await asyncio.shield(fetching)
+
+        value = None
+        try:
+            value = await fetch(key)
+            self._store(key, value)
+        except Exception as e:
+            logger.error("Error fetching Zoho ticket %s: %s", key, e)
+        finally:
+            with self._lock:
+                if self._fetching_async.get(key) is fetching:
+                    del self._fetching_async[key]
+            fetching.set_result(value)
+        return value
+
+
+_ticket_cache = TicketCache(_fetch_zoho_ticket)
+
+
 def get_zoho_ticket(ticket_number):
     """Fetch a single ticket from Zoho Desk by its ZD number.
 
+    Answers from the ticket cache when it can ( see TicketCache ).
+
     Args:
         ticket_number: The ticket's serial number, e.g. "215390".
 
     Returns:
         The ticket dict if found, otherwise None ( not found or on error ).
     """
-    config = _zoho_config()
-    token = get_zoho_access_token()
-    if not config or not token:
+    if not _zoho_config():
         return None
+    return _ticket_cache.get(str(ticket_number))
 
-    try:
-        resp = requests.get(
-            f"{config['desk_url']}/api/v1/tickets/search",
-            headers={
-                "Authorization": f"Zoho-oauthtoken {token}",
-                "orgId": config["org_id"],
-            },
-            params={"ticketNumber": ticket_number, "limit": 1},
-            timeout=10,
-        )
-        # The search endpoint returns 204 No Content when nothing matches
-        if resp.status_code == 204:
-            return None
-        resp.raise_for_status()
-        results = resp.json().get("data", [])
-        return results[0] if results else None
-    except Exception as e:
-        print(f"Error fetching Zoho ticket {ticket_number}: {e}")
+
+def get_zoho_tickets(ticket_numbers):
+    """Fetch several tickets at once, TICKET_LOOKUP_CONCURRENCY at a time.
+
+    Zoho Desk's ticket search takes a single ticketNumber, so the lookups run
+    side by side ( each through the ticket cache ) rather than as one query.
+
+    Returns:
+        A dict of ticket number -> ticket dict or None, in the order given.
+    """
+    ticket_numbers = list(dict.fromkeys(str(n) for n in ticket_numbers))
+    if not ticket_numbers:
+        return {}
+    workers = min(TICKET_LOOKUP_CONCURRENCY, len(ticket_numbers))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        tickets = executor.map(get_zoho_ticket, ticket_numbers)
+        return dict(zip(ticket_numbers, tickets))
+
+
+async def get_zoho_ticket_async(ticket_number):
+    """get_zoho_ticket for the asyncio edition."""
+    if not _zoho_config():
         return None
+    return await _ticket_cache.get_async(str(ticket_number), _fetch_zoho_ticket_async)
+
+
+async def get_zoho_tickets_async(ticket_numbers):
+    """get_zoho_tickets for the asyncio edition: the lookups run as
+    concurrent requests, TICKET_LOOKUP_CONCURRENCY at a time."""
+    ticket_numbers = list(dict.fromkeys(str(n) for n in ticket_numbers))
+    limit = asyncio.Semaphore(TICKET_LOOKUP_CONCURRENCY)
+
+    async def lookup(ticket_number):
+        async with limit:
+            return await get_zoho_ticket_async(ticket_number)
+
+    tickets = await asyncio.gather(*map(lookup, ticket_numbers))
+    return dict(zip(ticket_numbers, tickets))
 
 
 def bootstrap_refresh_token():
@@ -146,7 +422,7 @@ def bootstrap_refresh_token():
     code = input("Grant code: ").strip()
 
     try:
-        resp = requests.post(
+        resp = http_client.post(
             f"{accounts_url}/oauth/v2/token",
             params={
                 "grant_type": "authorization_code",